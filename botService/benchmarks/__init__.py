@@ -0,0 +1,7 @@
+"""Benchmarks for the bot's database hot paths
+
+Run from botService/:
+    python -m benchmarks.sqlite_profile
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.vote_import --votes 5000
+"""
@@ -0,0 +1,163 @@
+"""Ranking quality and scoring throughput of the ALS embeddings
+
+Reads votes and slot participations from --db-url (or a generated
+population), holds out a share of every user's interactions, trains ALS on
+the rest and ranks all movies the user has not interacted with:
+
+- recall@k and NDCG@k of the held-out movies, against a popularity baseline
+- candidates scored per second: one matrix-vector product, the per-candidate
+  dot product of the feed, and the movie_interest heuristic for reference
+
+    python -m benchmarks.als_eval --users 2000 --taste-groups 8
+    python -m benchmarks.als_eval --db-url sqlite:///cowatch.db --output als.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.config import Config
+from bot.constants import MovieType
+from bot.database.models import Movie
+from bot.database.repositories import SlotParticipantRepository, UserVoteRepository
+from bot.services.embeddings import EmbeddingService, Interactions, from_blob, to_blob, train_als
+from bot.services.matching import MatchingService, PreferenceStats
+from benchmarks.population import add_spec_arguments, spec_from_args, generate
+
+
+def split(votes, participations, holdout: float, min_interactions: int, seed: int):
+    """Train interactions and {user_id: held-out kinopoisk ids}"""
+    rng = np.random.default_rng(seed)
+    by_user = {}
+    for user_id, kinopoisk_id, _ in votes:
+        by_user.setdefault(user_id, set()).add(kinopoisk_id)
+    for user_id, kinopoisk_id in participations:
+        by_user.setdefault(user_id, set()).add(kinopoisk_id)
+    held_out = {}
+    for user_id, kinopoisk_ids in by_user.items():
+        if len(kinopoisk_ids) >= min_interactions:
+            ordered = sorted(kinopoisk_ids)
+            count = max(1, int(len(ordered) * holdout))
+            held_out[user_id] = set(rng.choice(ordered, count, replace=False).tolist())
+    train = Interactions.build(
+        [v for v in votes if v[1] not in held_out.get(v[0], ())],
+        [p for p in participations if p[1] not in held_out.get(p[0], ())],
+        Config.ALS_ALPHA, Config.ALS_PARTICIPATION_WEIGHT,
+    )
+    return train, held_out
+
+
+def ranking_metrics(scores_for, train: Interactions, held_out, k: int) -> dict:
+    """Mean recall@k and NDCG@k over users with held-out movies known to training"""
+    recalls, ndcgs = [], []
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    for user_id, movies in held_out.items():
+        row = train.user_index.get(user_id)
+        relevant = {train.movie_index[m] for m in movies if m in train.movie_index}
+        if row is None or not relevant:
+            continue
+        scores = scores_for(row).astype(np.float64)
+        seen = train.by_user.indices[train.by_user.indptr[row]:train.by_user.indptr[row + 1]]
+        scores[seen] = -np.inf
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        top = top[np.argsort(-scores[top])]
+        hits = np.fromiter((movie in relevant for movie in top), dtype=bool, count=len(top))
+        recalls.append(hits.sum() / min(k, len(relevant)))
+        ideal = discounts[:min(k, len(relevant))].sum()
+        ndcgs.append(float(discounts[:len(top)][hits].sum() / ideal))
+    return {
+        "users": len(recalls),
+        f"recall@{k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        f"ndcg@{k}": round(float(np.mean(ndcgs)), 4) if ndcgs else None,
+    }
+
+
+def throughput(users: np.ndarray, movies: np.ndarray, candidates: int, runs: int) -> dict:
+    """Candidates scored per second, three ways"""
+    rng = np.random.default_rng(0)
+    picked = rng.choice(len(movies), min(candidates, len(movies)), replace=False)
+    user_vector = from_blob(to_blob(users[0]))
+    movie_vectors = [from_blob(to_blob(movies[i])) for i in picked]
+    matrix = np.stack(movie_vectors)
+    stats = PreferenceStats(1995.0, {MovieType.MOVIE: 8, MovieType.SERIES: 2}, {}, 10, 0b111, ((1, 0.5), (2, 0.3)))
+    cards = [Movie(title="M", year=1960 + i % 65, type=MovieType.MOVIE, genre_mask=i % 64) for i in picked]
+
+    def rate(fn) -> float:
+        started = time.perf_counter()
+        for _ in range(runs):
+            fn()
+        return round(len(picked) * runs / (time.perf_counter() - started))
+
+    return {
+        "candidates": len(picked),
+        "batched_dot_per_s": rate(lambda: np.clip(matrix @ user_vector, 0.0, 1.0)),
+        "predict_per_s": rate(lambda: [EmbeddingService.predict(user_vector, v) for v in movie_vectors]),
+        "movie_interest_per_s": rate(lambda: [MatchingService.movie_interest(stats, m) for m in cards]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="database to read; default: generate a population into a temporary SQLite file")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of each user's interactions held out")
+    parser.add_argument("--min-interactions", type=int, default=5)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--factors", type=int, default=Config.ALS_FACTORS)
+    parser.add_argument("--iterations", type=int, default=Config.ALS_ITERATIONS)
+    parser.add_argument("--candidates", type=int, default=Config.RECOMMEND_FEED_SIZE)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    report = {}
+    if args.db_url:
+        engine = create_engine(args.db_url)
+    else:
+        engine = create_engine(f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_als.db'}")
+        spec = spec_from_args(args)
+        generate(engine, spec)
+        report["population"] = spec._asdict()
+    with sessionmaker(bind=engine)() as db:
+        votes = [tuple(row) for row in UserVoteRepository.iter_all_ratings(db)]
+        participations = [tuple(row) for row in SlotParticipantRepository.iter_participations(db)]
+    engine.dispose()
+
+    train, held_out = split(votes, participations, args.holdout, args.min_interactions, args.seed)
+    started = time.perf_counter()
+    users, movies = train_als(train, args.factors, Config.ALS_REGULARIZATION, args.iterations)
+    train_s = time.perf_counter() - started
+    popularity = np.diff(train.by_movie.indptr).astype(np.float64)
+
+    report.update({
+        "interactions": len(train.by_user.indices),
+        "users": len(train.user_ids),
+        "movies": len(train.kinopoisk_ids),
+        "factors": args.factors,
+        "iterations": args.iterations,
+        "train_s": round(train_s, 2),
+        "als": ranking_metrics(lambda row: movies @ users[row], train, held_out, args.k),
+        "popularity": ranking_metrics(lambda row: popularity.copy(), train, held_out, args.k),
+        "throughput": throughput(users, movies, args.candidates, args.runs),
+    })
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
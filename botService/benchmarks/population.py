@@ -0,0 +1,209 @@
+"""Reproducible synthetic populations for the matching and recommendation benchmarks
+
+Writes users with KP votes, a movie catalog with genres and open slots with
+participants into any database URL (SQLite file or Postgres). The same spec
+and seed always produce the same rows, so results are comparable across
+commits. Rows are bulk-inserted; preference profiles are then rebuilt with
+PreferenceProfileRepository so they match what the bot maintains.
+
+    python -m benchmarks.population --db-url sqlite:////tmp/pop.db --users 2000
+"""
+import argparse
+import bisect
+import itertools
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.constants import MovieType, SlotStatus
+from bot.database.session import Base, unit_of_work
+from bot.database.models import User, Movie, Genre, MovieGenre, Slot, SlotParticipant, UserVote
+from bot.database.repositories import PreferenceProfileRepository
+from bot.utils.genres import genres_mask
+
+VOTE_DISTRIBUTIONS = ("fixed", "uniform", "pareto")
+GENRES = [
+    "драма", "комедия", "боевик", "триллер", "криминал", "мелодрама", "фантастика", "ужасы",
+    "приключения", "детектив", "фэнтези", "мультфильм", "документальный", "семейный", "военный",
+]
+# Telegram ids of generated users start here (the viewer is the first one)
+FIRST_USER_ID = 1_000_000
+GROUP_BOOST = 8.0
+
+
+class PopulationSpec(NamedTuple):
+    """Shape of a synthetic population"""
+    users: int = 2000
+    movies: int = 5000
+    votes: int = 100                # mean KP votes per user
+    vote_distribution: str = "pareto"
+    slots: int = 500
+    participants: int = 4           # max participants already in a slot
+    seed: int = 1
+    # Users in the same taste group prefer (and rate higher) the same movies; 0: no structure
+    taste_groups: int = 0
+
+
+class Population(NamedTuple):
+    """What a generated population contains, for the benchmarks to target"""
+    spec: PopulationSpec
+    user_ids: List[int]
+    viewer_id: int
+    kinopoisk_ids: List[str]
+    # Kinopoisk id of the movie with the most open slots
+    popular_kinopoisk_id: str
+
+
+def vote_counts(spec: PopulationSpec, rng: random.Random) -> List[int]:
+    """Number of votes of each user under the spec's distribution"""
+    if spec.vote_distribution == "fixed":
+        counts = [spec.votes] * spec.users
+    elif spec.vote_distribution == "uniform":
+        counts = [rng.randint(0, 2 * spec.votes) for _ in range(spec.users)]
+    elif spec.vote_distribution == "pareto":
+        # Heavy tail: most users rate little, a few rate a lot; alpha 2 has mean 2x
+        counts = [int(spec.votes / 2 * rng.paretovariate(2.0)) for _ in range(spec.users)]
+    else:
+        raise ValueError(f"Unknown vote distribution {spec.vote_distribution!r}, expected one of {VOTE_DISTRIBUTIONS}")
+    return [min(count, spec.movies) for count in counts]
+
+
+def _popular_sample(rng: random.Random, cum_weights: List[float], k: int) -> List[int]:
+    """k distinct movie indexes, popular (low index) movies more likely"""
+    chosen = set()
+    total = cum_weights[-1]
+    while len(chosen) < k:
+        chosen.add(bisect.bisect_left(cum_weights, rng.random() * total))
+    return list(chosen)
+
+
+def _rating(rng: random.Random, liked: bool) -> int:
+    return rng.randint(6, 10) if liked else rng.randint(1, 10)
+
+
+def generate(engine: Engine, spec: PopulationSpec) -> Population:
+    """Drop and recreate the schema on engine, then fill it per spec"""
+    rng = random.Random(spec.seed)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    now = datetime.utcnow()
+
+    user_ids = list(range(FIRST_USER_ID, FIRST_USER_ID + spec.users))
+    kinopoisk_ids = [str(100000 + i) for i in range(spec.movies)]
+    # Zipf-like movie popularity shared by votes and slots
+    cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(spec.movies)))
+    genre_ids = {name: i for i, name in enumerate(GENRES, 1)}
+    movie_genres = [rng.sample(GENRES, rng.randint(1, 3)) for _ in range(spec.movies)]
+    # Per taste group, its own movies are GROUP_BOOST times as likely to be voted
+    group_weights = [
+        list(itertools.accumulate(
+            (GROUP_BOOST if rank % spec.taste_groups == group else 1.0) / (rank + 1) for rank in range(spec.movies)
+        ))
+        for group in range(spec.taste_groups)
+    ]
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": user_id, "username": f"user{user_id}", "first_name": f"User {user_id}",
+             "rating": rng.choice([0.0, 3.0, 3.5, 4.0, 4.5, 5.0]), "total_ratings": 0, "rating_sum": 0,
+             "created_at": now}
+            for user_id in user_ids
+        ])
+        conn.execute(insert(Genre), [{"id": genre_id, "name": name} for name, genre_id in genre_ids.items()])
+        conn.execute(insert(Movie), [
+            {"id": i + 1, "title": f"Movie {kp_id}", "year": rng.randint(1960, 2025),
+             "type": MovieType.SERIES if rng.random() < 0.2 else MovieType.MOVIE, "kinopoisk_id": kp_id,
+             "genres": ", ".join(names), "genre_mask": genres_mask(genre_ids[n] for n in names), "created_at": now}
+            for i, (kp_id, names) in enumerate(zip(kinopoisk_ids, movie_genres))
+        ])
+        conn.execute(insert(MovieGenre), [
+            {"movie_id": i + 1, "genre_id": genre_ids[name]}
+            for i, names in enumerate(movie_genres) for name in names
+        ])
+
+        for user_id, count in zip(user_ids, vote_counts(spec, rng)):
+            if not count:
+                continue
+            group = user_id % spec.taste_groups if spec.taste_groups else None
+            weights = cum_weights if group is None else group_weights[group]
+            conn.execute(insert(UserVote), [
+                {"user_id": user_id, "kinopoisk_id": kinopoisk_ids[index],
+                 "user_rating": _rating(rng, group is not None and index % spec.taste_groups == group),
+                 "year": 1960 + index % 65, "type": "FILM", "genres": ", ".join(movie_genres[index]),
+                 "created_at": now, "updated_at": now}
+                for index in _popular_sample(rng, weights, count)
+            ])
+
+        slot_rows, participant_rows = [], []
+        slot_movies: Dict[int, int] = {}
+        for slot_id in range(1, spec.slots + 1):
+            movie_index = _popular_sample(rng, cum_weights, 1)[0]
+            slot_movies[movie_index] = slot_movies.get(movie_index, 0) + 1
+            members = rng.sample(user_ids[1:], rng.randint(1, spec.participants))
+            slot_rows.append({
+                "id": slot_id, "movie_id": movie_index + 1, "creator_id": members[0],
+                "datetime": now + timedelta(days=1, minutes=slot_id), "min_participants": spec.participants + 1,
+                "max_participants": spec.participants + 5, "status": SlotStatus.OPEN,
+                "participant_count": len(members), "created_at": now,
+            })
+            participant_rows.extend(
+                {"slot_id": slot_id, "user_id": member, "joined_at": now} for member in members
+            )
+        if slot_rows:
+            conn.execute(insert(Slot), slot_rows)
+            conn.execute(insert(SlotParticipant), participant_rows)
+
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with unit_of_work(factory) as db:
+        for user_id in user_ids:
+            PreferenceProfileRepository.rebuild(db, user_id)
+
+    popular = max(slot_movies, key=slot_movies.get) if slot_movies else 0
+    return Population(spec, user_ids, user_ids[0], kinopoisk_ids, kinopoisk_ids[popular])
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = PopulationSpec()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--movies", type=int, default=defaults.movies)
+    parser.add_argument("--votes", type=int, default=defaults.votes, help="mean votes per user")
+    parser.add_argument("--vote-distribution", choices=VOTE_DISTRIBUTIONS, default=defaults.vote_distribution)
+    parser.add_argument("--slots", type=int, default=defaults.slots)
+    parser.add_argument("--participants", type=int, default=defaults.participants,
+                        help="max participants already in a slot")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--taste-groups", type=int, default=defaults.taste_groups,
+                        help="groups of users with shared favourite movies (0: none)")
+
+
+def spec_from_args(args: argparse.Namespace) -> PopulationSpec:
+    return PopulationSpec(
+        args.users, args.movies, args.votes, args.vote_distribution, args.slots, args.participants, args.seed,
+        args.taste_groups,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", required=True, help="target database; its tables are dropped first")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    engine = create_engine(args.db_url)
+    population = generate(engine, spec_from_args(args))
+    engine.dispose()
+    print(f"{len(population.user_ids)} users, {args.movies} movies, {args.slots} slots written to {args.db_url}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""/recommend page latency: per-request ranking vs the materialized feed
+
+Builds a temporary SQLite database with many open slots and a viewer with
+imported votes, then times one page of recommendations, repeated:
+
+- full scan: every open slot loaded and scored in Python (before user-014)
+- sql ranking: candidates filtered and pre-ranked in SQL (MatchingService.recommend)
+- feed: one range read of the stored feed (RecommendationFeedService.page)
+
+    python -m benchmarks.recommend_feed --slots 5000 --runs 200
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.config import Config
+from bot.database.session import Base, unit_of_work
+from bot.database.sqlite_profile import apply_sqlite_profile
+from bot.database.models import UserVote
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    UserVoteRepository, LoadProfile,
+)
+from bot.services.matching import MatchingService
+from bot.services.recommendation_feed import RecommendationFeedService
+
+VIEWER = 1
+CREATOR = 2
+
+
+def make_factory(slots: int, votes: int):
+    db_path = Path(tempfile.mkdtemp()) / "bench_feed.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    apply_sqlite_profile(engine, "production")
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    start = datetime.utcnow() + timedelta(days=1)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, VIEWER, "viewer", "Viewer")
+        UserRepository.get_or_create(db, CREATOR, "creator", "Creator")
+        for i in range(votes):
+            UserVoteRepository.upsert_vote(db, VIEWER, str(i), None, 1970 + i % 50, "movie", 1 + i % 10)
+        for i in range(slots):
+            movie = MovieRepository.create(db, title=f"Movie {i}", year=1950 + i % 75, kinopoisk_id=str(i))
+            SlotRepository.create(db, movie.id, CREATOR, start + timedelta(minutes=i))
+    with unit_of_work(factory) as db:
+        RecommendationFeedService.build(db, VIEWER)
+    # Planner statistics, as a long-running database has them; without them
+    # SQLite drives the feed query from the slots index and sorts
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return engine, factory
+
+
+def full_scan_page(db, page_size: int):
+    """The pre-SQL-filtering /recommend: load everything, filter and score in Python"""
+    slots = SlotRepository.get_all_open(db, profile=LoadProfile.LIST_CARD)
+    joined = SlotParticipantRepository.get_user_slot_ids(db, VIEWER)
+    slots = [s for s in slots if s.id not in joined and s.movie is not None]
+    watched = {v.kinopoisk_id for v in db.query(UserVote).filter(UserVote.user_id == VIEWER).all()}
+    return MatchingService.annotate_slots_by_interest(db, VIEWER, slots, watched)[:page_size]
+
+
+def measure(factory, fn, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        with factory() as db:
+            started = time.perf_counter()
+            fn(db)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slots", type=int, default=5000)
+    parser.add_argument("--votes", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    engine, factory = make_factory(args.slots, args.votes)
+    page_size = Config.RECOMMEND_PAGE_SIZE
+    methods = [
+        ("full scan", lambda db: full_scan_page(db, page_size)),
+        ("sql ranking", lambda db: MatchingService.recommend(db, VIEWER, page_size)),
+        ("feed", lambda db: RecommendationFeedService.page(db, VIEWER, page_size)),
+    ]
+    print(f"{args.slots} open slots, viewer with {args.votes} votes, page of {page_size}, {args.runs} runs")
+    print(f"{'method':<12} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, fn in methods:
+        result = measure(factory, fn, args.runs)
+        print(f"{name:<12} {result['p50_ms']:>10} {result['p99_ms']:>10}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
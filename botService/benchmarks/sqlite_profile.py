@@ -0,0 +1,119 @@
+"""Join/leave throughput on SQLite with and without the production profile
+
+Writer threads repeatedly join and leave slots (one unit of work per action,
+like join_slot_callback / leave_slot_callback) while reader threads render
+open-slot lists. Each configuration runs on a fresh temporary database file.
+
+    python -m benchmarks.sqlite_profile --seconds 5 --writers 4 --readers 4
+"""
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.session import Base, unit_of_work
+from bot.database.sqlite_profile import apply_sqlite_profile
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository, LoadProfile,
+)
+
+SLOTS = 20
+
+
+def make_factory(profile: str):
+    """Fresh database file with SLOTS open slots"""
+    db_path = Path(tempfile.mkdtemp()) / f"bench_{profile}.db"
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    apply_sqlite_profile(engine, profile)
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    with factory() as db:
+        creator = UserRepository.get_or_create(db, 1, "creator", "Creator")
+        movie = MovieRepository.create(db, title="Movie", year=2020)
+        for i in range(SLOTS):
+            SlotRepository.create(db, movie.id, creator.id, datetime.utcnow() + timedelta(days=1, hours=i))
+    return engine, factory
+
+
+def run(profile: str, seconds: float, writers: int, readers: int) -> dict:
+    engine, factory = make_factory(profile)
+    deadline = time.perf_counter() + seconds
+    counts = {"joins_leaves": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(user_id):
+        with factory() as db:
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        i = 0
+        while time.perf_counter() < deadline:
+            slot_id = i % SLOTS + 1
+            i += 1
+            try:
+                with unit_of_work(factory) as db:
+                    SlotParticipantRepository.add_participant(db, slot_id, user_id)
+                with unit_of_work(factory) as db:
+                    SlotParticipantRepository.remove_participant(db, slot_id, user_id)
+                bump("joins_leaves")
+            except Exception:
+                bump("errors")
+
+    def reader():
+        while time.perf_counter() < deadline:
+            try:
+                with factory() as db:
+                    for slot in SlotRepository.get_all_open(db, profile=LoadProfile.LIST_CARD):
+                        len(slot.participants)
+                bump("reads")
+            except Exception:
+                bump("errors")
+
+    threads = [threading.Thread(target=writer, args=(100 + n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return {
+        "profile": profile,
+        "joins_leaves_per_sec": round(counts["joins_leaves"] / elapsed, 1),
+        "reads_per_sec": round(counts["reads"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'profile':<12} {'join+leave/s':>14} {'reads/s':>10} {'errors':>8}")
+    for profile in ("default", "production"):
+        result = run(profile, args.seconds, args.writers, args.readers)
+        print(
+            f"{result['profile']:<12} {result['joins_leaves_per_sec']:>14} "
+            f"{result['reads_per_sec']:>10} {result['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
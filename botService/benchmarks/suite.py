@@ -0,0 +1,202 @@
+"""Matching and recommendation benchmarks over a synthetic population, as JSON
+
+Generates a population (benchmarks.population) and times the hot paths the
+bot runs per update:
+
+- annotate_slots_by_compatibility over every open slot, cold and warm user cache
+- annotate_slots_by_interest over every open slot
+- recommend_command end to end (the first call builds the feed)
+- handle_movie_url end to end for the movie with the most open slots
+
+Handlers run against a fake bot: updates are plain objects and replies are
+recorded instead of sent. Each result has latency percentiles and the number
+of statements per call. The JSON carries the commit and the population spec,
+so runs on different commits can be diffed directly.
+
+    python -m benchmarks.suite --users 2000 --slots 500 --output before.json
+    python -m benchmarks.suite --db-url postgresql://... --output pg.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot.database.session import async_unit_of_work, to_async_url
+from bot.database.instrumentation import instrument_engine, query_scope
+from bot.database.user_cache import user_cache
+from bot.database.models import UserVote
+from bot.database.repositories import SlotRepository, LoadProfile
+from bot.services.matching import MatchingService
+from bot.utils.states import set_state
+import bot.database.routing as routing
+import bot.handlers.movie as movie_module
+import bot.handlers.recommend as recommend_module
+from benchmarks.population import add_spec_arguments, spec_from_args, generate
+
+
+class FakeBot:
+    """Stands in for Telegram: builds updates and records the replies"""
+
+    def __init__(self):
+        self.replies = []
+        self._update_id = 0
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+    def update(self, user_id: int, text: str = ""):
+        self._update_id += 1
+        message = SimpleNamespace(text=text, reply_text=self.reply_text)
+        return SimpleNamespace(
+            update_id=self._update_id, message=message,
+            effective_user=SimpleNamespace(id=user_id, first_name=f"User {user_id}"),
+        )
+
+
+def measure(fn, runs: int, before=None) -> dict:
+    """Latency percentiles and statements per call of fn over runs calls"""
+    timings, queries = [], []
+    for _ in range(runs):
+        if before is not None:
+            before()
+        with query_scope() as stats:
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(stats.count)
+    timings.sort()
+    return {
+        "runs": runs,
+        "p50_ms": round(statistics.median(timings), 3),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries": max(queries),
+    }
+
+
+def bench_matching(factory, viewer_id: int, runs: int) -> dict:
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        watched = {kp_id for (kp_id,) in db.query(UserVote.kinopoisk_id).filter(UserVote.user_id == viewer_id)}
+        compatibility = lambda: MatchingService.annotate_slots_by_compatibility(db, viewer_id, slots)
+        return {
+            "open_slots": len(slots),
+            "annotate_slots_by_compatibility.cold": measure(compatibility, runs, before=user_cache.clear),
+            "annotate_slots_by_compatibility.warm": measure(compatibility, runs),
+            "annotate_slots_by_interest": measure(
+                lambda: MatchingService.annotate_slots_by_interest(db, viewer_id, slots, watched), runs
+            ),
+        }
+
+
+def bench_handlers(factory, async_factory, population, runs: int) -> dict:
+    bot = FakeBot()
+    viewer_id = population.viewer_id
+    url = f"https://www.kinopoisk.ru/film/{population.popular_kinopoisk_id}/"
+    parsed = {"title": f"Movie {population.popular_kinopoisk_id}", "kinopoisk_id": population.popular_kinopoisk_id}
+
+    async def parse_url(url, db=None):
+        return parsed
+
+    def recommend():
+        asyncio.run(recommend_module.recommend_command(bot.update(viewer_id), None))
+
+    def movie_url():
+        set_state(viewer_id, "waiting_for_movie_url")
+        asyncio.run(movie_module.handle_movie_url(bot.update(viewer_id, url), None))
+
+    old_router = routing.read_router
+    old_recommend_uow, old_movie_uow = recommend_module.async_unit_of_work, movie_module.async_unit_of_work
+    old_parse = movie_module.MovieParser.parse_url
+    routing.read_router = routing.ReadRouter(factory, async_primary=async_factory)
+    recommend_module.async_unit_of_work = partial(async_unit_of_work, async_factory)
+    movie_module.async_unit_of_work = partial(async_unit_of_work, async_factory)
+    movie_module.MovieParser.parse_url = staticmethod(parse_url)
+    try:
+        user_cache.clear()
+        results = {
+            "recommend_command.first": measure(recommend, 1),
+            "recommend_command": measure(recommend, runs),
+            "handle_movie_url.cold": measure(movie_url, runs, before=user_cache.clear),
+            "handle_movie_url.warm": measure(movie_url, runs),
+        }
+    finally:
+        routing.read_router = old_router
+        recommend_module.async_unit_of_work, movie_module.async_unit_of_work = old_recommend_uow, old_movie_uow
+        movie_module.MovieParser.parse_url = old_parse
+    # A run whose replies are error messages measured the wrong thing
+    assert any("Доступные слоты" in reply for reply in bot.replies), "handle_movie_url found no slots"
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="database to fill (tables are dropped); default: a temporary SQLite file")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_suite.db'}"
+    engine = instrument_engine(create_engine(db_url))
+    spec = spec_from_args(args)
+    started = time.perf_counter()
+    population = generate(engine, spec)
+    # Planner statistics, as a long-running database has them
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    generate_s = time.perf_counter() - started
+    factory = sessionmaker(bind=engine, autoflush=False)
+    # Handlers use async sessions; each asyncio.run has its own loop, so no pooling
+    async_engine = create_async_engine(to_async_url(db_url), poolclass=NullPool)
+    instrument_engine(async_engine.sync_engine)
+    async_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    results = bench_matching(factory, population.viewer_id, args.runs)
+    results.update(bench_handlers(factory, async_factory, population, args.runs))
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "dialect": engine.dialect.name,
+        "population": spec._asdict(),
+        "generate_s": round(generate_s, 2),
+        "results": results,
+    }
+    engine.dispose()
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
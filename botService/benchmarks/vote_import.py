@@ -0,0 +1,127 @@
+"""Kinopoisk vote import: per-vote upsert_vote against the bulk upsert_votes
+
+Imports --votes votes of one user in pages of --page-size, the way
+fetch_and_store_votes stores API pages, once with a fresh table (all
+inserts) and once more with changed ratings (all updates). Each mode runs
+both with a unit of work per page (one commit per page, as /link_kp does)
+and in an autocommit session (a commit per call). Reports seconds, votes
+per second and statements per import.
+
+    python -m benchmarks.vote_import --votes 5000
+    python -m benchmarks.vote_import --db-url postgresql://... --output votes.json
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.session import Base, unit_of_work
+from bot.database.instrumentation import instrument_engine, query_scope
+from bot.database.models import UserVote
+from bot.database.repositories import UserRepository, UserVoteRepository
+from benchmarks.population import GENRES
+
+USER_ID = 1
+
+
+def make_votes(count: int, seed: int, rerated: bool = False) -> list:
+    """count votes as fetch_and_store_votes passes them on; rerated shifts every rating"""
+    rng = random.Random(seed)
+    votes = []
+    for i in range(count):
+        rating = rng.randint(1, 10)
+        votes.append({
+            "kinopoisk_id": str(100000 + i),
+            "title": f"Movie {i}",
+            "year": rng.randint(1960, 2025),
+            "movie_type": rng.choice(["FILM", "FILM", "TV_SERIES"]),
+            "user_rating": rating % 10 + 1 if rerated else rating,
+            "poster_url": f"https://img.example/{i}.jpg",
+            "genres": ", ".join(rng.sample(GENRES, rng.randint(1, 3))),
+        })
+    return votes
+
+
+def store_per_vote(db, page):
+    for vote in page:
+        UserVoteRepository.upsert_vote(db, USER_ID, **vote)
+
+
+def store_bulk(db, page):
+    UserVoteRepository.upsert_votes(db, USER_ID, page)
+
+
+def run(engine, store, votes: list, page_size: int, unit_per_page: bool) -> dict:
+    factory = sessionmaker(bind=engine, autoflush=False)
+    pages = [votes[i:i + page_size] for i in range(0, len(votes), page_size)]
+    with query_scope() as stats:
+        started = time.perf_counter()
+        if unit_per_page:
+            for page in pages:
+                with unit_of_work(factory) as db:
+                    store(db, page)
+        else:
+            with factory() as db:
+                for page in pages:
+                    store(db, page)
+        seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "votes_per_s": round(len(votes) / seconds),
+        "statements": stats.count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db-url", help="database to use (tables are dropped); default: a temporary SQLite file")
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=20, help="votes per API page")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_votes.db'}"
+    engine = instrument_engine(create_engine(db_url))
+    first, again = make_votes(args.votes, args.seed), make_votes(args.votes, args.seed, rerated=True)
+    results = {}
+    for mode, store in (("upsert_vote", store_per_vote), ("upsert_votes", store_bulk)):
+        for unit_per_page in (True, False):
+            Base.metadata.drop_all(engine)
+            Base.metadata.create_all(engine)
+            with sessionmaker(bind=engine)() as db:
+                UserRepository.get_or_create(db, USER_ID, "importer", "Importer")
+            key = f"{mode}.{'unit_of_work' if unit_per_page else 'autocommit'}"
+            results[key] = {
+                "insert": run(engine, store, first, args.page_size, unit_per_page),
+                "update": run(engine, store, again, args.page_size, unit_per_page),
+            }
+            with sessionmaker(bind=engine)() as db:
+                assert db.query(UserVote).count() == args.votes
+    report = {
+        "dialect": engine.dialect.name,
+        "votes": args.votes,
+        "page_size": args.page_size,
+        "results": results,
+    }
+    engine.dispose()
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
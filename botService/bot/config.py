@@ -40,8 +40,64 @@ class Config:
             db_path_str = str(db_path)
             DATABASE_URL = f"sqlite:///{db_path_str}"
     
+    # Optional read replica for read-only handlers (falls back to DATABASE_URL)
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    # After a user's own write their reads go to the primary for this long
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+    # Pause before retrying a replica that failed to connect
+    REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+    
     MIN_PARTICIPANTS_DEFAULT = int(os.getenv("MIN_PARTICIPANTS_DEFAULT", "1"))
     
+    # SQLite fallback tuning: "production" (WAL + pragmas) or "default"
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB (64 MiB)
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    
+    # Per-update SQL budget: updates above it are logged (0 disables the check)
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "50"))
+    QUERY_TIME_BUDGET_MS = float(os.getenv("QUERY_TIME_BUDGET_MS", "500"))
+    
+    # Users whose KP vote maps and peer ratings MatchingService keeps in memory
+    MATCHING_CACHE_SIZE = int(os.getenv("MATCHING_CACHE_SIZE", "2000"))
+    
+    # Slots per /recommend page (each page is one keyset-paginated SQL query)
+    RECOMMEND_PAGE_SIZE = int(os.getenv("RECOMMEND_PAGE_SIZE", "20"))
+    # Best slots kept in a user's materialized feed when it is (re)built;
+    # /recommend paging ends after them
+    RECOMMEND_FEED_SIZE = int(os.getenv("RECOMMEND_FEED_SIZE", "200"))
+    # Most-voted genres of a user that genre affinity matches movies against
+    PROFILE_TOP_GENRES = int(os.getenv("PROFILE_TOP_GENRES", "5"))
+    # Most similar users stored per user, and co-rated movies needed to count as one
+    TASTE_NEIGHBOURS = int(os.getenv("TASTE_NEIGHBOURS", "50"))
+    TASTE_MIN_COMMON = int(os.getenv("TASTE_MIN_COMMON", "3"))
+    # Implicit ALS embeddings (train_embeddings.py): rank, L2 regularization, sweeps,
+    # confidence per vote (scaled by rating / 10) and per slot participation
+    ALS_FACTORS = int(os.getenv("ALS_FACTORS", "32"))
+    ALS_REGULARIZATION = float(os.getenv("ALS_REGULARIZATION", "50"))
+    ALS_ITERATIONS = int(os.getenv("ALS_ITERATIONS", "15"))
+    ALS_ALPHA = float(os.getenv("ALS_ALPHA", "10"))
+    ALS_PARTICIPATION_WEIGHT = float(os.getenv("ALS_PARTICIPATION_WEIGHT", "0.5"))
+    # Share of the embedding score in feed scores when both embeddings exist (0 disables)
+    ALS_WEIGHT = float(os.getenv("ALS_WEIGHT", "0.5"))
+    
+    # Shared HTTP client for external APIs: timeouts (seconds), connection pool,
+    # keep-alive, and concurrent requests per host (Kinopoisk has its own cap)
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+    HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    HTTP_PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+    KINOPOISK_HTTP_LIMIT = int(os.getenv("KINOPOISK_HTTP_LIMIT", "5"))
+    # Vote pages of one /link_kp import fetched at the same time (within KINOPOISK_HTTP_LIMIT)
+    KP_VOTES_CONCURRENCY = int(os.getenv("KP_VOTES_CONCURRENCY", "3"))
+    
+    # Movies refreshed from Kinopoisk within this many hours are served from the DB;
+    # older ones are served too, and refreshed in the background
+    MOVIE_CACHE_TTL_HOURS = float(os.getenv("MOVIE_CACHE_TTL_HOURS", "24"))
+    
     # Kinopoisk API configuration
     KINOPOISK_API_KEY = os.getenv("KINOPOISK_API_KEY")
     
@@ -6,6 +6,13 @@ class SlotStatus:
     FULL = "full"
     COMPLETED = "completed"
 
+# Outcomes of SlotParticipantRepository.join
+class JoinStatus:
+    JOINED = "joined"
+    ALREADY_JOINED = "already_joined"
+    FULL = "full"
+    NOT_FOUND = "not_found"
+
 # Room statuses
 class RoomStatus:
     ACTIVE = "active"
@@ -1,5 +1,15 @@
 """Database package"""
-from bot.database.session import SessionLocal, get_db, get_db_session, Base, engine
+from bot.database.session import (
+    SessionLocal, get_db, get_db_session, Base, engine,
+    AsyncSessionLocal, get_async_db_session, async_engine,
+    UNIT_OF_WORK, unit_of_work, async_unit_of_work,
+)
+from bot.database.instrumentation import (
+    instrument_engine, query_scope, track_queries, assert_max_queries,
+)
+from bot.database.routing import (
+    bind_user, open_read_session, read_session, async_read_session,
+)
 from bot.database.models import (
     User, Movie, Slot, SlotParticipant, Room, Rating,
     Episode, Comment, Like, WatchHistory
@@ -16,6 +26,20 @@ from bot.database.repositories import (
     LikeRepository,
     WatchHistoryRepository,
 )
+from bot.database.async_repositories import (
+    AsyncUserRepository,
+    AsyncMovieRepository,
+    AsyncSlotRepository,
+    AsyncSlotParticipantRepository,
+    AsyncRoomRepository,
+    AsyncRatingRepository,
+    AsyncEpisodeRepository,
+    AsyncCommentRepository,
+    AsyncLikeRepository,
+    AsyncWatchHistoryRepository,
+    AsyncUserKinopoiskRepository,
+    AsyncUserVoteRepository,
+)
 
 __all__ = [
     # Session management
@@ -24,6 +48,22 @@ __all__ = [
     "get_db_session",
     "Base",
     "engine",
+    "AsyncSessionLocal",
+    "get_async_db_session",
+    "async_engine",
+    "UNIT_OF_WORK",
+    "unit_of_work",
+    "async_unit_of_work",
+    # Query accounting
+    "instrument_engine",
+    "query_scope",
+    "track_queries",
+    "assert_max_queries",
+    # Read routing
+    "bind_user",
+    "open_read_session",
+    "read_session",
+    "async_read_session",
     # Models
     "User",
     "Movie",
@@ -46,5 +86,18 @@ __all__ = [
     "CommentRepository",
     "LikeRepository",
     "WatchHistoryRepository",
+    # Async repositories
+    "AsyncUserRepository",
+    "AsyncMovieRepository",
+    "AsyncSlotRepository",
+    "AsyncSlotParticipantRepository",
+    "AsyncRoomRepository",
+    "AsyncRatingRepository",
+    "AsyncEpisodeRepository",
+    "AsyncCommentRepository",
+    "AsyncLikeRepository",
+    "AsyncWatchHistoryRepository",
+    "AsyncUserKinopoiskRepository",
+    "AsyncUserVoteRepository",
 ]
 
@@ -0,0 +1,72 @@
+"""Async repositories for use inside handlers
+
+Each async repository mirrors the sync one from ``repositories.py`` method by
+method. Calls are executed through ``AsyncSession.run_sync`` so the query code
+(and any lazy loads it triggers) is shared with the sync API, while the actual
+I/O goes through the asyncio driver and never blocks the event loop.
+
+Returned ORM objects are detached from the greenlet context: relationships
+that were not loaded during the call must not be touched afterwards (that
+raises ``MissingGreenlet``). For multi-step logic that walks relationships,
+pass a sync function to ``db.run_sync`` instead.
+
+Usage:
+    async with get_async_db_session() as db:
+        user = await AsyncUserRepository.get_by_id(db, user_id)
+"""
+from typing import Any, Callable
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.database.repositories import (
+    UserRepository,
+    MovieRepository,
+    SlotRepository,
+    SlotParticipantRepository,
+    RoomRepository,
+    RatingRepository,
+    EpisodeRepository,
+    CommentRepository,
+    LikeRepository,
+    WatchHistoryRepository,
+    UserKinopoiskRepository,
+    UserVoteRepository,
+)
+
+
+class AsyncRepository:
+    """Awaitable facade over a sync repository class"""
+
+    def __init__(self, repository: type):
+        self._repository = repository
+        self.__doc__ = f"Async facade for {repository.__name__}"
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        method = getattr(self._repository, name)
+        if not callable(method):
+            return method
+
+        async def call(db: AsyncSession, *args, **kwargs):
+            return await db.run_sync(lambda sync_db: method(sync_db, *args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        # Cache so subsequent lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    def __repr__(self) -> str:
+        return f"<AsyncRepository {self._repository.__name__}>"
+
+
+AsyncUserRepository = AsyncRepository(UserRepository)
+AsyncMovieRepository = AsyncRepository(MovieRepository)
+AsyncSlotRepository = AsyncRepository(SlotRepository)
+AsyncSlotParticipantRepository = AsyncRepository(SlotParticipantRepository)
+AsyncRoomRepository = AsyncRepository(RoomRepository)
+AsyncRatingRepository = AsyncRepository(RatingRepository)
+AsyncEpisodeRepository = AsyncRepository(EpisodeRepository)
+AsyncCommentRepository = AsyncRepository(CommentRepository)
+AsyncLikeRepository = AsyncRepository(LikeRepository)
+AsyncWatchHistoryRepository = AsyncRepository(WatchHistoryRepository)
+AsyncUserKinopoiskRepository = AsyncRepository(UserKinopoiskRepository)
+AsyncUserVoteRepository = AsyncRepository(UserVoteRepository)
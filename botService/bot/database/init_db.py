@@ -53,9 +53,12 @@ def init_database():
                 # Check which tables exist to determine migration version
                 has_new_tables = any(t in tables for t in ["episodes", "comments", "likes", "watch_history"])
                 
-                if has_new_tables:
-                    # Database has new tables, stamp with latest
-                    stamp_version = "head"
+                if has_new_tables and "user_votes" in tables:
+                    # Database has all tables of the create_all() era; later
+                    # revisions (indexes, new columns) must still be applied
+                    stamp_version = "20251113_000004"
+                elif has_new_tables:
+                    stamp_version = "20251111_000003"
                 else:
                     # Database only has old tables, stamp with first migration
                     stamp_version = "20251111_000001"
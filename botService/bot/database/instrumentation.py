@@ -0,0 +1,152 @@
+"""Per-update SQL statement accounting
+
+Every statement executed through an instrumented engine is attributed to the
+query scopes active in the current context. A scope is opened for each
+Telegram update by the ``track_queries`` handler decorator, so statements are
+tagged with the update id and the handler name, and the scope records the
+statement count and the total time spent in the database.
+
+Updates over ``Config.QUERY_BUDGET`` statements or ``Config.QUERY_TIME_BUDGET_MS``
+milliseconds are logged with a warning.
+
+Scopes live in a ``ContextVar``, so concurrent updates on the event loop are
+counted separately. ``AsyncSession.run_sync`` propagates the context into its
+greenlet, so the async repositories are counted too.
+
+Test helper:
+    with assert_max_queries(5):
+        SlotRepository.get_all_open(db, profile=LoadProfile.LIST_CARD)
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements executed inside one query scope"""
+
+    def __init__(self, update_id: Optional[int] = None, handler: Optional[str] = None):
+        self.update_id = update_id
+        self.handler = handler
+        self.count = 0
+        self.db_time = 0.0
+        self.statements: List[str] = []
+
+    @property
+    def db_time_ms(self) -> float:
+        return self.db_time * 1000
+
+    def __repr__(self) -> str:
+        return (
+            f"<QueryStats update={self.update_id} handler={self.handler} "
+            f"queries={self.count} db_time={self.db_time_ms:.1f}ms>"
+        )
+
+
+# Innermost scope last; a statement is counted in every active scope
+_scopes: ContextVar[Tuple[QueryStats, ...]] = ContextVar("query_scopes", default=())
+
+
+def current_stats() -> Optional[QueryStats]:
+    """Innermost active query scope, if any"""
+    scopes = _scopes.get()
+    return scopes[-1] if scopes else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _scopes.get():
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    scopes = _scopes.get()
+    if not scopes:
+        return
+    started = conn.info.get("query_start")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    for stats in scopes:
+        stats.count += 1
+        stats.db_time += elapsed
+        stats.statements.append(statement)
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is None or not _scopes.get():
+        return
+    started = context.connection.info.get("query_start")
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine: Engine) -> Engine:
+    """Attach the statement counter to a sync engine (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+@contextmanager
+def query_scope(update_id: Optional[int] = None, handler: Optional[str] = None):
+    """Count statements executed in this context until the block exits"""
+    stats = QueryStats(update_id, handler)
+    token = _scopes.set(_scopes.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _scopes.reset(token)
+
+
+def check_budget(stats: QueryStats) -> bool:
+    """Log a warning when a scope exceeded the configured budget"""
+    over_count = Config.QUERY_BUDGET and stats.count > Config.QUERY_BUDGET
+    over_time = Config.QUERY_TIME_BUDGET_MS and stats.db_time_ms > Config.QUERY_TIME_BUDGET_MS
+    if over_count or over_time:
+        logger.warning(
+            f"Query budget exceeded: update={stats.update_id} handler={stats.handler} "
+            f"queries={stats.count}/{Config.QUERY_BUDGET} "
+            f"db_time={stats.db_time_ms:.1f}ms/{Config.QUERY_TIME_BUDGET_MS}ms"
+        )
+        return True
+    logger.debug(f"{stats}")
+    return False
+
+
+def track_queries(handler):
+    """Decorator for PTB handlers: one query scope per update"""
+    @wraps(handler)
+    async def wrapper(update, context, *args, **kwargs):
+        update_id = getattr(update, "update_id", None)
+        outer = current_stats()
+        if outer is not None and outer.update_id == update_id:
+            # Dispatched from another tracked handler: name the inner one
+            outer.handler = f"{outer.handler}>{handler.__name__}"
+            return await handler(update, context, *args, **kwargs)
+        with query_scope(update_id, handler.__name__) as stats:
+            try:
+                return await handler(update, context, *args, **kwargs)
+            finally:
+                check_budget(stats)
+    return wrapper
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """Test helper: fail if the block issues more than limit statements"""
+    with query_scope(handler="assert_max_queries") as stats:
+        yield stats
+    assert stats.count <= limit, (
+        f"Expected at most {limit} queries, got {stats.count}:\n" + "\n".join(stats.statements)
+    )
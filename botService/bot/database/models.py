@@ -1,7 +1,7 @@
 """SQLAlchemy models"""
-from sqlalchemy import Column, Integer, BigInteger, String, Float, Text, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Text, DateTime, ForeignKey, LargeBinary, Enum as SQLEnum
 from sqlalchemy.orm import relationship
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Index
 from datetime import datetime
 import enum
 
@@ -18,6 +18,8 @@ class User(Base):
     first_name = Column(String, nullable=False)
     rating = Column(Float, default=0.0)
     total_ratings = Column(Integer, default=0)
+    # Running sum of received scores; rating = rating_sum / total_ratings
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=lambda: datetime.utcnow())
     
     # Relationships
@@ -45,6 +47,8 @@ class UserVote(Base):
     __tablename__ = "user_votes"
     __table_args__ = (
         UniqueConstraint("user_id", "kinopoisk_id", name="uq_user_movie_vote"),
+        Index("ix_user_votes_user_kp_rating", "user_id", "kinopoisk_id", "user_rating"),
+        Index("ix_user_votes_kinopoisk_id", "kinopoisk_id"),
     )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -63,9 +67,36 @@ class UserVote(Base):
     user = relationship("User")
 
 
+class UserPreferenceProfile(Base):
+    """Aggregates of a user's KP votes used for interest scoring.
+
+    Maintained incrementally by UserVoteRepository.upsert_vote(s); type_counts and
+    genre_counts are JSON objects {name: number of votes}.
+    """
+    __tablename__ = "user_preference_profiles"
+    
+    user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    vote_count = Column(Integer, nullable=False, default=0, server_default="0")
+    year_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    year_count = Column(Integer, nullable=False, default=0, server_default="0")
+    type_counts = Column(Text, nullable=False, default="{}", server_default="{}")
+    genre_counts = Column(Text, nullable=False, default="{}", server_default="{}")
+    # Top PROFILE_TOP_GENRES genres: their bits (see utils.genres) and {genre_id: votes}
+    genre_mask = Column(BigInteger, nullable=False, default=0, server_default="0")
+    top_genre_counts = Column(Text, nullable=False, default="{}", server_default="{}")
+    updated_at = Column(DateTime, default=lambda: datetime.utcnow(), onupdate=lambda: datetime.utcnow())
+    
+    # Relationship
+    user = relationship("User")
+
+
 class Movie(Base):
     """Movie model"""
     __tablename__ = "movies"
+    __table_args__ = (
+        Index("ix_movies_kinopoisk_id", "kinopoisk_id", unique=True),
+        Index("ix_movies_imdb_id", "imdb_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
@@ -91,18 +122,45 @@ class Movie(Base):
     slogan = Column(String, nullable=True)              # Слоган фильма
     countries = Column(String, nullable=True)           # JSON строка со странами
     genres = Column(String, nullable=True)              # comma-separated genres (compatible with main)
+    genre_mask = Column(BigInteger, nullable=False, default=0, server_default="0")  # bits of genre_entries
     
     created_at = Column(DateTime, default=lambda: datetime.utcnow())
     updated_at = Column(DateTime, nullable=True, onupdate=lambda: datetime.utcnow())  # Время последнего обновления из API
+    api_hash = Column(String(64), nullable=True)        # sha256 of the last Kinopoisk payload
     
     # Relationships
     slots = relationship("Slot", back_populates="movie")
     episodes = relationship("Episode", back_populates="series")
+    genre_entries = relationship("Genre", secondary="movie_genres", viewonly=True)
+
+
+class Genre(Base):
+    """Genre catalog; the id also selects the genre's bit in genre masks"""
+    __tablename__ = "genres"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+
+
+class MovieGenre(Base):
+    """Movie <-> genre association"""
+    __tablename__ = "movie_genres"
+    __table_args__ = (
+        Index("ix_movie_genres_genre_id", "genre_id"),
+    )
+    
+    movie_id = Column(Integer, ForeignKey("movies.id"), primary_key=True)
+    genre_id = Column(Integer, ForeignKey("genres.id"), primary_key=True)
 
 
 class Slot(Base):
     """Slot model"""
     __tablename__ = "slots"
+    __table_args__ = (
+        Index("ix_slots_status_datetime", "status", "datetime"),
+        Index("ix_slots_movie_status", "movie_id", "status"),
+        Index("ix_slots_creator_id", "creator_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     movie_id = Column(Integer, ForeignKey("movies.id"), nullable=False)
@@ -110,6 +168,8 @@ class Slot(Base):
     datetime = Column(DateTime, nullable=False)
     min_participants = Column(Integer, default=1)
     max_participants = Column(Integer, nullable=True)
+    # Denormalized len(participants), maintained by SlotParticipantRepository
+    participant_count = Column(Integer, nullable=False, default=0, server_default="0")
     status = Column(SQLEnum(SlotStatus.OPEN, SlotStatus.FULL, SlotStatus.COMPLETED, name="slot_status"), 
                     default=SlotStatus.OPEN)
     created_at = Column(DateTime, default=lambda: datetime.utcnow())
@@ -124,6 +184,10 @@ class Slot(Base):
 class SlotParticipant(Base):
     """Slot participant model"""
     __tablename__ = "slot_participants"
+    __table_args__ = (
+        Index("ix_slot_participants_slot_user", "slot_id", "user_id", unique=True),
+        Index("ix_slot_participants_user_slot", "user_id", "slot_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     slot_id = Column(Integer, ForeignKey("slots.id"), nullable=False)
@@ -138,6 +202,10 @@ class SlotParticipant(Base):
 class Room(Base):
     """Room model"""
     __tablename__ = "rooms"
+    __table_args__ = (
+        Index("ix_rooms_status", "status"),
+        Index("ix_rooms_telegram_group_id", "telegram_group_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     slot_id = Column(Integer, ForeignKey("slots.id"), nullable=False, unique=True)
@@ -157,6 +225,11 @@ class Room(Base):
 class Rating(Base):
     """Rating model"""
     __tablename__ = "ratings"
+    __table_args__ = (
+        Index("ix_rating_unique", "room_id", "rater_id", "rated_id", unique=True),
+        Index("ix_ratings_rated_score", "rated_id", "score"),
+        Index("ix_ratings_rater_id", "rater_id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
@@ -174,6 +247,9 @@ class Rating(Base):
 class Episode(Base):
     """Episode model for series"""
     __tablename__ = "episodes"
+    __table_args__ = (
+        Index("ix_episode_unique_per_series", "series_id", "season_number", "episode_number", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     series_id = Column(Integer, ForeignKey("movies.id"), nullable=False)  # references Movie with type 'series'
@@ -194,6 +270,11 @@ class Episode(Base):
 class Comment(Base):
     """Comments inside a room, optionally bound to a specific episode"""
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_room_created_at", "room_id", "created_at"),
+        Index("ix_comments_episode_created_at", "episode_id", "created_at"),
+        Index("ix_comments_reply_to_created_at", "reply_to_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
@@ -213,6 +294,9 @@ class Comment(Base):
 class Like(Base):
     """Likes for comments"""
     __tablename__ = "likes"
+    __table_args__ = (
+        Index("ix_likes_unique", "comment_id", "user_id", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     comment_id = Column(Integer, ForeignKey("comments.id"), nullable=False)
@@ -227,6 +311,10 @@ class Like(Base):
 class WatchHistory(Base):
     """Watch history of users for movies and episodes"""
     __tablename__ = "watch_history"
+    __table_args__ = (
+        Index("ix_watch_history_user_movie_episode", "user_id", "movie_id", "episode_id", "watched_at"),
+        Index("ix_watch_history_user_watched_at", "user_id", "watched_at"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id"), nullable=False)
@@ -240,3 +328,66 @@ class WatchHistory(Base):
     # Relationships
     user = relationship("User", back_populates="watch_history")
     episode = relationship("Episode", back_populates="watch_history")
+
+
+class RecommendationFeed(Base):
+    """A user whose recommendation feed is materialized (see RecommendationFeedItem)"""
+    __tablename__ = "recommendation_feeds"
+    
+    user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    built_at = Column(DateTime, default=lambda: datetime.utcnow())
+
+
+class RecommendationFeedItem(Base):
+    """A slot in a user's recommendation feed with its interest score"""
+    __tablename__ = "recommendation_feed_items"
+    __table_args__ = (
+        Index("ix_feed_items_user_score", "user_id", "score", "slot_id"),
+        Index("ix_feed_items_slot_id", "slot_id"),
+    )
+    
+    user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    slot_id = Column(Integer, ForeignKey("slots.id"), primary_key=True)
+    score = Column(Float, nullable=False)
+
+
+
+class TasteNeighbour(Base):
+    """One of a user's most similar users by co-rated KP movies.
+
+    Filled by TasteNeighbourService.compute (compute_taste_neighbours.py);
+    score is the vote similarity of MatchingService (1 - normalized MAE).
+    """
+    __tablename__ = "taste_neighbours"
+    __table_args__ = (
+        Index("ix_taste_neighbours_user_score", "user_id", "score"),
+        Index("ix_taste_neighbours_neighbour_id", "neighbour_id"),
+    )
+    
+    user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    neighbour_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    score = Column(Float, nullable=False)
+    common_count = Column(Integer, nullable=False)  # co-rated movies
+    computed_at = Column(DateTime, default=lambda: datetime.utcnow())
+
+
+class UserEmbedding(Base):
+    """A user's implicit-ALS factors, trained by train_embeddings.py.
+
+    vector is a float32 array (EmbeddingService.to_blob); the predicted
+    interest in a movie is its dot product with the MovieEmbedding vector.
+    """
+    __tablename__ = "user_embeddings"
+    
+    user_id = Column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)
+    trained_at = Column(DateTime, nullable=False, default=lambda: datetime.utcnow())
+
+
+class MovieEmbedding(Base):
+    """A movie's implicit-ALS factors, keyed by Kinopoisk id like user_votes"""
+    __tablename__ = "movie_embeddings"
+    
+    kinopoisk_id = Column(String, primary_key=True)
+    vector = Column(LargeBinary, nullable=False)
+    trained_at = Column(DateTime, nullable=False, default=lambda: datetime.utcnow())
@@ -1,14 +1,159 @@
 """Repository pattern for database operations"""
-from sqlalchemy.orm import Session
-from typing import Optional, List, Tuple, Dict
+from sqlalchemy import and_, or_, func, cast, Float, update, insert, delete, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, Query, joinedload, selectinload, load_only, contains_eager
+from sqlalchemy.orm.util import identity_key
+from typing import Optional, List, Tuple, Dict, NamedTuple
 from datetime import datetime
+import hashlib
+import json
 
 from bot.database.models import (
     User, Movie, Slot, SlotParticipant, Room, Rating,
     Episode, Comment, Like, WatchHistory,
-    UserKinopoisk, UserVote
+    UserKinopoisk, UserVote, UserPreferenceProfile,
+    RecommendationFeed, RecommendationFeedItem, Genre, MovieGenre, TasteNeighbour,
+    UserEmbedding, MovieEmbedding,
 )
-from bot.constants import SlotStatus, RoomStatus
+from bot.config import Config
+from bot.database.session import UNIT_OF_WORK
+from bot.database.user_cache import invalidate_user
+from bot.constants import SlotStatus, RoomStatus, JoinStatus
+from bot.utils.genres import split_genres, join_genres, genres_mask, top_genres
+
+# Session.info key: {genre name: id} already looked up in this session
+_GENRE_IDS = "genre_ids"
+
+
+def _commit(db: Session, *instances) -> None:
+    """Commit and refresh instances, or only flush inside a unit of work.
+
+    In unit-of-work mode (see session.unit_of_work) the caller commits once
+    per update; a flush is enough to get primary keys and make the rows
+    visible to later queries in the same transaction.
+    """
+    if db.info.get(UNIT_OF_WORK):
+        db.flush()
+        return
+    db.commit()
+    for instance in instances:
+        db.refresh(instance)
+
+
+def payload_hash(data: Dict) -> str:
+    """Content hash of an API payload, independent of key order"""
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class LoadProfile:
+    """Named eager-loading profiles, one per kind of call site.
+
+    Pass one as ``profile=`` to the Slot/Room read methods so the
+    relationships a call site renders are fetched up front instead of one
+    lazy query per row.
+    """
+    # Slot lists and buttons: movie basics (counts come from participant_count)
+    LIST_CARD = "list_card"
+    # Slot lists that check who participates (membership, compatibility)
+    WITH_MEMBERS = "with_members"
+    # Room creation / group setup: participants with their users, movie, room
+    ROOM_SETUP = "room_setup"
+
+
+_SLOT_PROFILES = {
+    LoadProfile.LIST_CARD: lambda: (
+        joinedload(Slot.movie).load_only(
+            Movie.id, Movie.title, Movie.year, Movie.type, Movie.kinopoisk_id, Movie.genre_mask
+        ),
+    ),
+    LoadProfile.WITH_MEMBERS: lambda: (
+        joinedload(Slot.movie).load_only(
+            Movie.id, Movie.title, Movie.year, Movie.type, Movie.kinopoisk_id, Movie.genre_mask
+        ),
+        selectinload(Slot.participants).load_only(
+            SlotParticipant.id, SlotParticipant.slot_id, SlotParticipant.user_id
+        ),
+    ),
+    LoadProfile.ROOM_SETUP: lambda: (
+        joinedload(Slot.movie),
+        joinedload(Slot.room),
+        selectinload(Slot.participants).joinedload(SlotParticipant.user),
+    ),
+}
+
+_ROOM_PROFILES = {
+    LoadProfile.LIST_CARD: lambda: (
+        joinedload(Room.slot).joinedload(Slot.movie).load_only(Movie.id, Movie.title),
+    ),
+    LoadProfile.ROOM_SETUP: lambda: (
+        joinedload(Room.slot).joinedload(Slot.movie),
+        joinedload(Room.slot).selectinload(Slot.participants).joinedload(SlotParticipant.user),
+    ),
+}
+
+
+def _with_profile(query: Query, profiles: Dict, profile: Optional[str]) -> Query:
+    """Apply the loader options of a named profile (None = lazy defaults)"""
+    if profile is None:
+        return query
+    if profile not in profiles:
+        raise ValueError(f"Unknown load profile: {profile}")
+    return query.options(*profiles[profile]())
+
+
+def _expire_slot_participants(db: Session, slot_id: int) -> None:
+    """Drop cached Slot.participants / participant_count after they changed underneath"""
+    slot = db.identity_map.get(identity_key(Slot, slot_id))
+    if slot is not None:
+        db.expire(slot, ["participants", "participant_count"])
+
+
+def _expire_user_rating(db: Session, user_id: int) -> None:
+    """Drop cached rating aggregates of a User after an UPDATE in SQL"""
+    user = db.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        db.expire(user, ["rating", "rating_sum", "total_ratings"])
+
+
+def _bump_participant_count(db: Session, slot_id: int, delta: int) -> None:
+    """Atomic participant_count += delta, evaluated by the database"""
+    db.query(Slot).filter(Slot.id == slot_id).update(
+        {Slot.participant_count: Slot.participant_count + delta},
+        synchronize_session=False,
+    )
+
+
+def _dialect_insert(db: Session, model):
+    """INSERT of the session's dialect, for ON CONFLICT clauses (PostgreSQL or SQLite)"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _lock_for_write(db: Session) -> None:
+    """Take the SQLite write lock before the first read of a read-modify-write.
+
+    pysqlite/aiosqlite open a deferred transaction only at the first DML, so
+    reads that precede it can be stale by the time the write runs.
+    BEGIN IMMEDIATE acquires the write lock up front (waiting up to
+    busy_timeout). If a transaction is already open, it has written and holds
+    the lock. Other dialects lock rows with SELECT ... FOR UPDATE instead.
+    """
+    connection = db.connection()
+    if connection.dialect.name != "sqlite":
+        return
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class JoinResult(NamedTuple):
+    """Outcome of SlotParticipantRepository.join"""
+    status: str
+    slot: Optional[Slot] = None
+    # Set when the slot reached min_participants and has (or just got) a room
+    room: Optional[Room] = None
+    room_created: bool = False
 
 
 class UserRepository:
@@ -26,15 +171,14 @@ class UserRepository:
                 first_name=first_name or "Unknown"
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            _commit(db, user)
         else:
             # Update username and first_name if provided
             if username is not None:
                 user.username = username
             if first_name is not None:
                 user.first_name = first_name
-            db.commit()
+            _commit(db)
         return user
     
     @staticmethod
@@ -42,19 +186,78 @@ class UserRepository:
         """Get user by ID"""
         return db.query(User).filter(User.id == user_id).first()
     
+    @staticmethod
+    def get_rating(db: Session, user_id: int) -> Optional[float]:
+        """Peer rating of a user (0.0 if unrated), None if the user does not exist"""
+        row = db.query(User.rating).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        return row.rating or 0.0
+    
+    @staticmethod
+    def get_ratings(db: Session, user_ids: List[int]) -> Dict[int, float]:
+        """get_rating of many users in one query; users that do not exist are omitted"""
+        if not user_ids:
+            return {}
+        rows = db.query(User.id, User.rating).filter(User.id.in_(set(user_ids))).all()
+        return {user_id: rating or 0.0 for user_id, rating in rows}
+    
     @staticmethod
     def update_rating(db: Session, user_id: int):
-        """Update user rating based on received ratings"""
+        """Recompute one user's rating aggregates from the ratings table.
+
+        RatingRepository.create keeps them current incrementally; this is the
+        single-user repair path (see reconcile_rating_aggregates for all users).
+        """
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
             return
         
-        ratings = db.query(Rating).filter(Rating.rated_id == user_id).all()
-        if ratings:
-            avg_rating = sum(r.score for r in ratings) / len(ratings)
-            user.rating = avg_rating
-            user.total_ratings = len(ratings)
-            db.commit()
+        score_sum, score_count = db.query(
+            func.coalesce(func.sum(Rating.score), 0), func.count(Rating.id)
+        ).filter(Rating.rated_id == user_id).one()
+        if score_count:
+            user.rating_sum = score_sum
+            user.total_ratings = score_count
+            user.rating = score_sum / score_count
+            invalidate_user(db, user_id)
+            _commit(db)
+    
+    @staticmethod
+    def reconcile_rating_aggregates(db: Session) -> List[int]:
+        """Fix users whose rating_sum/total_ratings drifted from ratings; return their ids.
+
+        One grouped query over ratings (served by ix_ratings_rated_score)
+        finds the drift, one bulk UPDATE by primary key repairs it.
+        """
+        totals = db.query(
+            Rating.rated_id.label("user_id"),
+            func.sum(Rating.score).label("score_sum"),
+            func.count(Rating.id).label("score_count"),
+        ).group_by(Rating.rated_id).subquery()
+        score_sum = func.coalesce(totals.c.score_sum, 0)
+        score_count = func.coalesce(totals.c.score_count, 0)
+        
+        drifted = db.query(User.id, score_sum, score_count).outerjoin(
+            totals, totals.c.user_id == User.id
+        ).filter(
+            or_(User.rating_sum != score_sum, User.total_ratings != score_count)
+        ).all()
+        if not drifted:
+            return []
+        
+        db.execute(update(User), [
+            {
+                "id": user_id,
+                "rating_sum": total,
+                "total_ratings": count,
+                "rating": total / count if count else 0.0,
+            }
+            for user_id, total, count in drifted
+        ])
+        invalidate_user(db, *[user_id for user_id, _total, _count in drifted])
+        _commit(db)
+        return [user_id for user_id, _total, _count in drifted]
 
 
 class MovieRepository:
@@ -76,14 +279,19 @@ class MovieRepository:
               age_rating: Optional[str] = None,
               slogan: Optional[str] = None,
               countries: Optional[str] = None,
-              genres: Optional[str] = None) -> Movie:
-        """Create a new movie"""
-        movie = Movie(
+              genres: Optional[str] = None,
+              api_hash: Optional[str] = None) -> Movie:
+        """Create a new movie; api_hash marks data fresh from the Kinopoisk API.
+
+        kinopoisk_id is unique: if another update already stored the movie,
+        that row is returned unchanged instead (see _insert_or_get).
+        """
+        values = dict(
             title=title,
             name_original=name_original,
             year=year,
             type=movie_type,
-            kinopoisk_id=kinopoisk_id,
+            kinopoisk_id=kinopoisk_id or None,
             imdb_id=imdb_id,
             description=description,
             poster_url=poster_url,
@@ -97,13 +305,36 @@ class MovieRepository:
             age_rating=age_rating,
             slogan=slogan,
             countries=countries,
-            genres=genres
+            genres=genres,
+            api_hash=api_hash,
+            updated_at=datetime.utcnow() if api_hash else None,
         )
-        db.add(movie)
-        db.commit()
-        db.refresh(movie)
+        if values["kinopoisk_id"]:
+            movie, created = MovieRepository._insert_or_get(db, values)
+            if not created:
+                return movie
+        else:
+            movie = Movie(**values)
+            db.add(movie)
+        if genres:
+            GenreRepository.set_movie_genres(db, movie, split_genres(genres))
+        _commit(db, movie)
         return movie
     
+    @staticmethod
+    def _insert_or_get(db: Session, values: Dict) -> Tuple[Movie, bool]:
+        """INSERT ... ON CONFLICT (kinopoisk_id) DO NOTHING, then the stored row.
+
+        Concurrent creators of one movie all get the row that was inserted
+        first instead of a duplicate or an IntegrityError. Returns (movie, created).
+        A conflicting INSERT waits for the first creator's transaction, so
+        callers commit before their next await.
+        """
+        inserted = db.execute(
+            _dialect_insert(db, Movie).values(**values).on_conflict_do_nothing(index_elements=["kinopoisk_id"])
+        ).rowcount
+        return MovieRepository.find_by_kinopoisk_id(db, values["kinopoisk_id"]), inserted == 1
+    
     @staticmethod
     def get_by_id(db: Session, movie_id: int) -> Optional[Movie]:
         """Get movie by ID"""
@@ -121,8 +352,17 @@ class MovieRepository:
     
     @staticmethod
     def update_from_api(db: Session, movie: Movie, api_data: Dict) -> Movie:
-        """Update movie data from Kinopoisk API response"""
-        from datetime import datetime
+        """Update movie data from Kinopoisk API response.
+
+        An unchanged payload (same content hash) only marks the movie fresh:
+        fields and genres are not rewritten.
+        """
+        api_hash = payload_hash(api_data)
+        if movie.api_hash == api_hash:
+            movie.updated_at = datetime.utcnow()
+            _commit(db)
+            return movie
+        movie.api_hash = api_hash
         
         # Update basic fields
         if api_data.get("nameRu"):
@@ -154,22 +394,64 @@ class MovieRepository:
         if api_data.get("slogan"):
             movie.slogan = api_data["slogan"]
         
-        # Store countries and genres as JSON strings
+        # Countries as a JSON string; genres go to the catalog
         if api_data.get("countries"):
             import json
             movie.countries = json.dumps([c.get("country", "") for c in api_data["countries"]], ensure_ascii=False)
         if api_data.get("genres"):
-            import json
-            movie.genres = json.dumps([g.get("genre", "") for g in api_data["genres"]], ensure_ascii=False)
+            GenreRepository.set_movie_genres(db, movie, [g.get("genre", "") for g in api_data["genres"]])
         
         # Update timestamp
         movie.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(movie)
+        _commit(db, movie)
         return movie
 
 
+class GenreRepository:
+    """Repository for the genre catalog and movie genres"""
+    
+    @staticmethod
+    def get_ids(db: Session, names: List[str]) -> Dict[str, int]:
+        """{name: id} of genre names, adding unknown names to the catalog"""
+        known = db.info.setdefault(_GENRE_IDS, {})
+        missing = [name for name in dict.fromkeys(names) if name not in known]
+        if missing:
+            known.update(db.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all())
+            missing = [name for name in missing if name not in known]
+        if missing:
+            # A concurrent writer may add the same names first
+            db.execute(
+                _dialect_insert(db, Genre).values([{"name": name} for name in missing])
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            known.update(db.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)).all())
+        return {name: known[name] for name in names}
+    
+    @staticmethod
+    def set_movie_genres(db: Session, movie: Movie, names: List[str]) -> None:
+        """Replace a movie's genres: text column, association rows and genre_mask.
+
+        The caller commits.
+        """
+        movie.genres = join_genres(names)
+        names = split_genres(movie.genres)
+        if movie.id is None:
+            db.flush()
+        ids = GenreRepository.get_ids(db, names)
+        db.execute(delete(MovieGenre).where(MovieGenre.movie_id == movie.id))
+        if ids:
+            db.execute(insert(MovieGenre), [{"movie_id": movie.id, "genre_id": gid} for gid in ids.values()])
+        movie.genre_mask = genres_mask(ids.values())
+        db.expire(movie, ["genre_entries"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_genre_ids(session):
+    # Ids of genres added by the rolled back transaction are gone
+    session.info.pop(_GENRE_IDS, None)
+
+
 class SlotRepository:
     """Repository for Slot operations"""
     
@@ -185,40 +467,89 @@ class SlotRepository:
             max_participants=max_participants
         )
         db.add(slot)
-        db.commit()
-        db.refresh(slot)
+        _commit(db, slot)
         return slot
     
     @staticmethod
-    def get_by_id(db: Session, slot_id: int) -> Optional[Slot]:
+    def get_by_id(db: Session, slot_id: int, profile: Optional[str] = None) -> Optional[Slot]:
         """Get slot by ID"""
-        return db.query(Slot).filter(Slot.id == slot_id).first()
+        query = db.query(Slot).filter(Slot.id == slot_id)
+        return _with_profile(query, _SLOT_PROFILES, profile).first()
     
     @staticmethod
-    def get_by_movie(db: Session, movie_id: int) -> List[Slot]:
+    def get_by_movie(db: Session, movie_id: int, profile: Optional[str] = None) -> List[Slot]:
         """Get all slots for a movie"""
-        return db.query(Slot).filter(
+        query = db.query(Slot).filter(
             Slot.movie_id == movie_id,
             Slot.status == SlotStatus.OPEN
-        ).all()
+        )
+        return _with_profile(query, _SLOT_PROFILES, profile).all()
+    
+    @staticmethod
+    def get_by_movies(db: Session, movie_ids: List[int], profile: Optional[str] = None) -> List[Slot]:
+        """get_by_movie for several movies (e.g. duplicates of one Kinopoisk id) in one query"""
+        if not movie_ids:
+            return []
+        query = db.query(Slot).filter(
+            Slot.movie_id.in_(movie_ids),
+            Slot.status == SlotStatus.OPEN
+        ).order_by(Slot.movie_id, Slot.id)
+        return _with_profile(query, _SLOT_PROFILES, profile).all()
     
     @staticmethod
-    def get_all_open(db: Session) -> List[Slot]:
+    def get_all_open(db: Session, profile: Optional[str] = None) -> List[Slot]:
         """Get all open slots across all movies"""
-        return db.query(Slot).filter(Slot.status == SlotStatus.OPEN).all()
+        query = db.query(Slot).filter(Slot.status == SlotStatus.OPEN)
+        return _with_profile(query, _SLOT_PROFILES, profile).all()
     
     @staticmethod
-    def get_by_creator(db: Session, creator_id: int) -> List[Slot]:
+    def get_recommendation_candidates(db: Session, user_id: int, score, limit: int,
+                                      after: Optional[Tuple[float, int]] = None) -> List[Tuple[Slot, float]]:
+        """Open future slots the user neither joined nor voted for, as (slot, score).
+
+        ``score`` is a SQL expression over Movie columns; rows come ordered by
+        score desc, slot id desc. ``after`` is the (score, slot id) of the last
+        row of the previous page (keyset pagination). Slots carry the
+        LIST_CARD movie columns from the same join.
+        """
+        joined = db.query(SlotParticipant.id).filter(
+            SlotParticipant.slot_id == Slot.id, SlotParticipant.user_id == user_id
+        ).exists()
+        watched = db.query(UserVote.id).filter(
+            UserVote.user_id == user_id, UserVote.kinopoisk_id == Movie.kinopoisk_id
+        ).exists()
+        score = score.label("cheap_score")
+        query = db.query(Slot, score).join(Slot.movie).options(
+            contains_eager(Slot.movie).load_only(
+                Movie.id, Movie.title, Movie.year, Movie.type, Movie.kinopoisk_id, Movie.genre_mask
+            )
+        ).filter(
+            Slot.status == SlotStatus.OPEN,
+            # Slot times are naive local times, as entered in handle_slot_datetime
+            Slot.datetime > datetime.now(),
+            ~joined,
+            ~watched,
+        )
+        if after is not None:
+            after_score, after_id = after
+            query = query.filter(or_(score < after_score, and_(score == after_score, Slot.id < after_id)))
+        query = query.order_by(score.desc(), Slot.id.desc()).limit(limit)
+        return [(slot, cheap) for slot, cheap in query.all()]
+    
+    @staticmethod
+    def get_by_creator(db: Session, creator_id: int, profile: Optional[str] = None) -> List[Slot]:
         """Get all slots created by user"""
-        return db.query(Slot).filter(Slot.creator_id == creator_id).all()
+        query = db.query(Slot).filter(Slot.creator_id == creator_id)
+        return _with_profile(query, _SLOT_PROFILES, profile).all()
     
     @staticmethod
-    def get_user_participations(db: Session, user_id: int) -> List[Slot]:
+    def get_user_participations(db: Session, user_id: int, profile: Optional[str] = None) -> List[Slot]:
         """Get all slots where user is a participant"""
-        return db.query(Slot).join(SlotParticipant).filter(
+        query = db.query(Slot).join(SlotParticipant).filter(
             SlotParticipant.user_id == user_id,
             Slot.status.in_([SlotStatus.OPEN, SlotStatus.FULL])
-        ).all()
+        )
+        return _with_profile(query, _SLOT_PROFILES, profile).all()
 
 
 class SlotParticipantRepository:
@@ -240,10 +571,61 @@ class SlotParticipantRepository:
             user_id=user_id
         )
         db.add(participant)
-        db.commit()
-        db.refresh(participant)
+        _bump_participant_count(db, slot_id, 1)
+        _commit(db, participant)
+        _expire_slot_participants(db, slot_id)
         return participant
     
+    @staticmethod
+    def join(db: Session, slot_id: int, user_id: int) -> JoinResult:
+        """Join a slot: capacity check, insert and room promotion in one transaction.
+
+        The slot row is locked first (SELECT ... FOR UPDATE on Postgres,
+        BEGIN IMMEDIATE on SQLite), so concurrent joins of the same slot are
+        serialized: they cannot overshoot max_participants, collide on the
+        (slot_id, user_id) unique index or create a second room.
+        """
+        _lock_for_write(db)
+        slot = db.query(Slot).filter(Slot.id == slot_id).with_for_update().populate_existing().first()
+        if slot is None:
+            return JoinResult(JoinStatus.NOT_FOUND)
+        
+        existing = db.query(SlotParticipant.id).filter(
+            SlotParticipant.slot_id == slot_id,
+            SlotParticipant.user_id == user_id
+        ).first()
+        if existing:
+            return JoinResult(JoinStatus.ALREADY_JOINED, slot)
+        
+        # Conditional increment: capacity check and counter update in one statement
+        claimed = db.query(Slot).filter(
+            Slot.id == slot_id,
+            or_(Slot.max_participants.is_(None), Slot.participant_count < Slot.max_participants)
+        ).update(
+            {Slot.participant_count: Slot.participant_count + 1},
+            synchronize_session=False,
+        )
+        if not claimed:
+            return JoinResult(JoinStatus.FULL, slot)
+        
+        db.add(SlotParticipant(slot_id=slot_id, user_id=user_id))
+        db.flush()
+        _expire_slot_participants(db, slot_id)
+        
+        # Room promotion, same rule as RoomManager.should_create_room
+        room = None
+        room_created = False
+        if slot.participant_count >= slot.min_participants and slot.status in (SlotStatus.OPEN, SlotStatus.FULL):
+            room = db.query(Room).filter(Room.slot_id == slot_id).first()
+            if room is None:
+                room = Room(slot_id=slot_id)
+                db.add(room)
+                room_created = True
+            slot.status = SlotStatus.FULL
+        
+        _commit(db, slot, *([room] if room is not None else []))
+        return JoinResult(JoinStatus.JOINED, slot, room, room_created)
+    
     @staticmethod
     def remove_participant(db: Session, slot_id: int, user_id: int) -> bool:
         """Remove participant from slot"""
@@ -253,14 +635,30 @@ class SlotParticipantRepository:
         ).first()
         if participant:
             db.delete(participant)
-            db.commit()
+            _bump_participant_count(db, slot_id, -1)
+            _commit(db)
+            _expire_slot_participants(db, slot_id)
             return True
         return False
     
     @staticmethod
     def get_participants_count(db: Session, slot_id: int) -> int:
         """Get number of participants in slot"""
-        return db.query(SlotParticipant).filter(SlotParticipant.slot_id == slot_id).count()
+        count = db.query(Slot.participant_count).filter(Slot.id == slot_id).scalar()
+        return count or 0
+    
+    @staticmethod
+    def get_user_slot_ids(db: Session, user_id: int) -> set:
+        """Ids of slots the user participates in"""
+        rows = db.query(SlotParticipant.slot_id).filter(SlotParticipant.user_id == user_id).all()
+        return {slot_id for (slot_id,) in rows}
+    
+    @staticmethod
+    def iter_participations(db: Session, batch_size: int = 10000):
+        """(user_id, kinopoisk_id) of every slot participation in a movie with a Kinopoisk id"""
+        return db.query(SlotParticipant.user_id, Movie.kinopoisk_id).join(
+            Slot, Slot.id == SlotParticipant.slot_id
+        ).join(Movie, Movie.id == Slot.movie_id).filter(Movie.kinopoisk_id.isnot(None)).yield_per(batch_size)
 
 
 class RoomRepository:
@@ -271,8 +669,7 @@ class RoomRepository:
         """Create a new room"""
         room = Room(slot_id=slot_id)
         db.add(room)
-        db.commit()
-        db.refresh(room)
+        _commit(db, room)
         return room
     
     @staticmethod
@@ -288,17 +685,17 @@ class RoomRepository:
             room.telegram_group_id = telegram_group_id
             if telegram_topic_id is not None:
                 room.telegram_topic_id = telegram_topic_id
-            db.commit()
-            db.refresh(room)
+            _commit(db, room)
         return room
     
     @staticmethod
-    def get_user_rooms(db: Session, user_id: int) -> List[Room]:
+    def get_user_rooms(db: Session, user_id: int, profile: Optional[str] = None) -> List[Room]:
         """Get all rooms where user is a participant"""
-        return db.query(Room).join(Slot).join(SlotParticipant).filter(
+        query = db.query(Room).join(Slot).join(SlotParticipant).filter(
             SlotParticipant.user_id == user_id,
             Room.status == RoomStatus.ACTIVE
-        ).all()
+        )
+        return _with_profile(query, _ROOM_PROFILES, profile).all()
 
 
 class RatingRepository:
@@ -314,8 +711,19 @@ class RatingRepository:
             score=score
         )
         db.add(rating)
-        db.commit()
-        db.refresh(rating)
+        # Running aggregates of the rated user, committed together with the rating.
+        # SET expressions see the old row values on both SQLite and Postgres.
+        db.query(User).filter(User.id == rated_id).update(
+            {
+                User.rating_sum: User.rating_sum + score,
+                User.total_ratings: User.total_ratings + 1,
+                User.rating: cast(User.rating_sum + score, Float) / (User.total_ratings + 1),
+            },
+            synchronize_session=False,
+        )
+        invalidate_user(db, rated_id)
+        _commit(db, rating)
+        _expire_user_rating(db, rated_id)
         return rating
     
     @staticmethod
@@ -365,8 +773,7 @@ class EpisodeRepository:
             runtime_minutes=runtime_minutes
         )
         db.add(episode)
-        db.commit()
-        db.refresh(episode)
+        _commit(db, episode)
         return episode
     
     @staticmethod
@@ -415,8 +822,7 @@ class CommentRepository:
             reply_to_id=reply_to_id
         )
         db.add(comment)
-        db.commit()
-        db.refresh(comment)
+        _commit(db, comment)
         return comment
     
     @staticmethod
@@ -452,7 +858,7 @@ class CommentRepository:
         comment = db.query(Comment).filter(Comment.id == comment_id).first()
         if comment:
             db.delete(comment)
-            db.commit()
+            _commit(db)
             return True
         return False
 
@@ -471,13 +877,13 @@ class LikeRepository:
         if existing:
             # Unlike
             db.delete(existing)
-            db.commit()
+            _commit(db)
             return (False, False)
         else:
             # Like
             like = Like(comment_id=comment_id, user_id=user_id)
             db.add(like)
-            db.commit()
+            _commit(db)
             return (True, True)
     
     @staticmethod
@@ -540,8 +946,7 @@ class WatchHistoryRepository:
             )
             db.add(watch)
         
-        db.commit()
-        db.refresh(watch)
+        _commit(db, watch)
         return watch
     
     @staticmethod
@@ -595,11 +1000,16 @@ class UserKinopoiskRepository:
         else:
             record = UserKinopoisk(user_id=user_id, kp_user_id=kp_user_id)
             db.add(record)
-        db.commit()
-        db.refresh(record)
+        _commit(db, record)
         return record
 
 
+class VoteUpsertResult(NamedTuple):
+    """Outcome of UserVoteRepository.upsert_votes"""
+    inserted: int
+    updated: int
+
+
 class UserVoteRepository:
     """Repository for storing and querying user movie votes"""
     
@@ -607,10 +1017,13 @@ class UserVoteRepository:
     def upsert_vote(db: Session, user_id: int, kinopoisk_id: str, title: Optional[str], 
                     year: Optional[int], movie_type: Optional[str], user_rating: int,
                     poster_url: Optional[str] = None, genres: Optional[str] = None) -> UserVote:
+        if genres:
+            genres = join_genres(split_genres(genres))
         vote = db.query(UserVote).filter(
             UserVote.user_id == user_id,
             UserVote.kinopoisk_id == kinopoisk_id
         ).first()
+        old_features = _vote_features(vote) if vote else None
         if vote:
             vote.user_rating = user_rating
             vote.title = title
@@ -632,14 +1045,473 @@ class UserVoteRepository:
                 genres=genres
             )
             db.add(vote)
-        db.commit()
-        db.refresh(vote)
+        new_features = _vote_features(vote)
+        if new_features != old_features:
+            PreferenceProfileRepository.apply_vote_change(db, user_id, old_features, new_features)
+        invalidate_user(db, user_id)
+        _commit(db, vote)
         return vote
     
+    @staticmethod
+    def upsert_votes(db: Session, user_id: int, votes: List[Dict]) -> VoteUpsertResult:
+        """upsert_vote for a batch (e.g. one API page) of a user's votes.
+
+        votes are dicts with upsert_vote's keyword arguments; the last vote
+        of a kinopoisk_id wins. One SELECT reads the votes being replaced
+        (for the preference profile and the counts), one
+        INSERT ... ON CONFLICT (user_id, kinopoisk_id) DO UPDATE writes the
+        batch, and the profile is updated once.
+        """
+        now = datetime.utcnow()
+        rows: Dict[str, Dict] = {}
+        for vote in votes:
+            genres = vote.get("genres")
+            rows[vote["kinopoisk_id"]] = {
+                "user_id": user_id,
+                "kinopoisk_id": vote["kinopoisk_id"],
+                "title": vote.get("title"),
+                "year": vote.get("year"),
+                "type": vote.get("movie_type"),
+                "user_rating": vote["user_rating"],
+                "poster_url": vote.get("poster_url"),
+                "genres": join_genres(split_genres(genres)) if genres else genres,
+                "created_at": now,
+                "updated_at": now,
+            }
+        if not rows:
+            return VoteUpsertResult(0, 0)
+        
+        existing = {
+            kinopoisk_id: (year, vote_type, genres)
+            for kinopoisk_id, year, vote_type, genres in db.query(
+                UserVote.kinopoisk_id, UserVote.year, UserVote.type, UserVote.genres
+            ).filter(UserVote.user_id == user_id, UserVote.kinopoisk_id.in_(list(rows)))
+        }
+        # Rows passed as parameters: the statement compiles once and is cached;
+        # render_nulls keeps rows with different NULL columns in one batch
+        stmt = _dialect_insert(db, UserVote)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "kinopoisk_id"],
+            set_={
+                "title": stmt.excluded.title,
+                "year": stmt.excluded.year,
+                "type": stmt.excluded.type,
+                "user_rating": stmt.excluded.user_rating,
+                "poster_url": stmt.excluded.poster_url,
+                # Like upsert_vote: a vote without genres keeps the stored ones
+                "genres": func.coalesce(stmt.excluded.genres, UserVote.genres),
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ), list(rows.values()), execution_options={"render_nulls": True})
+        
+        changes = []
+        for kinopoisk_id, row in rows.items():
+            old = existing.get(kinopoisk_id)
+            genres = row["genres"] if row["genres"] is not None else (old[2] if old else None)
+            old_features = (old[0], old[1], tuple(split_genres(old[2]))) if old else None
+            new_features = (row["year"], row["type"], tuple(split_genres(genres)))
+            if new_features != old_features:
+                changes.append((old_features, new_features))
+        if changes:
+            PreferenceProfileRepository.apply_vote_changes(db, user_id, changes)
+        invalidate_user(db, user_id)
+        _commit(db)
+        return VoteUpsertResult(inserted=len(rows) - len(existing), updated=len(existing))
+    
     @staticmethod
     def get_user_votes_map(db: Session, user_id: int) -> dict[str, int]:
         """Return {kinopoisk_id: user_rating} map for user"""
         votes = db.query(UserVote).filter(UserVote.user_id == user_id).all()
         return {v.kinopoisk_id: v.user_rating for v in votes}
+    
+    @staticmethod
+    def get_votes_maps(db: Session, user_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """get_user_votes_map of many users in one query (users without votes map to {})"""
+        maps: Dict[int, Dict[str, int]] = {user_id: {} for user_id in user_ids}
+        if not maps:
+            return maps
+        rows = db.query(UserVote.user_id, UserVote.kinopoisk_id, UserVote.user_rating).filter(
+            UserVote.user_id.in_(list(maps))
+        ).all()
+        for user_id, kinopoisk_id, rating in rows:
+            maps[user_id][kinopoisk_id] = rating
+        return maps
+    
+    @staticmethod
+    def iter_all_ratings(db: Session, batch_size: int = 10000):
+        """(user_id, kinopoisk_id, user_rating) of every vote, streamed in batches"""
+        return db.query(UserVote.user_id, UserVote.kinopoisk_id, UserVote.user_rating).yield_per(batch_size)
+
 
+def _vote_features(vote: UserVote) -> Tuple[Optional[int], Optional[str], Tuple[str, ...]]:
+    """The parts of a vote that the preference profile aggregates"""
+    return vote.year, vote.type, tuple(split_genres(vote.genres))
 
+
+def _reset_profile(profile: UserPreferenceProfile) -> None:
+    profile.vote_count = profile.year_sum = profile.year_count = profile.genre_mask = 0
+    profile.type_counts = profile.genre_counts = profile.top_genre_counts = "{}"
+
+
+def _add_features(profile: UserPreferenceProfile, type_counts: Dict[str, int],
+                  genre_counts: Dict[str, int], features: tuple, sign: int) -> None:
+    year, vote_type, genres = features
+    profile.vote_count += sign
+    if year is not None:
+        profile.year_sum += sign * year
+        profile.year_count += sign
+    if vote_type:
+        _bump_count(type_counts, vote_type, sign)
+    for genre in genres:
+        _bump_count(genre_counts, genre, sign)
+
+
+def _store_counts(db: Session, profile: UserPreferenceProfile,
+                  type_counts: Dict[str, int], genre_counts: Dict[str, int]) -> None:
+    profile.type_counts = json.dumps(type_counts, ensure_ascii=False, sort_keys=True)
+    profile.genre_counts = json.dumps(genre_counts, ensure_ascii=False, sort_keys=True)
+    ids = GenreRepository.get_ids(db, top_genres(genre_counts, Config.PROFILE_TOP_GENRES))
+    profile.genre_mask = genres_mask(ids.values())
+    profile.top_genre_counts = json.dumps(
+        {str(genre_id): genre_counts[name] for name, genre_id in ids.items()}, sort_keys=True
+    )
+
+
+def _bump_count(counts: Dict[str, int], key: str, delta: int) -> None:
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+class PreferenceProfileRepository:
+    """Repository for per-user preference profiles (aggregates of KP votes)"""
+    
+    @staticmethod
+    def get(db: Session, user_id: int) -> Optional[UserPreferenceProfile]:
+        return db.get(UserPreferenceProfile, user_id)
+    
+    @staticmethod
+    def apply_vote_change(db: Session, user_id: int, removed: Optional[tuple], added: Optional[tuple]) -> UserPreferenceProfile:
+        """Update the profile for one vote replaced (removed -> added); either side may be None.
+
+        The caller commits, together with the vote itself.
+        """
+        return PreferenceProfileRepository.apply_vote_changes(db, user_id, [(removed, added)])
+    
+    @staticmethod
+    def apply_vote_changes(db: Session, user_id: int, changes: List[Tuple[Optional[tuple], Optional[tuple]]]) -> UserPreferenceProfile:
+        """apply_vote_change for many (removed, added) pairs, reading and storing the profile once"""
+        profile = db.get(UserPreferenceProfile, user_id)
+        if profile is None:
+            profile = UserPreferenceProfile(user_id=user_id)
+            _reset_profile(profile)
+            db.add(profile)
+        type_counts = json.loads(profile.type_counts)
+        genre_counts = json.loads(profile.genre_counts)
+        for removed, added in changes:
+            if removed is not None:
+                _add_features(profile, type_counts, genre_counts, removed, -1)
+            if added is not None:
+                _add_features(profile, type_counts, genre_counts, added, 1)
+        _store_counts(db, profile, type_counts, genre_counts)
+        return profile
+    
+    @staticmethod
+    def rebuild(db: Session, user_id: int) -> UserPreferenceProfile:
+        """Recompute a user's profile from all of their votes"""
+        profile = db.get(UserPreferenceProfile, user_id)
+        if profile is None:
+            profile = UserPreferenceProfile(user_id=user_id)
+            db.add(profile)
+        _reset_profile(profile)
+        type_counts: Dict[str, int] = {}
+        genre_counts: Dict[str, int] = {}
+        rows = db.query(UserVote.year, UserVote.type, UserVote.genres).filter(UserVote.user_id == user_id).all()
+        for year, vote_type, genres in rows:
+            _add_features(profile, type_counts, genre_counts, (year, vote_type, tuple(split_genres(genres))), 1)
+        _store_counts(db, profile, type_counts, genre_counts)
+        _commit(db, profile)
+        return profile
+
+
+class RecommendationFeedRepository:
+    """Repository for materialized per-user recommendation feeds"""
+    
+    @staticmethod
+    def exists(db: Session, user_id: int) -> bool:
+        return db.query(RecommendationFeed.user_id).filter(RecommendationFeed.user_id == user_id).first() is not None
+    
+    @staticmethod
+    def replace(db: Session, user_id: int, items: List[Tuple[int, float]]) -> None:
+        """Store a freshly built feed of (slot_id, score), replacing the old one"""
+        db.execute(delete(RecommendationFeedItem).where(RecommendationFeedItem.user_id == user_id))
+        feed = db.get(RecommendationFeed, user_id)
+        if feed is None:
+            db.add(RecommendationFeed(user_id=user_id, built_at=datetime.utcnow()))
+        else:
+            feed.built_at = datetime.utcnow()
+        if items:
+            db.execute(insert(RecommendationFeedItem), [
+                {"user_id": user_id, "slot_id": slot_id, "score": score} for slot_id, score in items
+            ])
+        _commit(db)
+    
+    @staticmethod
+    def get_subscribers(db: Session, slot: Slot,
+                        user_id: Optional[int] = None) -> List[Tuple[int, Optional[UserPreferenceProfile]]]:
+        """Users with a feed that may get this slot: (user_id, preference profile or None).
+
+        Skips the slot's participants and users who voted for its movie;
+        ``user_id`` narrows the check to one user.
+        """
+        joined = db.query(SlotParticipant.id).filter(
+            SlotParticipant.slot_id == slot.id, SlotParticipant.user_id == RecommendationFeed.user_id
+        ).exists()
+        query = db.query(RecommendationFeed.user_id, UserPreferenceProfile).outerjoin(
+            UserPreferenceProfile, UserPreferenceProfile.user_id == RecommendationFeed.user_id
+        ).filter(~joined)
+        if user_id is not None:
+            query = query.filter(RecommendationFeed.user_id == user_id)
+        kinopoisk_id = slot.movie.kinopoisk_id if slot.movie else None
+        if kinopoisk_id:
+            watched = db.query(UserVote.id).filter(
+                UserVote.user_id == RecommendationFeed.user_id, UserVote.kinopoisk_id == kinopoisk_id
+            ).exists()
+            query = query.filter(~watched)
+        return query.all()
+    
+    @staticmethod
+    def add_items(db: Session, slot_id: int, scores: Dict[int, float]) -> None:
+        """Add one slot to several users' feeds ({user_id: score})"""
+        if not scores:
+            return
+        db.execute(delete(RecommendationFeedItem).where(
+            RecommendationFeedItem.slot_id == slot_id, RecommendationFeedItem.user_id.in_(list(scores))
+        ))
+        db.execute(insert(RecommendationFeedItem), [
+            {"user_id": user_id, "slot_id": slot_id, "score": score} for user_id, score in scores.items()
+        ])
+        _commit(db)
+    
+    @staticmethod
+    def remove_item(db: Session, user_id: int, slot_id: int) -> None:
+        db.execute(delete(RecommendationFeedItem).where(
+            RecommendationFeedItem.user_id == user_id, RecommendationFeedItem.slot_id == slot_id
+        ))
+        _commit(db)
+    
+    @staticmethod
+    def remove_slot(db: Session, slot_id: int) -> None:
+        """Drop a slot from every feed (it filled up or was closed)"""
+        db.execute(delete(RecommendationFeedItem).where(RecommendationFeedItem.slot_id == slot_id))
+        _commit(db)
+    
+    @staticmethod
+    def get_user_ids(db: Session, user_ids: List[int], kinopoisk_ids: List[str]) -> List[int]:
+        """Users with a feed who are in user_ids or have a slot of one of kinopoisk_ids in it"""
+        conditions = []
+        if user_ids:
+            conditions.append(RecommendationFeed.user_id.in_(set(user_ids)))
+        if kinopoisk_ids:
+            with_movie = db.query(RecommendationFeedItem.user_id).join(
+                Slot, Slot.id == RecommendationFeedItem.slot_id
+            ).join(Movie, Movie.id == Slot.movie_id).filter(Movie.kinopoisk_id.in_(set(kinopoisk_ids)))
+            conditions.append(RecommendationFeed.user_id.in_(with_movie.scalar_subquery()))
+        if not conditions:
+            return []
+        return [user_id for (user_id,) in db.query(RecommendationFeed.user_id).filter(or_(*conditions))]
+    
+    @staticmethod
+    def delete(db: Session, user_ids: Optional[List[int]] = None) -> int:
+        """Drop the feeds of user_ids (None: every feed); return how many were dropped"""
+        items, feeds = delete(RecommendationFeedItem), delete(RecommendationFeed)
+        if user_ids is not None:
+            if not user_ids:
+                return 0
+            items = items.where(RecommendationFeedItem.user_id.in_(user_ids))
+            feeds = feeds.where(RecommendationFeed.user_id.in_(user_ids))
+        db.execute(items)
+        dropped = db.execute(feeds).rowcount
+        _commit(db)
+        return dropped
+    
+    @staticmethod
+    def purge_closed(db: Session) -> int:
+        """Drop feed items of slots that are no longer open or already started"""
+        closed = db.query(Slot.id).filter(or_(Slot.status != SlotStatus.OPEN, Slot.datetime <= datetime.now()))
+        result = db.execute(delete(RecommendationFeedItem).where(
+            RecommendationFeedItem.slot_id.in_(closed.scalar_subquery())
+        ))
+        _commit(db)
+        return result.rowcount
+    
+    @staticmethod
+    def get_page(db: Session, user_id: int, limit: int,
+                 after: Optional[Tuple[float, int]] = None) -> List[Tuple[Slot, float]]:
+        """One page of a stored feed as (slot, score), best first, keyset-paginated like
+        SlotRepository.get_recommendation_candidates.
+
+        Slots that closed, started or were joined since the feed was updated are
+        skipped here too, so a missed event never shows a stale slot.
+        """
+        joined = db.query(SlotParticipant.id).filter(
+            SlotParticipant.slot_id == Slot.id, SlotParticipant.user_id == user_id
+        ).exists()
+        query = db.query(Slot, RecommendationFeedItem.score).join(
+            RecommendationFeedItem, RecommendationFeedItem.slot_id == Slot.id
+        ).join(Slot.movie).options(
+            contains_eager(Slot.movie).load_only(
+                Movie.id, Movie.title, Movie.year, Movie.type, Movie.kinopoisk_id, Movie.genre_mask
+            )
+        ).filter(
+            RecommendationFeedItem.user_id == user_id,
+            Slot.status == SlotStatus.OPEN,
+            # Local time, like Slot.datetime
+            Slot.datetime > datetime.now(),
+            ~joined,
+        )
+        if after is not None:
+            after_score, after_id = after
+            query = query.filter(or_(
+                RecommendationFeedItem.score < after_score,
+                and_(RecommendationFeedItem.score == after_score, RecommendationFeedItem.slot_id < after_id),
+            ))
+        # Same direction on both columns: a backward range scan of ix_feed_items_user_score
+        query = query.order_by(
+            RecommendationFeedItem.score.desc(), RecommendationFeedItem.slot_id.desc()
+        ).limit(limit)
+        return [(slot, score) for slot, score in query.all()]
+
+
+class TasteNeighbourRepository:
+    """Repository for precomputed taste neighbours"""
+    
+    @staticmethod
+    def replace(db: Session, neighbours: Dict[int, List[Tuple[int, float, int]]],
+                user_ids: Optional[List[int]] = None) -> int:
+        """Store {user_id: [(neighbour_id, score, common_count)]}; return rows written.
+
+        Old rows of ``user_ids`` are dropped first, or every row when None.
+        """
+        query = db.query(TasteNeighbour)
+        if user_ids is not None:
+            query = query.filter(TasteNeighbour.user_id.in_(user_ids))
+        query.delete(synchronize_session=False)
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, "neighbour_id": neighbour_id, "score": score,
+             "common_count": common, "computed_at": now}
+            for user_id, items in neighbours.items() for neighbour_id, score, common in items
+        ]
+        if rows:
+            db.execute(insert(TasteNeighbour), rows)
+        _commit(db)
+        return len(rows)
+    
+    @staticmethod
+    def has_neighbours(db: Session, user_id: int) -> bool:
+        return db.query(TasteNeighbour.user_id).filter(TasteNeighbour.user_id == user_id).first() is not None
+    
+    @staticmethod
+    def get_scores(db: Session, user_id: int, neighbour_ids: List[int]) -> Dict[int, float]:
+        """{neighbour_id: score} for those of neighbour_ids that are the user's neighbours"""
+        if not neighbour_ids:
+            return {}
+        rows = db.query(TasteNeighbour.neighbour_id, TasteNeighbour.score).filter(
+            TasteNeighbour.user_id == user_id, TasteNeighbour.neighbour_id.in_(set(neighbour_ids))
+        ).all()
+        return dict(rows)
+    
+    @staticmethod
+    def get_neighbour_slots(db: Session, user_id: int, limit: int) -> List[Tuple[Slot, int, float]]:
+        """Open future slots with the user's neighbours among participants.
+
+        Returns (slot, neighbours in the slot, sum of their scores), best sum
+        first; slots the user joined are skipped. Slots carry LIST_CARD columns.
+        """
+        in_slot = db.query(
+            SlotParticipant.slot_id,
+            func.count().label("neighbours"),
+            func.sum(TasteNeighbour.score).label("affinity"),
+        ).join(
+            TasteNeighbour, and_(
+                TasteNeighbour.neighbour_id == SlotParticipant.user_id, TasteNeighbour.user_id == user_id
+            )
+        ).group_by(SlotParticipant.slot_id).subquery()
+        joined = db.query(SlotParticipant.id).filter(
+            SlotParticipant.slot_id == Slot.id, SlotParticipant.user_id == user_id
+        ).exists()
+        query = db.query(Slot, in_slot.c.neighbours, in_slot.c.affinity).join(
+            in_slot, in_slot.c.slot_id == Slot.id
+        ).filter(
+            Slot.status == SlotStatus.OPEN,
+            # Local time, like Slot.datetime
+            Slot.datetime > datetime.now(),
+            ~joined,
+        ).order_by(in_slot.c.affinity.desc(), Slot.id.desc()).limit(limit)
+        query = _with_profile(query, _SLOT_PROFILES, LoadProfile.LIST_CARD)
+        return [(slot, neighbours, affinity) for slot, neighbours, affinity in query.all()]
+
+
+
+class EmbeddingRepository:
+    """Repository for trained user and movie embeddings (float32 blobs)"""
+    
+    @staticmethod
+    def get_user_vectors(db: Session, user_ids: Optional[List[int]] = None) -> Dict[int, bytes]:
+        """{user_id: blob} of user_ids that have one (None: every user)"""
+        query = db.query(UserEmbedding.user_id, UserEmbedding.vector)
+        if user_ids is not None:
+            if not user_ids:
+                return {}
+            query = query.filter(UserEmbedding.user_id.in_(set(user_ids)))
+        return dict(query.all())
+    
+    @staticmethod
+    def get_movie_vectors(db: Session, kinopoisk_ids: Optional[List[str]] = None) -> Dict[str, bytes]:
+        """{kinopoisk_id: blob} of kinopoisk_ids that have one (None: every movie)"""
+        query = db.query(MovieEmbedding.kinopoisk_id, MovieEmbedding.vector)
+        if kinopoisk_ids is not None:
+            kinopoisk_ids = {kp_id for kp_id in kinopoisk_ids if kp_id}
+            if not kinopoisk_ids:
+                return {}
+            query = query.filter(MovieEmbedding.kinopoisk_id.in_(kinopoisk_ids))
+        return dict(query.all())
+    
+    @staticmethod
+    def last_trained_at(db: Session) -> Optional[datetime]:
+        """When user embeddings were last written (None: never trained)"""
+        return db.query(func.max(UserEmbedding.trained_at)).scalar()
+    
+    @staticmethod
+    def get_changed_user_ids(db: Session, since: datetime) -> set:
+        """Users who voted or joined a slot after since"""
+        voted = db.query(UserVote.user_id).filter(UserVote.updated_at > since).distinct().all()
+        joined = db.query(SlotParticipant.user_id).filter(SlotParticipant.joined_at > since).distinct().all()
+        return {user_id for (user_id,) in voted} | {user_id for (user_id,) in joined}
+    
+    @staticmethod
+    def store(db: Session, users: Dict[int, bytes], movies: Dict[str, bytes], trained_at: datetime,
+              replace: bool = False) -> None:
+        """Upsert {user_id: blob} and {kinopoisk_id: blob}; replace drops every other row first.
+
+        trained_at is when training read its input: changes after it are picked
+        up by the next incremental run.
+        """
+        if replace:
+            db.query(UserEmbedding).delete(synchronize_session=False)
+            db.query(MovieEmbedding).delete(synchronize_session=False)
+        for model, key, vectors in (
+            (UserEmbedding, "user_id", users), (MovieEmbedding, "kinopoisk_id", movies)
+        ):
+            if not vectors:
+                continue
+            stmt = _dialect_insert(db, model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[key],
+                set_={"vector": stmt.excluded.vector, "trained_at": stmt.excluded.trained_at},
+            )
+            db.execute(stmt, [{key: k, "vector": blob, "trained_at": trained_at} for k, blob in vectors.items()])
+        _commit(db)
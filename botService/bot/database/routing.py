@@ -0,0 +1,184 @@
+"""Read/write routing between the primary database and an optional replica
+
+Read-only handlers open their session with ``open_read_session`` /
+``async_read_session``. It goes to the replica (``Config.DATABASE_REPLICA_URL``)
+unless:
+
+- no replica is configured,
+- the user committed a write within ``Config.READ_YOUR_WRITES_SECONDS``
+  (read-your-writes: replica lag must not hide their own join/leave/rating),
+- the replica failed to connect less than ``Config.REPLICA_RETRY_SECONDS`` ago.
+
+In those cases the session is opened on the primary. Writes are attributed
+to the user of the current update, bound by the ``bind_user`` handler
+decorator, through session commit events, so handlers need no extra calls.
+The write window is kept in process memory (one bot process per database).
+"""
+import logging
+import time
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from bot.config import Config
+from bot.database.session import (
+    SessionLocal, AsyncSessionLocal, ReplicaSessionLocal, AsyncReplicaSessionLocal,
+)
+
+logger = logging.getLogger(__name__)
+
+# Session.info flags
+REPLICA = "replica"
+_HAS_WRITES = "has_writes"
+
+# Bound this many users before old write timestamps are pruned
+_MAX_TRACKED_WRITERS = 10000
+
+# Telegram user whose update is being handled
+_current_user: ContextVar[Optional[int]] = ContextVar("current_user", default=None)
+# user id -> time.monotonic() of the user's last committed write
+_recent_writes: Dict[int, float] = {}
+
+
+def current_user_id() -> Optional[int]:
+    return _current_user.get()
+
+
+def record_write(user_id: int) -> None:
+    """Start the read-your-writes window of a user"""
+    now = time.monotonic()
+    _recent_writes[user_id] = now
+    if len(_recent_writes) > _MAX_TRACKED_WRITERS:
+        cutoff = now - Config.READ_YOUR_WRITES_SECONDS
+        for stale in [uid for uid, at in _recent_writes.items() if at < cutoff]:
+            del _recent_writes[stale]
+
+
+def wrote_recently(user_id: Optional[int]) -> bool:
+    if user_id is None:
+        return False
+    at = _recent_writes.get(user_id)
+    return at is not None and time.monotonic() - at < Config.READ_YOUR_WRITES_SECONDS
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "after_bulk_update")
+@event.listens_for(Session, "after_bulk_delete")
+def _mark_bulk_write(context):
+    context.session.info[_HAS_WRITES] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_commit(session):
+    if session.info.pop(_HAS_WRITES, False):
+        user_id = _current_user.get()
+        if user_id is not None:
+            record_write(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rollback(session):
+    session.info.pop(_HAS_WRITES, None)
+
+
+def bind_user(handler):
+    """Decorator for PTB handlers: attribute the update's writes to its user"""
+    @wraps(handler)
+    async def wrapper(update, context, *args, **kwargs):
+        user = getattr(update, "effective_user", None)
+        token = _current_user.set(user.id if user else None)
+        try:
+            return await handler(update, context, *args, **kwargs)
+        finally:
+            _current_user.reset(token)
+    return wrapper
+
+
+class ReadRouter:
+    """Chooses the primary or the replica session factory for reads"""
+
+    def __init__(self, primary: sessionmaker, replica: Optional[sessionmaker] = None,
+                 async_primary: Optional[async_sessionmaker] = None,
+                 async_replica: Optional[async_sessionmaker] = None):
+        self.primary = primary
+        self.replica = replica
+        self.async_primary = async_primary
+        self.async_replica = async_replica
+        self._replica_down_until = 0.0
+
+    def use_replica(self, replica, user_id: Optional[int]) -> bool:
+        if replica is None:
+            return False
+        if wrote_recently(user_id if user_id is not None else _current_user.get()):
+            return False
+        return time.monotonic() >= self._replica_down_until
+
+    def replica_failed(self, error: Exception) -> None:
+        self._replica_down_until = time.monotonic() + Config.REPLICA_RETRY_SECONDS
+        logger.warning(
+            f"Read replica unavailable, using primary for {Config.REPLICA_RETRY_SECONDS:.0f}s: {error}"
+        )
+
+    def open(self, user_id: Optional[int] = None) -> Session:
+        """Session for reads; the caller closes it"""
+        if self.use_replica(self.replica, user_id):
+            db = self.replica(info={REPLICA: True})
+            try:
+                # Connect now so an unreachable replica falls back to the primary
+                db.connection()
+                return db
+            except Exception as e:
+                db.close()
+                self.replica_failed(e)
+        return self.primary()
+
+    @asynccontextmanager
+    async def async_session(self, user_id: Optional[int] = None):
+        """Async session for reads, closed on exit"""
+        db: Optional[AsyncSession] = None
+        if self.use_replica(self.async_replica, user_id):
+            db = self.async_replica(info={REPLICA: True})
+            try:
+                await db.connection()
+            except Exception as e:
+                await db.close()
+                db = None
+                self.replica_failed(e)
+        if db is None:
+            db = self.async_primary()
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+read_router = ReadRouter(SessionLocal, ReplicaSessionLocal, AsyncSessionLocal, AsyncReplicaSessionLocal)
+
+
+def open_read_session(user_id: Optional[int] = None) -> Session:
+    """Read-only session on the replica when possible; the caller closes it"""
+    return read_router.open(user_id)
+
+
+@contextmanager
+def read_session(user_id: Optional[int] = None):
+    """Context manager variant of open_read_session()"""
+    db = read_router.open(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def async_read_session(user_id: Optional[int] = None):
+    """Async read-only session on the replica when possible"""
+    return read_router.async_session(user_id)
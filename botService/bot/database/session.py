@@ -1,8 +1,11 @@
 """Database session management"""
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from bot.config import Config
+from bot.database.instrumentation import instrument_engine
+from bot.database.sqlite_profile import apply_sqlite_profile
 
 # Create engine with connection pool settings
 # For SQLite, add check_same_thread=False and ensure write access
@@ -26,9 +29,75 @@ engine = create_engine(
     pool_recycle=3600,   # Recycle connections after 1 hour
     connect_args=connect_args
 )
+apply_sqlite_profile(engine)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Session.info flag: repositories only flush, the owner of the session commits once
+UNIT_OF_WORK = "unit_of_work"
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL to its asyncio driver (asyncpg / aiosqlite)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgresql+psycopg2:"):
+        return "postgresql+asyncpg:" + url[len("postgresql+psycopg2:"):]
+    if url.startswith("postgresql:"):
+        return "postgresql+asyncpg:" + url[len("postgresql:"):]
+    if url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url[len("postgres:"):]
+    return url
+
+
+# Async engine for handlers running inside the PTB event loop.
+# The sync engine above stays for scripts, tests and Alembic migrations.
+async_engine = create_async_engine(
+    to_async_url(Config.DATABASE_URL),
+    echo=False,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+)
+apply_sqlite_profile(async_engine.sync_engine)
+instrument_engine(async_engine.sync_engine)
+# expire_on_commit=False: attributes stay readable after commit without
+# an implicit (and in async mode forbidden) lazy refresh
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Optional read replica (see bot.database.routing); None when not configured
+replica_engine = None
+ReplicaSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if Config.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        Config.DATABASE_REPLICA_URL,
+        echo=False,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+    )
+    instrument_engine(replica_engine)
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    async_replica_engine = create_async_engine(
+        to_async_url(Config.DATABASE_REPLICA_URL),
+        echo=False,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+    )
+    instrument_engine(async_replica_engine.sync_engine)
+    AsyncReplicaSessionLocal = async_sessionmaker(
+        bind=async_replica_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
 def get_db():
     """Get database session (generator for dependency injection)"""
     db = SessionLocal()
@@ -51,3 +120,49 @@ def get_db_session():
     finally:
         db.close()
 
+
+@contextmanager
+def unit_of_work(session_factory: sessionmaker = SessionLocal):
+    """Session for a single Telegram update.
+
+    Repositories called with this session flush instead of committing, so
+    the whole update is persisted by exactly one commit on exit (or rolled
+    back on error).
+    """
+    db: Session = session_factory(info={UNIT_OF_WORK: True})
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def get_async_db_session():
+    """Async context manager for database sessions with automatic rollback on error"""
+    db: AsyncSession = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+@asynccontextmanager
+async def async_unit_of_work(session_factory: async_sessionmaker = AsyncSessionLocal):
+    """Async variant of unit_of_work() - one commit per update"""
+    db: AsyncSession = session_factory(info={UNIT_OF_WORK: True})
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
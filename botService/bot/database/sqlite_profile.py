@@ -0,0 +1,56 @@
+"""SQLite production profile
+
+Small deployments run on the SQLite fallback. With the default rollback
+journal a writer blocks all readers, and a second writer fails immediately
+with "database is locked". The profile switches every new connection to WAL
+(readers never block the writer), relaxes fsync to ``synchronous=NORMAL``
+(safe with WAL), enlarges the page cache and mmap window, keeps temp tables
+in memory, and makes writers wait for the lock instead of failing.
+
+Values come from ``Config.SQLITE_*``; ``SQLITE_PROFILE=default`` disables the
+profile and leaves SQLite defaults.
+"""
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bot.config import Config
+
+
+def sqlite_pragmas() -> Dict[str, object]:
+    """PRAGMA name -> value applied to every new connection"""
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": Config.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": Config.SQLITE_CACHE_SIZE,
+        "mmap_size": Config.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def apply_sqlite_profile(engine: Engine, profile: Optional[str] = None) -> Engine:
+    """Set the production PRAGMAs on each new connection of a SQLite engine.
+
+    Works for pysqlite and aiosqlite engines (pass ``async_engine.sync_engine``).
+    Other dialects and in-memory databases are left untouched. ``profile``
+    overrides ``Config.SQLITE_PROFILE``.
+    """
+    profile = profile or Config.SQLITE_PROFILE
+    if engine.dialect.name != "sqlite" or profile != "production":
+        return engine
+    if engine.url.database in (None, "", ":memory:"):
+        return engine
+    if not event.contains(engine, "connect", _set_pragmas):
+        event.listen(engine, "connect", _set_pragmas)
+    return engine
@@ -0,0 +1,164 @@
+"""Process-level LRU cache of per-user matching inputs
+
+MatchingService compares a user with every participant of every candidate
+slot, so the same users' KP vote maps and peer ratings are read over and
+over. They are cached here, bounded by ``Config.MATCHING_CACHE_SIZE`` users
+with least-recently-used eviction.
+
+Repositories that change votes or ratings call ``invalidate_user``. The entry
+is dropped at once (the writing session must not read its old value) and
+again after the session commits or rolls back, so a concurrent reader cannot
+put back the value from before the commit.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from bot.config import Config
+
+# Session.info key: user ids to drop again once the transaction ends
+_PENDING = "user_cache_pending"
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe mapping with bounded size and least-recently-used eviction"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+
+class UserCache:
+    """Vote maps ({kinopoisk_id: rating}), their vector form and peer ratings by user id"""
+
+    def __init__(self, max_size: int):
+        self.votes = LRUCache(max_size)
+        self.vectors = LRUCache(max_size)
+        self.ratings = LRUCache(max_size)
+
+    def resize(self, max_size: int) -> None:
+        for cache in (self.votes, self.vectors, self.ratings):
+            cache.max_size = max_size
+
+    def get_votes(self, user_id: int, load: Callable[[int], Dict[str, int]]) -> Dict[str, int]:
+        """Cached vote map of a user; ``load`` reads it on a miss. Do not mutate it."""
+        votes = self.votes.get(user_id, _MISSING)
+        if votes is _MISSING:
+            votes = load(user_id)
+            self.votes.put(user_id, votes)
+        return votes
+
+    def get_vector(self, user_id: int, load: Callable[[int], object]):
+        """Cached numeric form of a user's votes (see matching.VoteVector)"""
+        vector = self.vectors.get(user_id, _MISSING)
+        if vector is _MISSING:
+            vector = load(user_id)
+            self.vectors.put(user_id, vector)
+        return vector
+
+    def get_rating(self, user_id: int, load: Callable[[int], Optional[float]]) -> Optional[float]:
+        """Cached peer rating of a user; None (not cached) if the user does not exist"""
+        rating = self.ratings.get(user_id, _MISSING)
+        if rating is _MISSING:
+            rating = load(user_id)
+            if rating is not None:
+                self.ratings.put(user_id, rating)
+        return rating
+
+    def get_vectors(self, user_ids: List[int], load_many: Callable[[List[int]], Dict[int, object]]) -> Dict[int, object]:
+        """get_vector for many users; ``load_many`` reads all misses at once"""
+        return _get_many(self.vectors, user_ids, load_many)
+    
+    def get_ratings(self, user_ids: List[int],
+                    load_many: Callable[[List[int]], Dict[int, float]]) -> Dict[int, Optional[float]]:
+        """get_rating for many users; ``load_many`` omits users that do not exist"""
+        return _get_many(self.ratings, user_ids, load_many)
+    
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        for user_id in user_ids:
+            self.votes.pop(user_id)
+            self.vectors.pop(user_id)
+            self.ratings.pop(user_id)
+
+    def clear(self) -> None:
+        self.votes.clear()
+        self.vectors.clear()
+        self.ratings.clear()
+
+
+def _get_many(cache: LRUCache, keys: List[Hashable], load_many: Callable) -> Dict:
+    found = {}
+    missing = []
+    for key in keys:
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            missing.append(key)
+        else:
+            found[key] = value
+    if missing:
+        loaded = load_many(missing)
+        for key in missing:
+            value = loaded.get(key)
+            if value is not None:
+                cache.put(key, value)
+            found[key] = value
+    return found
+
+
+user_cache = UserCache(Config.MATCHING_CACHE_SIZE)
+
+
+def invalidate_user(db: Optional[Session], *user_ids: int) -> None:
+    """Drop users' cached votes and rating now and when db's transaction ends"""
+    user_cache.invalidate(user_ids)
+    if db is not None:
+        db.info.setdefault(_PENDING, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _invalidate_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        user_cache.invalidate(pending)
@@ -2,11 +2,11 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
-from sqlalchemy.orm import Session
 import io
 
-from bot.database.session import SessionLocal
-from bot.database.repositories import SlotRepository, RoomRepository
+from bot.database.session import unit_of_work
+from bot.database.routing import read_session
+from bot.database.repositories import SlotRepository, RoomRepository, LoadProfile
 from bot.services.kinopoisk_images_service import KinopoiskImagesService
 from bot.services.watch_together_service import WatchTogetherService
 
@@ -65,28 +65,54 @@ async def handle_bot_added_to_group(update: Update, context: ContextTypes.DEFAUL
 
 async def setup_movie_group(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int, creator_id: int):
     """Set up the group for movie watching"""
-    db: Session = SessionLocal()
-    
     try:
-        # Find the most recent slot that is ready for group creation where this user is a participant
-        logger.info(f"🔍 Looking for active slots where user {creator_id} is a participant")
-        slots = SlotRepository.get_user_participations(db, creator_id)
-        logger.info(f"📊 Found {len(slots)} slots where user {creator_id} is a participant")
-        
-        active_slot = None
-        
-        # Find the most recent slot that is ready for group creation (full or open with enough participants)
-        # Sort by ID descending to get the newest slot first
-        sorted_slots = sorted(slots, key=lambda x: x.id, reverse=True)
-        
-        for slot in sorted_slots:
-            logger.info(f"📅 Slot {slot.id}: status={slot.status}, participants={len(slot.participants)}/{slot.min_participants}")
-            if (slot.status in ["open", "full"] and len(slot.participants) >= slot.min_participants):
-                active_slot = slot
-                logger.info(f"✅ Found active slot: {slot.id} for movie {slot.movie.title}")
-                break
+        # The room is stored in its own unit of work, committed before the
+        # Telegram and HTTP calls below, which would otherwise hold the write
+        # transaction open
+        with unit_of_work() as db:
+            # Find the most recent slot that is ready for group creation where this user is a participant
+            logger.info(f"🔍 Looking for active slots where user {creator_id} is a participant")
+            slots = SlotRepository.get_user_participations(db, creator_id, profile=LoadProfile.ROOM_SETUP)
+            logger.info(f"📊 Found {len(slots)} slots where user {creator_id} is a participant")
+        
+            active_slot = None
+        
+            # Find the most recent slot that is ready for group creation (full or open with enough participants)
+            # Sort by ID descending to get the newest slot first
+            sorted_slots = sorted(slots, key=lambda x: x.id, reverse=True)
+        
+            for slot in sorted_slots:
+                logger.info(f"📅 Slot {slot.id}: status={slot.status}, participants={slot.participant_count}/{slot.min_participants}")
+                if (slot.status in ["open", "full"] and slot.participant_count >= slot.min_participants):
+                    active_slot = slot
+                    logger.info(f"✅ Found active slot: {slot.id} for movie {slot.movie.title}")
+                    break
+        
+            slot_id = active_slot.id if active_slot else None
+            already_linked = False
+            if active_slot:
+                logger.info(f"🎬 Setting up group for movie: {active_slot.movie.title}")
+                logger.info(f"🔍 DEBUG: Found slot ID: {active_slot.id}")
+                logger.info(f"🔍 DEBUG: Movie ID: {active_slot.movie.id}")
+                logger.info(f"🔍 DEBUG: Movie title: {active_slot.movie.title}")
+                logger.info(f"🔍 DEBUG: Movie Kinopoisk ID: {active_slot.movie.kinopoisk_id}")
+        
+                # Check if room already exists for this slot
+                existing_room = RoomRepository.get_by_slot_id(db, active_slot.id)
+                if existing_room and existing_room.telegram_group_id:
+                    # Room already exists and has group ID, update it
+                    logger.info(f"✅ Room already exists for slot {active_slot.id}, updating group info")
+                    already_linked = True
+                elif existing_room:
+                    # If room exists but doesn't have group ID, update it
+                    logger.info(f"✅ Room exists but no group ID, updating...")
+                else:
+                    # Create new room if it doesn't exist
+                    logger.info(f"📝 Creating new room for slot {active_slot.id}")
+                    RoomRepository.create(db, active_slot.id)
+                RoomRepository.update_group_info(db, active_slot.id, group_id)
         
-        if not active_slot:
+        if slot_id is None:
             logger.info("❌ No active slot found, setting up as general movie group")
             # No active slot found, just set up as general movie group
             await context.bot.send_message(
@@ -96,112 +122,93 @@ async def setup_movie_group(update: Update, context: ContextTypes.DEFAULT_TYPE,
             )
             return
         
-        logger.info(f"🎬 Setting up group for movie: {active_slot.movie.title}")
-        logger.info(f"🔍 DEBUG: Found slot ID: {active_slot.id}")
-        logger.info(f"🔍 DEBUG: Movie ID: {active_slot.movie.id}")
-        logger.info(f"🔍 DEBUG: Movie title: {active_slot.movie.title}")
-        logger.info(f"🔍 DEBUG: Movie Kinopoisk ID: {active_slot.movie.kinopoisk_id}")
-        
-        # Check if room already exists for this slot
-        existing_room = RoomRepository.get_by_slot_id(db, active_slot.id)
-        if existing_room and existing_room.telegram_group_id:
-            # Room already exists and has group ID, update it
-            logger.info(f"✅ Room already exists for slot {active_slot.id}, updating group info")
-            RoomRepository.update_group_info(db, active_slot.id, group_id)
-            await context.bot.send_message(
-                chat_id=group_id,
-                text=f"✅ **Группа уже связана с этим слотом!**\n\n"
-                     f"🎬 **Фильм:** {active_slot.movie.title}\n"
-                     f"📅 **Время:** {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}\n"
-                     f"👥 **Участники:** {len(active_slot.participants)}\n\n"
-                     f"Группа настроена и готова к использованию!",
-                parse_mode="Markdown"
-            )
-            return
-        
-        # If room exists but doesn't have group ID, update it
-        if existing_room:
-            logger.info(f"✅ Room exists but no group ID, updating...")
-            RoomRepository.update_group_info(db, active_slot.id, group_id)
-        else:
-            # Create new room if it doesn't exist
-            logger.info(f"📝 Creating new room for slot {active_slot.id}")
-            existing_room = RoomRepository.create(db, active_slot.id)
-            RoomRepository.update_group_info(db, active_slot.id, group_id)
-        
-        # Set up group for specific movie
-        logger.info(f"🔧 Setting up group for movie: {active_slot.movie.title}")
-        
-        try:
-            # Try to set group title
-            group_title = f"🎬 {active_slot.movie.title} - {active_slot.datetime.strftime('%d.%m')}"
-            await context.bot.set_chat_title(group_id, group_title)
-            logger.info(f"✅ Set group title: {group_title}")
-        except Exception as e:
-            logger.warning(f"⚠️ Could not set group title: {e}")
-        
-        try:
-            # Try to set group description
-            description = f"Группа для просмотра фильма {active_slot.movie.title}\nВремя: {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}"
-            await context.bot.set_chat_description(group_id, description)
-            logger.info("✅ Set group description")
-        except Exception as e:
-            logger.warning(f"⚠️ Could not set group description: {e}")
-        
-        # Try to set movie poster as group avatar
-        await set_movie_poster_as_avatar(context, group_id, active_slot.movie.kinopoisk_id)
-        
-        # Enable chat history for new members
-        await enable_chat_history_for_new_members(context, group_id)
-        
-        # Create Watch Together room
-        logger.info(f"🎬 Creating Watch Together room for slot {active_slot.id}")
-        wt_room_url = None
-        try:
-            wt_room_url = WatchTogetherService.create_wt_room(db, active_slot)
-            if wt_room_url:
-                logger.info(f"✅ Watch Together room created: {wt_room_url}")
-            else:
-                logger.warning(f"⚠️ Failed to create Watch Together room for slot {active_slot.id}")
-        except Exception as e:
-            logger.error(f"❌ Error creating Watch Together room: {e}")
+        with read_session(creator_id) as db:
+            active_slot = SlotRepository.get_by_id(db, slot_id, profile=LoadProfile.ROOM_SETUP)
+            if already_linked:
+                await context.bot.send_message(
+                    chat_id=group_id,
+                    text=f"✅ **Группа уже связана с этим слотом!**\n\n"
+                         f"🎬 **Фильм:** {active_slot.movie.title}\n"
+                         f"📅 **Время:** {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}\n"
+                         f"👥 **Участники:** {active_slot.participant_count}\n\n"
+                         f"Группа настроена и готова к использованию!",
+                    parse_mode="Markdown"
+                )
+                return
         
-        # Create invite link
-        logger.info(f"🔗 Creating invite link for group {group_id}")
-        try:
-            invite_link = await context.bot.create_chat_invite_link(
-                chat_id=group_id,
-                name=f"Приглашение на {active_slot.movie.title}",
-                member_limit=len(active_slot.participants)
-            )
+            # Set up group for specific movie
+            logger.info(f"🔧 Setting up group for movie: {active_slot.movie.title}")
+        
+            try:
+                # Try to set group title
+                group_title = f"🎬 {active_slot.movie.title} - {active_slot.datetime.strftime('%d.%m')}"
+                await context.bot.set_chat_title(group_id, group_title)
+                logger.info(f"✅ Set group title: {group_title}")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not set group title: {e}")
+        
+            try:
+                # Try to set group description
+                description = f"Группа для просмотра фильма {active_slot.movie.title}\nВремя: {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}"
+                await context.bot.set_chat_description(group_id, description)
+                logger.info("✅ Set group description")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not set group description: {e}")
+        
+            # Try to set movie poster as group avatar
+            await set_movie_poster_as_avatar(context, group_id, active_slot.movie.kinopoisk_id)
+        
+            # Enable chat history for new members
+            await enable_chat_history_for_new_members(context, group_id)
+        
+            # Create Watch Together room
+            logger.info(f"🎬 Creating Watch Together room for slot {active_slot.id}")
+            wt_room_url = None
+            try:
+                wt_room_url = await WatchTogetherService.create_wt_room(db, active_slot)
+                if wt_room_url:
+                    logger.info(f"✅ Watch Together room created: {wt_room_url}")
+                else:
+                    logger.warning(f"⚠️ Failed to create Watch Together room for slot {active_slot.id}")
+            except Exception as e:
+                logger.error(f"❌ Error creating Watch Together room: {e}")
+        
+            # Create invite link
+            logger.info(f"🔗 Creating invite link for group {group_id}")
+            try:
+                invite_link = await context.bot.create_chat_invite_link(
+                    chat_id=group_id,
+                    name=f"Приглашение на {active_slot.movie.title}",
+                    member_limit=len(active_slot.participants)
+                )
             
-            logger.info(f"✅ Created invite link: {invite_link.invite_link}")
+                logger.info(f"✅ Created invite link: {invite_link.invite_link}")
             
-            # Get participants info from database
-            logger.info(f"📤 Preparing participants list for {len(active_slot.participants)} participants")
-            participants_info = []
-            for participant in active_slot.participants:
-                user = participant.user  # Use the relationship to get User data
-                if user.username:
-                    participants_info.append(f"• @{user.username} ({user.first_name})")
-                else:
-                    participants_info.append(f"• {user.first_name}")
-                logger.info(f"✅ Added participant: {user.first_name} (ID: {user.id})")
+                # Get participants info from database
+                logger.info(f"📤 Preparing participants list for {len(active_slot.participants)} participants")
+                participants_info = []
+                for participant in active_slot.participants:
+                    user = participant.user  # Use the relationship to get User data
+                    if user.username:
+                        participants_info.append(f"• @{user.username} ({user.first_name})")
+                    else:
+                        participants_info.append(f"• {user.first_name}")
+                    logger.info(f"✅ Added participant: {user.first_name} (ID: {user.id})")
             
-            # Send success message to group with participants list
-            wt_section = ""
-            if wt_room_url:
-                wt_section = f"""
+                # Send success message to group with participants list
+                wt_section = ""
+                if wt_room_url:
+                    wt_section = f"""
 🎥 **Watch Together комната:**
 {wt_room_url}
 
 """
             
-            success_msg = f"""✅ **Группа настроена!**
+                success_msg = f"""✅ **Группа настроена!**
 
 🎬 **Фильм:** {active_slot.movie.title}
 📅 **Время:** {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-👥 **Участники:** {len(active_slot.participants)}
+👥 **Участники:** {active_slot.participant_count}
 
 👥 **Список участников:**
 {chr(10).join(participants_info)}
@@ -210,21 +217,21 @@ async def setup_movie_group(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 🍿 **Приятного просмотра!**"""
             
-            await context.bot.send_message(
-                chat_id=group_id,
-                text=success_msg,
-                parse_mode="Markdown"
-            )
-            logger.info(f"✅ Sent success message to group with participants list")
+                await context.bot.send_message(
+                    chat_id=group_id,
+                    text=success_msg,
+                    parse_mode="Markdown"
+                )
+                logger.info(f"✅ Sent success message to group with participants list")
             
-            # Send invite link to all slot participants
-            logger.info(f"📨 Sending invites to participants...")
+                # Send invite link to all slot participants
+                logger.info(f"📨 Sending invites to participants...")
             
-            invite_msg = f"""🎉 **Группа создана!**
+                invite_msg = f"""🎉 **Группа создана!**
 
 🎬 **Фильм:** {active_slot.movie.title}
 📅 **Время:** {active_slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-👥 **Участники:** {len(active_slot.participants)}
+👥 **Участники:** {active_slot.participant_count}
 
 🔗 **Ссылка на группу:**
 {invite_link.invite_link}
@@ -236,47 +243,45 @@ async def setup_movie_group(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 🍿 **Приятного просмотра!**"""
             
-            # Send to all participants except the creator
-            logger.info(f"📨 Sending invites to {len(active_slot.participants)} participants...")
+                # Send to all participants except the creator
+                logger.info(f"📨 Sending invites to {len(active_slot.participants)} participants...")
             
-            sent_count = 0
-            failed_count = 0
+                sent_count = 0
+                failed_count = 0
             
-            for participant in active_slot.participants:
-                logger.info(f"🔍 Processing participant {participant.user_id}, creator: {creator_id}")
-                if participant.user_id != creator_id:
-                    logger.info(f"📤 Attempting to send invite to user {participant.user_id}")
-                    try:
-                        await context.bot.send_message(
-                            chat_id=participant.user_id,
-                            text=invite_msg,
-                            parse_mode="Markdown"
-                        )
-                        logger.info(f"✅ Sent group invite to user {participant.user_id}")
-                        sent_count += 1
-                    except Exception as e:
-                        logger.error(f"❌ Failed to send invite to user {participant.user_id}: {e}")
-                        logger.error(f"❌ Error details: {type(e).__name__}: {str(e)}")
-                        failed_count += 1
-                else:
-                    logger.info(f"ℹ️ Skipping creator {participant.user_id}")
+                for participant in active_slot.participants:
+                    logger.info(f"🔍 Processing participant {participant.user_id}, creator: {creator_id}")
+                    if participant.user_id != creator_id:
+                        logger.info(f"📤 Attempting to send invite to user {participant.user_id}")
+                        try:
+                            await context.bot.send_message(
+                                chat_id=participant.user_id,
+                                text=invite_msg,
+                                parse_mode="Markdown"
+                            )
+                            logger.info(f"✅ Sent group invite to user {participant.user_id}")
+                            sent_count += 1
+                        except Exception as e:
+                            logger.error(f"❌ Failed to send invite to user {participant.user_id}: {e}")
+                            logger.error(f"❌ Error details: {type(e).__name__}: {str(e)}")
+                            failed_count += 1
+                    else:
+                        logger.info(f"ℹ️ Skipping creator {participant.user_id}")
             
-            logger.info(f"📊 Invite sending summary: {sent_count} sent, {failed_count} failed")
+                logger.info(f"📊 Invite sending summary: {sent_count} sent, {failed_count} failed")
             
-            logger.info(f"🎉 Group setup completed successfully!")
+                logger.info(f"🎉 Group setup completed successfully!")
             
-        except Exception as e:
-            logger.error(f"Failed to create invite link: {e}")
-            await context.bot.send_message(
-                chat_id=group_id,
-                text="✅ Группа настроена, но не удалось создать ссылку-приглашение.\nДобавьте участников вручную.",
-                parse_mode="Markdown"
-            )
+            except Exception as e:
+                logger.error(f"Failed to create invite link: {e}")
+                await context.bot.send_message(
+                    chat_id=group_id,
+                    text="✅ Группа настроена, но не удалось создать ссылку-приглашение.\nДобавьте участников вручную.",
+                    parse_mode="Markdown"
+                )
         
     except Exception as e:
         logger.error(f"Error setting up movie group: {e}")
-    finally:
-        db.close()
 
 
 async def set_movie_poster_as_avatar(context: ContextTypes.DEFAULT_TYPE, group_id: int, kinopoisk_id: str):
@@ -307,7 +312,7 @@ async def set_movie_poster_as_avatar(context: ContextTypes.DEFAULT_TYPE, group_i
             # Continue anyway, maybe it will work
         
         # Get the best poster URL
-        poster_url = KinopoiskImagesService.get_best_poster(kinopoisk_id)
+        poster_url = await KinopoiskImagesService.get_best_poster(kinopoisk_id)
         
         if not poster_url:
             logger.warning(f"⚠️ No poster found for movie {kinopoisk_id}")
@@ -316,7 +321,7 @@ async def set_movie_poster_as_avatar(context: ContextTypes.DEFAULT_TYPE, group_i
         logger.info(f"🔗 Found poster URL: {poster_url}")
         
         # Download the poster image
-        image_data = KinopoiskImagesService.download_image(poster_url)
+        image_data = await KinopoiskImagesService.download_image(poster_url)
         
         if not image_data:
             logger.warning(f"⚠️ Failed to download poster from {poster_url}")
@@ -2,9 +2,9 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
-from sqlalchemy.orm import Session
 
-from bot.database.session import SessionLocal
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import track_queries
 from bot.services.kinopoisk_user_service import KinopoiskUserService
 from bot.utils.states import set_state, get_state, clear_state
 from bot.config import Config
@@ -45,6 +45,7 @@ async def link_kp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+@track_queries
 async def handle_kp_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process KP user id, fetch votes and store them"""
     user_id = update.effective_user.id
@@ -85,42 +86,42 @@ async def handle_kp_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
             clear_state(user_id)
             return
         
-        db: Session = SessionLocal()
-        try:
+        # The link is committed before the Telegram call, which would
+        # otherwise hold the write transaction open
+        with unit_of_work() as db:
             # Save mapping and import votes
             logger.info(f"Linking KP ID {kp_id_text} to user {user_id}")
             KinopoiskUserService.set_user_kp_id(db, user_id, kp_id_text)
-            await update.message.reply_text("🔄 Импортирую ваши оценки с Кинопоиска...")
-            
-            try:
-                count = KinopoiskUserService.fetch_and_store_votes(db, user_id)
-                if count > 0:
-                    await update.message.reply_text(
-                        f"✅ Импортировано/обновлено оценок: {count}\n\n"
-                        f"Теперь я буду предлагать слоты с участниками с похожими предпочтениями."
-                    )
-                else:
-                    await update.message.reply_text(
-                        "⚠️ Не найдено оценок для импорта.\n\n"
-                        "Убедитесь, что:\n"
-                        "• ID пользователя правильный\n"
-                        "• У вас есть оценки на Кинопоиске"
-                    )
-            except ValueError as e:
-                logger.error(f"ValueError in fetch_and_store_votes: {e}")
-                await update.message.reply_text(f"❌ Ошибка: {e}")
-            except Exception as e:
-                logger.error(f"Error fetching votes: {e}", exc_info=True)
+        await update.message.reply_text("🔄 Импортирую ваши оценки с Кинопоиска...")
+        
+        try:
+            # Each page is stored in its own short transaction
+            count = await KinopoiskUserService.fetch_and_store_votes(user_id)
+            if count > 0:
                 await update.message.reply_text(
-                    f"❌ Не удалось импортировать оценки: {e}\n\n"
-                    "Возможные причины:\n"
-                    "• Неверный API ключ\n"
-                    "• Проблемы с сетью\n"
-                    "• Неверный ID пользователя"
+                    f"✅ Импортировано/обновлено оценок: {count}\n\n"
+                    f"Теперь я буду предлагать слоты с участниками с похожими предпочтениями."
                 )
-        finally:
-            db.close()
-            clear_state(user_id)
+            else:
+                await update.message.reply_text(
+                    "⚠️ Не найдено оценок для импорта.\n\n"
+                    "Убедитесь, что:\n"
+                    "• ID пользователя правильный\n"
+                    "• У вас есть оценки на Кинопоиске"
+                )
+        except ValueError as e:
+            logger.error(f"ValueError in fetch_and_store_votes: {e}")
+            await update.message.reply_text(f"❌ Ошибка: {e}")
+        except Exception as e:
+            logger.error(f"Error fetching votes: {e}", exc_info=True)
+            await update.message.reply_text(
+                f"❌ Не удалось импортировать оценки: {e}\n\n"
+                "Возможные причины:\n"
+                "• Неверный API ключ\n"
+                "• Проблемы с сетью\n"
+                "• Неверный ID пользователя"
+            )
+        clear_state(user_id)
     except Exception as e:
         logger.error(f"Error in handle_kp_id: {e}", exc_info=True)
         await update.message.reply_text(
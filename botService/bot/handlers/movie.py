@@ -1,19 +1,26 @@
 """Movie handler - add movie and create slots"""
 import logging
-from telegram import Update
+from typing import Dict, Optional, Tuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from bot.database.session import SessionLocal
-from bot.database.repositories import MovieRepository, SlotRepository, SlotParticipantRepository
-from bot.database.models import SlotParticipant
+from bot.database.session import SessionLocal, unit_of_work, async_unit_of_work
+from bot.database.routing import async_read_session
+from bot.database.instrumentation import track_queries
+from bot.database.repositories import (
+    MovieRepository, SlotRepository, SlotParticipantRepository, LoadProfile, payload_hash,
+)
+from bot.database.async_repositories import AsyncMovieRepository, AsyncUserRepository, AsyncSlotRepository
+from bot.database.models import Movie, SlotParticipant
 from bot.services.movie_parser import MovieParser
 from bot.services.matching import MatchingService
+from bot.services.recommendation_feed import RecommendationFeedService
 from bot.utils.validators import validate_movie_url
 from bot.utils.keyboards import get_movie_actions_keyboard, get_slots_list_keyboard
 from bot.utils.formatters import format_movie_info, format_slot_info
-from bot.constants import MovieType
+from bot.constants import MovieType, SlotStatus
 from bot.utils.states import set_state, clear_state, get_state
 
 logger = logging.getLogger(__name__)
@@ -30,6 +37,7 @@ async def add_movie_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     set_state(update.effective_user.id, "waiting_for_movie_url")
 
 
+@track_queries
 async def handle_movie_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle movie URL input"""
     user_id = update.effective_user.id
@@ -45,219 +53,225 @@ async def handle_movie_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    db: Session = SessionLocal()
     try:
-        # Parse movie data using Kinopoisk API
-        try:
-            movie_data = MovieParser.parse_url(url)
-        except Exception as e:
-            logger.error(f"Error parsing movie URL: {e}", exc_info=True)
-            await update.message.reply_text(
-                "❌ Произошла ошибка при обработке ссылки.\n\n"
-                "Возможные причины:\n"
-                "• API ключ Kinopoisk не настроен\n"
-                "• Проблемы с сетью\n"
-                "• Неверный формат ссылки\n\n"
-                "Проверьте настройки в .env файле."
-            )
-            clear_state(user_id)
-            return
-        
-        if not movie_data:
-            # Check if API key is missing
-            from bot.config import Config
-            if not Config.KINOPOISK_API_KEY:
-                await update.message.reply_text(
-                    "❌ Не удалось обработать ссылку.\n\n"
-                    "⚠️ API ключ Kinopoisk не настроен.\n\n"
-                    "Для работы с ссылками Kinopoisk необходимо:\n"
-                    "1. Получить API ключ на https://kinopoiskapiunofficial.tech/\n"
-                    "2. Добавить в .env файл:\n"
-                    "   KINOPOISK_API_KEY=ваш_ключ"
-                )
-            else:
+        async with async_read_session(user_id) as db:
+            # Known movies come from the database, new ones from the Kinopoisk API
+            try:
+                movie_data = await MovieParser.parse_url(url, db)
+            except Exception as e:
+                logger.error(f"Error parsing movie URL: {e}", exc_info=True)
                 await update.message.reply_text(
-                    "❌ Не удалось обработать ссылку.\n\n"
+                    "❌ Произошла ошибка при обработке ссылки.\n\n"
                     "Возможные причины:\n"
-                    "• Фильм не найден в базе Kinopoisk\n"
-                    "• Проблемы с API\n"
+                    "• API ключ Kinopoisk не настроен\n"
+                    "• Проблемы с сетью\n"
                     "• Неверный формат ссылки\n\n"
-                    "Попробуйте другую ссылку или проверьте логи."
+                    "Проверьте настройки в .env файле."
                 )
-            clear_state(user_id)
-            return
-        
-        # Check if movie already exists
-        movie = None
-        if movie_data.get("kinopoisk_id"):
-            movie = MovieRepository.find_by_kinopoisk_id(db, movie_data["kinopoisk_id"])
-        elif movie_data.get("imdb_id"):
-            movie = MovieRepository.find_by_imdb_id(db, movie_data["imdb_id"])
-        
-        # Create movie if not exists
-        if not movie:
-            movie = MovieRepository.create(
-                db=db,
-                title=movie_data["title"],
-                year=movie_data.get("year"),
-                movie_type=movie_data.get("type", MovieType.MOVIE),
-                kinopoisk_id=movie_data.get("kinopoisk_id"),
-                imdb_id=movie_data.get("imdb_id"),
-                description=movie_data.get("description"),
-                poster_url=movie_data.get("poster_url"),
-                name_original=movie_data.get("name_original"),
-                rating=movie_data.get("rating"),
-                rating_kinopoisk=movie_data.get("rating_kinopoisk"),
-                rating_imdb=movie_data.get("rating_imdb"),
-                rating_film_critics=movie_data.get("rating_film_critics"),
-                rating_await=movie_data.get("rating_await"),
-                rating_rf_critics=movie_data.get("rating_rf_critics"),
-                film_length=movie_data.get("film_length"),
-                age_rating=movie_data.get("age_rating"),
-                slogan=movie_data.get("slogan"),
-                countries=movie_data.get("countries"),
-                genres=movie_data.get("genres")
-            )
-        elif movie_data.get("api_data"):
-            # Update existing movie with full API data if available
-            MovieRepository.update_from_api(db, movie, movie_data["api_data"])
-        
-        # Show movie info and available slots
-        from bot.database.repositories import UserRepository
-        from bot.constants import SlotStatus
-        
-        # Get user's rating for compatibility check
-        user = UserRepository.get_by_id(db, user_id)
-        if not user:
-            # Create user if doesn't exist
-            user = UserRepository.get_or_create(db, user_id, update.effective_user.first_name or "User")
-        
-        # Find existing slots for this movie (including all movies with same Kinopoisk ID)
-        existing_slots = []
-        if movie.kinopoisk_id:
-            # Find all movies with same Kinopoisk ID
-            from bot.database.models import Movie
-            all_movies = db.query(Movie).filter(Movie.kinopoisk_id == movie.kinopoisk_id).all()
-            for m in all_movies:
-                existing_slots.extend(SlotRepository.get_by_movie(db, m.id))
-        else:
-            existing_slots = SlotRepository.get_by_movie(db, movie.id)
-        available_slots = []
-        user_full_slots = []  # Slots where user is participant and slot is full
-        
-        logger.info(f"DEBUG: Found {len(existing_slots)} existing slots for movie {movie.id}")
-        
-        for slot in existing_slots:
-            logger.info(f"DEBUG: Slot {slot.id} - status: {slot.status}, participants: {len(slot.participants)}, min_participants: {slot.min_participants}")
+                clear_state(user_id)
+                return
             
-            # Check if user is already participating
-            is_participating = any(p.user_id == user_id for p in slot.participants)
+            if not movie_data:
+                # Check if API key is missing
+                from bot.config import Config
+                if not Config.KINOPOISK_API_KEY:
+                    await update.message.reply_text(
+                        "❌ Не удалось обработать ссылку.\n\n"
+                        "⚠️ API ключ Kinopoisk не настроен.\n\n"
+                        "Для работы с ссылками Kinopoisk необходимо:\n"
+                        "1. Получить API ключ на https://kinopoiskapiunofficial.tech/\n"
+                        "2. Добавить в .env файл:\n"
+                        "   KINOPOISK_API_KEY=ваш_ключ"
+                    )
+                else:
+                    await update.message.reply_text(
+                        "❌ Не удалось обработать ссылку.\n\n"
+                        "Возможные причины:\n"
+                        "• Фильм не найден в базе Kinopoisk\n"
+                        "• Проблемы с API\n"
+                        "• Неверный формат ссылки\n\n"
+                        "Попробуйте другую ссылку или проверьте логи."
+                    )
+                clear_state(user_id)
+                return
             
-            if slot.status == SlotStatus.FULL and is_participating:
-                # User is in a full slot - show it with "Create group" option
-                logger.info(f"DEBUG: Adding full slot {slot.id} where user is participating")
-                user_full_slots.append(slot)
-                continue
+            # Check if movie already exists (parse_url returns stored movies as is)
+            movie = movie_data.get("movie")
+            if not movie and movie_data.get("kinopoisk_id"):
+                movie = await AsyncMovieRepository.find_by_kinopoisk_id(db, movie_data["kinopoisk_id"])
+            elif not movie and movie_data.get("imdb_id"):
+                movie = await AsyncMovieRepository.find_by_imdb_id(db, movie_data["imdb_id"])
             
-            if slot.status != SlotStatus.OPEN:
-                logger.info(f"DEBUG: Skipping slot {slot.id} - status is {slot.status}, not OPEN")
-                continue
-                
-            if is_participating:
-                logger.info(f"DEBUG: Skipping slot {slot.id} - user {user_id} already participating")
-                continue
-                
-            # Check if slot is full
-            if slot.max_participants and len(slot.participants) >= slot.max_participants:
-                logger.info(f"DEBUG: Skipping slot {slot.id} - slot is full ({len(slot.participants)}/{slot.max_participants})")
-                continue
-                
-            logger.info(f"DEBUG: Adding slot {slot.id} to available slots")
-            available_slots.append(slot)
+            # Get user's rating for compatibility check
+            user = await AsyncUserRepository.get_by_id(db, user_id)
+            
+            if movie and not movie_data.get("api_data") and user:
+                text, keyboard = await db.run_sync(_movie_slots_reply, movie, user_id)
         
-        logger.info(f"DEBUG: Total available slots: {len(available_slots)}")
+        if not movie or movie_data.get("api_data") or not user:
+            # The writes are committed here, before the replies below, which
+            # would otherwise hold the write transaction open
+            async with async_unit_of_work() as write_db:
+                movie_id = await write_db.run_sync(_save_movie, movie.id if movie else None, movie_data)
+                if not user:
+                    # Create user if doesn't exist
+                    await AsyncUserRepository.get_or_create(
+                        write_db, user_id, update.effective_user.first_name or "User"
+                    )
+            # Read after the commit, so the read sees the new movie on the primary
+            async with async_read_session(user_id) as db:
+                movie = await AsyncMovieRepository.get_by_id(db, movie_id)
+                text, keyboard = await db.run_sync(_movie_slots_reply, movie, user_id)
         
-        # Show movie info and available slots
-        movie_text = format_movie_info(movie)
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
+        clear_state(user_id)
+    except Exception as e:
+        await update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
+        clear_state(user_id)
+
+
+def _save_movie(db: Session, movie_id: Optional[int], movie_data: Dict) -> int:
+    """Create the movie of movie_data, or update movie_id from the API data; returns its id"""
+    if not movie_id:
+        # Create movie if not exists
+        return MovieRepository.create(
+            db=db,
+            title=movie_data["title"],
+            year=movie_data.get("year"),
+            movie_type=movie_data.get("type", MovieType.MOVIE),
+            kinopoisk_id=movie_data.get("kinopoisk_id"),
+            imdb_id=movie_data.get("imdb_id"),
+            description=movie_data.get("description"),
+            poster_url=movie_data.get("poster_url"),
+            name_original=movie_data.get("name_original"),
+            rating=movie_data.get("rating"),
+            rating_kinopoisk=movie_data.get("rating_kinopoisk"),
+            rating_imdb=movie_data.get("rating_imdb"),
+            rating_film_critics=movie_data.get("rating_film_critics"),
+            rating_await=movie_data.get("rating_await"),
+            rating_rf_critics=movie_data.get("rating_rf_critics"),
+            film_length=movie_data.get("film_length"),
+            age_rating=movie_data.get("age_rating"),
+            slogan=movie_data.get("slogan"),
+            countries=movie_data.get("countries"),
+            genres=movie_data.get("genres"),
+            api_hash=payload_hash(movie_data["api_data"]) if movie_data.get("api_data") else None
+        ).id
+    if movie_data.get("api_data"):
+        # Update existing movie with full API data if available
+        MovieRepository.update_from_api(db, MovieRepository.get_by_id(db, movie_id), movie_data["api_data"])
+    return movie_id
+
+
+def _movie_slots_reply(db: Session, movie: Movie, user_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+    """Movie info with its slots and the join/create keyboard; run through db.run_sync"""
+    # Find existing slots for this movie (including all movies with same Kinopoisk ID)
+    existing_slots = []
+    if movie.kinopoisk_id:
+        # Find all movies with same Kinopoisk ID
+        movie_ids = [m.id for m in db.query(Movie.id).filter(Movie.kinopoisk_id == movie.kinopoisk_id).all()]
+        existing_slots = SlotRepository.get_by_movies(db, movie_ids, profile=LoadProfile.WITH_MEMBERS)
+    else:
+        existing_slots = SlotRepository.get_by_movie(db, movie.id, profile=LoadProfile.WITH_MEMBERS)
+    available_slots = []
+    user_full_slots = []  # Slots where user is participant and slot is full
+    
+    logger.info(f"DEBUG: Found {len(existing_slots)} existing slots for movie {movie.id}")
+    
+    for slot in existing_slots:
+        logger.info(f"DEBUG: Slot {slot.id} - status: {slot.status}, participants: {slot.participant_count}, min_participants: {slot.min_participants}")
         
-        # Create combined keyboard with slots and create button
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        buttons = []
+        # Check if user is already participating
+        is_participating = any(p.user_id == user_id for p in slot.participants)
         
-        # Show user's full slots first (ready for group creation)
-        if user_full_slots:
-            slots_text = "\n\n🎉 <b>Готовые слоты (можно создать группу):</b>\n"
-            for i, slot in enumerate(user_full_slots, 1):
-                participants_count = len(slot.participants)
-                slots_text += f"{i}. {slot.datetime.strftime('%d.%m.%Y %H:%M')} "
-                slots_text += f"({participants_count}/{slot.min_participants} участников) ✅\n"
-                
-                # Add "Create group" button for full slots
-                button_text = f"🎬 Создать группу - {slot.datetime.strftime('%d.%m %H:%M')}"
-                buttons.append([
-                    InlineKeyboardButton(button_text, callback_data=f"create_group:{slot.id}")
-                ])
-        else:
-            slots_text = ""
+        if slot.status == SlotStatus.FULL and is_participating:
+            # User is in a full slot - show it with "Create group" option
+            logger.info(f"DEBUG: Adding full slot {slot.id} where user is participating")
+            user_full_slots.append(slot)
+            continue
         
-        # Show available slots to join (sorted by compatibility)
-        if available_slots:
-            if slots_text:
-                slots_text += "\n📅 <b>Доступные слоты:</b>\n"
-            else:
-                slots_text = "\n\n📅 <b>Доступные слоты:</b>\n"
+        if slot.status != SlotStatus.OPEN:
+            logger.info(f"DEBUG: Skipping slot {slot.id} - status is {slot.status}, not OPEN")
+            continue
             
-            # Score and sort by compatibility
-            scored = MatchingService.annotate_slots_by_compatibility(db, user_id, available_slots)
+        if is_participating:
+            logger.info(f"DEBUG: Skipping slot {slot.id} - user {user_id} already participating")
+            continue
             
-            for i, (slot, score) in enumerate(scored, 1):
-                participants_count = len(slot.participants)
-                needed = slot.min_participants - participants_count
-                stars = max(0, min(3, int(round(score * 3))))
-                stars_text = f" {'⭐'*stars}" if stars > 0 else ""
-                slots_text += f"{i}. {slot.datetime.strftime('%d.%m.%Y %H:%M')}{stars_text} "
-                slots_text += f"({participants_count}/{slot.min_participants}, нужно еще {needed})\n"
+        # Check if slot is full
+        if slot.max_participants and slot.participant_count >= slot.max_participants:
+            logger.info(f"DEBUG: Skipping slot {slot.id} - slot is full ({slot.participant_count}/{slot.max_participants})")
+            continue
             
-            slots_text += "\n💡 Нажмите на слот чтобы присоединиться:"
+        logger.info(f"DEBUG: Adding slot {slot.id} to available slots")
+        available_slots.append(slot)
+    
+    logger.info(f"DEBUG: Total available slots: {len(available_slots)}")
+    
+    # Show movie info and available slots
+    movie_text = format_movie_info(movie)
+    
+    # Create combined keyboard with slots and create button
+    buttons = []
+    
+    # Show user's full slots first (ready for group creation)
+    if user_full_slots:
+        slots_text = "\n\n🎉 <b>Готовые слоты (можно создать группу):</b>\n"
+        for i, slot in enumerate(user_full_slots, 1):
+            participants_count = slot.participant_count
+            slots_text += f"{i}. {slot.datetime.strftime('%d.%m.%Y %H:%M')} "
+            slots_text += f"({participants_count}/{slot.min_participants} участников) ✅\n"
             
-            # Add slot buttons
-            for (slot, score) in scored:
-                participants_count = len(slot.participants)
-                needed = slot.min_participants - participants_count
-                stars = max(0, min(3, int(round(score * 3))))
-                star_emoji = "⭐"*stars
-                suffix = f" {star_emoji}" if stars > 0 else ""
-                button_text = f"{slot.datetime.strftime('%d.%m %H:%M')} (нужно еще {needed}){suffix}"
-                buttons.append([
-                    InlineKeyboardButton(button_text, callback_data=f"join_slot:{slot.id}")
-                ])
+            # Add "Create group" button for full slots
+            button_text = f"🎬 Создать группу - {slot.datetime.strftime('%d.%m %H:%M')}"
+            buttons.append([
+                InlineKeyboardButton(button_text, callback_data=f"create_group:{slot.id}")
+            ])
+    else:
+        slots_text = ""
+    
+    # Show available slots to join (sorted by compatibility)
+    if available_slots:
+        if slots_text:
+            slots_text += "\n📅 <b>Доступные слоты:</b>\n"
+        else:
+            slots_text = "\n\n📅 <b>Доступные слоты:</b>\n"
         
-        # Always add create new slot button
-        buttons.append([
-            InlineKeyboardButton("➕ Создать новый слот", callback_data=f"create_slot:{movie.id}")
-        ])
+        # Score and sort by compatibility
+        scored = MatchingService.annotate_slots_by_neighbours(db, user_id, available_slots)
         
-        keyboard = InlineKeyboardMarkup(buttons)
+        for i, (slot, score) in enumerate(scored, 1):
+            participants_count = slot.participant_count
+            needed = slot.min_participants - participants_count
+            stars = max(0, min(3, int(round(score * 3))))
+            stars_text = f" {'⭐'*stars}" if stars > 0 else ""
+            slots_text += f"{i}. {slot.datetime.strftime('%d.%m.%Y %H:%M')}{stars_text} "
+            slots_text += f"({participants_count}/{slot.min_participants}, нужно еще {needed})\n"
         
-        if slots_text:
-            await update.message.reply_text(
-                movie_text + slots_text,
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
-        else:
-            await update.message.reply_text(
-                movie_text + "\n\n💡 Нет доступных слотов. Создайте новый!",
-                reply_markup=keyboard,
-                parse_mode="HTML"
-            )
+        slots_text += "\n💡 Нажмите на слот чтобы присоединиться:"
         
-        clear_state(user_id)
-    except Exception as e:
-        await update.message.reply_text(f"❌ Произошла ошибка: {str(e)}")
-        clear_state(user_id)
-    finally:
-        db.close()
+        # Add slot buttons
+        for (slot, score) in scored:
+            participants_count = slot.participant_count
+            needed = slot.min_participants - participants_count
+            stars = max(0, min(3, int(round(score * 3))))
+            star_emoji = "⭐"*stars
+            suffix = f" {star_emoji}" if stars > 0 else ""
+            button_text = f"{slot.datetime.strftime('%d.%m %H:%M')} (нужно еще {needed}){suffix}"
+            buttons.append([
+                InlineKeyboardButton(button_text, callback_data=f"join_slot:{slot.id}")
+            ])
+    
+    # Always add create new slot button
+    buttons.append([
+        InlineKeyboardButton("➕ Создать новый слот", callback_data=f"create_slot:{movie.id}")
+    ])
+    
+    keyboard = InlineKeyboardMarkup(buttons)
+    
+    if slots_text:
+        return movie_text + slots_text, keyboard
+    return movie_text + "\n\n💡 Нет доступных слотов. Создайте новый!", keyboard
 
 
 async def create_slot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -288,6 +302,7 @@ async def create_slot_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         db.close()
 
 
+@track_queries
 async def handle_slot_datetime(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle slot datetime input"""
     user_id = update.effective_user.id
@@ -332,6 +347,7 @@ async def handle_slot_datetime(update: Update, context: ContextTypes.DEFAULT_TYP
         db.close()
 
 
+@track_queries
 async def handle_min_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle min participants input"""
     user_id = update.effective_user.id
@@ -358,24 +374,25 @@ async def handle_min_participants(update: Update, context: ContextTypes.DEFAULT_
             await update.message.reply_text("❌ Введите число.")
             return
     
-    db: Session = SessionLocal()
     try:
-        # Check if similar slot already exists (same movie, same time, same min_participants)
-        from bot.database.repositories import UserRepository
-        from bot.services.room_manager import RoomManager
         from bot.database.repositories import RoomRepository
-        from bot.constants import SlotStatus
-        
-        existing_slots = SlotRepository.get_by_movie(db, movie_id)
-        matching_slot = None
+        from bot.services.room_manager import RoomManager
+        from bot.constants import SlotStatus, JoinStatus
         
-        for slot in existing_slots:
-            if (slot.datetime == datetime_obj and
-                slot.min_participants == min_participants and
-                slot.status == SlotStatus.OPEN):
-                # Check if user is already participating
-                is_participating = any(p.user_id == user_id for p in slot.participants)
-                if is_participating:
+        # Join or create is one transaction, committed before any Telegram I/O
+        with unit_of_work() as db:
+            # Check if similar slot already exists (same movie, same time, same min_participants)
+            existing_slots = SlotRepository.get_by_movie(db, movie_id, profile=LoadProfile.WITH_MEMBERS)
+            matching_slots = [
+                slot for slot in existing_slots
+                if (slot.datetime == datetime_obj and
+                    slot.min_participants == min_participants and
+                    slot.status == SlotStatus.OPEN)
+            ]
+            
+            # Check if user is already participating
+            for slot in matching_slots:
+                if any(p.user_id == user_id for p in slot.participants):
                     # User is already in this exact slot
                     await update.message.reply_text(
                         f"✅ Вы уже участвуете в таком слоте!\n\n{format_slot_info(slot)}",
@@ -383,34 +400,44 @@ async def handle_min_participants(update: Update, context: ContextTypes.DEFAULT_
                     )
                     clear_state(user_id)
                     return
-                else:
-                    # Check if slot is not full
-                    if not slot.max_participants or len(slot.participants) < slot.max_participants:
-                        matching_slot = slot
-                        break
+            
+            # Join existing slot instead of creating new one (skipping slots that filled up)
+            result = None
+            for slot in matching_slots:
+                result = SlotParticipantRepository.join(db, slot.id, user_id)
+                if result.status in (JoinStatus.JOINED, JoinStatus.ALREADY_JOINED):
+                    RecommendationFeedService.on_joined(db, result, user_id)
+                    break
+                result = None
+            joined_existing = result is not None
         
-        if matching_slot:
-            # Join existing slot instead of creating new one
-            SlotParticipantRepository.add_participant(db, matching_slot.id, user_id)
+            if not joined_existing:
+                # Create new slot, creator is the first participant
+                slot = SlotRepository.create(
+                    db=db,
+                    movie_id=movie_id,
+                    creator_id=user_id,
+                    datetime_obj=datetime_obj,
+                    min_participants=min_participants
+                )
+                result = SlotParticipantRepository.join(db, slot.id, user_id)
+                RecommendationFeedService.on_slot_created(db, result.slot)
+                RecommendationFeedService.on_joined(db, result, user_id)
+            slot_id = result.slot.id
             
-            # Check if should create room
-            updated_slot = SlotRepository.get_by_id(db, matching_slot.id)
-            if RoomManager.should_create_room(updated_slot):
-                # Check if room already exists
-                existing_room = RoomRepository.get_by_slot_id(db, matching_slot.id)
-                if not existing_room:
-                    # Create room
-                    room = RoomRepository.create(db, matching_slot.id)
-                    updated_slot.status = SlotStatus.FULL
-                    db.commit()
+        db: Session = SessionLocal()
+        try:
+            updated_slot = SlotRepository.get_by_id(db, slot_id, profile=LoadProfile.ROOM_SETUP)
                     
-                    # Create Telegram group
+            if joined_existing and result.status == JoinStatus.ALREADY_JOINED:
+                await update.message.reply_text(
+                    f"✅ Вы уже участвуете в таком слоте!\n\n{format_slot_info(updated_slot)}",
+                    parse_mode="HTML"
+                )
+            elif joined_existing and result.room is not None:
+                # Create Telegram group if the room was just created
+                if result.room_created:
                     await RoomManager.create_room_for_slot(updated_slot, context.bot)
-                else:
-                    # Room already exists, just update status if needed
-                    if updated_slot.status != SlotStatus.FULL:
-                        updated_slot.status = SlotStatus.FULL
-                        db.commit()
                 
                 # Notify all participants
                 for participant in updated_slot.participants:
@@ -428,71 +455,37 @@ async def handle_min_participants(update: Update, context: ContextTypes.DEFAULT_
                     f"🎉 Найден идентичный слот! Вы присоединились и комната создана!\n\n{format_slot_info(updated_slot)}",
                     parse_mode="HTML"
                 )
-            else:
+            elif joined_existing:
                 await update.message.reply_text(
                     f"✅ Найден идентичный слот! Вы присоединились к нему!\n\n{format_slot_info(updated_slot)}",
                     parse_mode="HTML"
                 )
-        else:
-            # Create new slot
-            slot = SlotRepository.create(
-                db=db,
-                movie_id=movie_id,
-                creator_id=user_id,
-                datetime_obj=datetime_obj,
-                min_participants=min_participants
-            )
-            
-            # Add creator as participant
-            SlotParticipantRepository.add_participant(db, slot.id, user_id)
-            
-            # Reload slot to get updated participants count
-            updated_slot = SlotRepository.get_by_id(db, slot.id)
-            
-            # Check if should create room immediately (if participants >= min_participants)
-            if RoomManager.should_create_room(updated_slot):
-                # Check if room already exists
-                existing_room = RoomRepository.get_by_slot_id(db, slot.id)
-                if not existing_room:
-                    # Create room
-                    room = RoomRepository.create(db, slot.id)
-                    updated_slot.status = SlotStatus.FULL
-                    db.commit()
-                    
-                    # Create Telegram group
-                    await RoomManager.create_room_for_slot(updated_slot, context.bot)
+            elif result.room is not None:
+                # New slot already has min_participants (e.g. 1): create group immediately
+                await RoomManager.create_room_for_slot(updated_slot, context.bot)
                     
-                    await update.message.reply_text(
-                        f"🎉 Слот заполнен! Создаем группу...\n\n"
-                        f"🎬 Фильм: {updated_slot.movie.title}\n"
-                        f"📅 Время: {datetime_obj.strftime('%d.%m.%Y %H:%M')}\n"
-                        f"👥 Участники: {len(updated_slot.participants)}"
-                    )
-                else:
-                    # Room already exists, just notify
-                    await update.message.reply_text(
-                        f"✅ Слот создан!\n\n"
-                        f"🎬 Фильм: {updated_slot.movie.title}\n"
-                        f"📅 Время: {datetime_obj.strftime('%d.%m.%Y %H:%M')}\n"
-                        f"👥 Участники: {len(updated_slot.participants)}\n\n"
-                        f"💬 Комната уже создана для этого слота."
-                    )
+                await update.message.reply_text(
+                    f"🎉 Слот заполнен! Создаем группу...\n\n"
+                    f"🎬 Фильм: {updated_slot.movie.title}\n"
+                    f"📅 Время: {datetime_obj.strftime('%d.%m.%Y %H:%M')}\n"
+                    f"👥 Участники: {updated_slot.participant_count}"
+                )
             else:
                 await update.message.reply_text(
                     f"✅ Слот создан!\n\n"
-                    f"Фильм: {slot.movie.title}\n"
+                    f"Фильм: {updated_slot.movie.title}\n"
                     f"Время: {datetime_obj.strftime('%d.%m.%Y %H:%M')}\n"
                     f"Минимум участников: {min_participants}\n"
-                    f"Текущие участники: {len(updated_slot.participants)}\n\n"
+                    f"Текущие участники: {updated_slot.participant_count}\n\n"
                     "Ожидаем участников..."
                 )
+        finally:
+            db.close()
         
         clear_state(user_id)
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка при создании слота: {str(e)}")
         clear_state(user_id)
-    finally:
-        db.close()
 
 
 async def find_slots_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -502,29 +495,26 @@ async def find_slots_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     movie_id = int(query.data.split(":")[1])
     
-    db: Session = SessionLocal()
-    try:
-        movie = MovieRepository.get_by_id(db, movie_id)
-        if not movie:
-            await query.edit_message_text("❌ Фильм не найден.")
-            return
-        
-        slots = SlotRepository.get_by_movie(db, movie_id)
-        
-        if not slots:
-            await query.edit_message_text(
-                f"Для <b>{movie.title}</b> пока нет доступных слотов.\n\n"
-                "Создайте новый слот!",
-                parse_mode="HTML"
-            )
-            return
-        
-        slots_text = f"Доступные слоты для <b>{movie.title}</b>:\n\n"
+    async with async_read_session(query.from_user.id) as db:
+        movie = await AsyncMovieRepository.get_by_id(db, movie_id)
+        slots = await AsyncSlotRepository.get_by_movie(db, movie_id, profile=LoadProfile.LIST_CARD) if movie else []
+    
+    if not movie:
+        await query.edit_message_text("❌ Фильм не найден.")
+        return
+    
+    if not slots:
         await query.edit_message_text(
-            slots_text,
-            reply_markup=get_slots_list_keyboard(slots),
+            f"Для <b>{movie.title}</b> пока нет доступных слотов.\n\n"
+            "Создайте новый слот!",
             parse_mode="HTML"
         )
-    finally:
-        db.close()
+        return
+    
+    slots_text = f"Доступные слоты для <b>{movie.title}</b>:\n\n"
+    await query.edit_message_text(
+        slots_text,
+        reply_markup=get_slots_list_keyboard(slots),
+        parse_mode="HTML"
+    )
 
@@ -1,10 +1,9 @@
 """Rating handler"""
 from telegram import Update
 from telegram.ext import ContextTypes
-from sqlalchemy.orm import Session
 
-from bot.database.session import SessionLocal
-from bot.database.repositories import RoomRepository, UserRepository
+from bot.database.session import AsyncSessionLocal, async_unit_of_work
+from bot.database.async_repositories import AsyncRoomRepository, AsyncUserRepository
 from bot.services.rating_service import RatingService
 from bot.utils.keyboards import get_rating_keyboard
 
@@ -14,11 +13,10 @@ async def rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     
-    db: Session = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         # Find room for this chat (in future: by telegram_group_id)
         # For now, find active rooms where user participates
-        rooms = RoomRepository.get_user_rooms(db, user_id)
+        rooms = await AsyncRoomRepository.get_user_rooms(db, user_id)
         
         if not rooms:
             await update.message.reply_text(
@@ -32,7 +30,7 @@ async def rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         room = rooms[0]
         
         # Get users to rate
-        users_to_rate = RatingService.get_users_to_rate(db, room.id, user_id)
+        users_to_rate = await db.run_sync(RatingService.get_users_to_rate, room.id, user_id)
         
         if not users_to_rate:
             await update.message.reply_text(
@@ -42,7 +40,7 @@ async def rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Get first user to rate
         user_to_rate_id = users_to_rate[0]
-        user_to_rate = UserRepository.get_by_id(db, user_to_rate_id)
+        user_to_rate = await AsyncUserRepository.get_by_id(db, user_to_rate_id)
         
         if not user_to_rate:
             await update.message.reply_text("❌ Пользователь не найден.")
@@ -63,8 +61,6 @@ async def rate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             + (f" (@{user_to_rate.username})" if user_to_rate.username else ""),
             reply_markup=get_rating_keyboard(room.id, user_to_rate_id)
         )
-    finally:
-        db.close()
 
 
 async def rate_user_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -79,40 +75,34 @@ async def rate_user_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     rater_id = query.from_user.id
     
-    db: Session = SessionLocal()
-    try:
+    # The rating is committed before the Telegram call, which would otherwise
+    # hold the write transaction open (and roll the rating back if it failed)
+    reply_markup = None
+    async with async_unit_of_work() as db:
         # Create rating
-        success = RatingService.create_rating(db, room_id, rater_id, rated_id, score)
+        success = await db.run_sync(RatingService.create_rating, room_id, rater_id, rated_id, score)
         
         if not success:
-            await query.edit_message_text("❌ Не удалось сохранить оценку.")
-            return
-        
-        # Get next user to rate
-        users_to_rate = RatingService.get_users_to_rate(db, room_id, rater_id)
-        
-        if not users_to_rate:
-            await query.edit_message_text(
-                "✅ Спасибо! Вы оценили всех участников.\n\n"
-                "Ваши оценки сохранены и учтены в рейтингах."
-            )
-            return
-        
-        # Get next user
-        next_user_id = users_to_rate[0]
-        next_user = UserRepository.get_by_id(db, next_user_id)
-        
-        if not next_user:
-            await query.edit_message_text("✅ Оценка сохранена!")
-            return
-        
-        await query.edit_message_text(
-            f"✅ Оценка сохранена!\n\n"
-            f"Оцените следующего участника:\n\n"
-            f"👤 {next_user.first_name}"
-            + (f" (@{next_user.username})" if next_user.username else ""),
-            reply_markup=get_rating_keyboard(room_id, next_user_id)
-        )
-    finally:
-        db.close()
-
+            reply = "❌ Не удалось сохранить оценку."
+        else:
+            # Get next user to rate
+            users_to_rate = await db.run_sync(RatingService.get_users_to_rate, room_id, rater_id)
+            next_user = await AsyncUserRepository.get_by_id(db, users_to_rate[0]) if users_to_rate else None
+            
+            if not users_to_rate:
+                reply = (
+                    "✅ Спасибо! Вы оценили всех участников.\n\n"
+                    "Ваши оценки сохранены и учтены в рейтингах."
+                )
+            elif not next_user:
+                reply = "✅ Оценка сохранена!"
+            else:
+                reply = (
+                    f"✅ Оценка сохранена!\n\n"
+                    f"Оцените следующего участника:\n\n"
+                    f"👤 {next_user.first_name}"
+                    + (f" (@{next_user.username})" if next_user.username else "")
+                )
+                reply_markup = get_rating_keyboard(room_id, next_user.id)
+    
+    await query.edit_message_text(reply, reply_markup=reply_markup)
@@ -1,103 +1,149 @@
 """Recommended slots listing based on user KP preferences"""
 import logging
+from typing import List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
-from bot.database.session import SessionLocal
-from bot.services.matching import MatchingService
+from bot.config import Config
 from bot.database.models import Slot
-from bot.constants import SlotStatus
+from bot.database.session import async_unit_of_work
+from bot.database.routing import async_read_session
+from bot.database.repositories import TasteNeighbourRepository
+from bot.services.recommendation_feed import RecommendationFeedService
 
 logger = logging.getLogger(__name__)
 
+NO_SLOTS_TEXT = "Сейчас нет доступных слотов. Создайте свой через /add_movie."
+NO_NEIGHBOURS_TEXT = (
+    "Пока нет слотов с похожими на вас зрителями.\n"
+    "Похожие зрители подбираются по оценкам на Кинопоиске — свяжите аккаунт через /link_kp."
+)
+
+
+def _page_markup(scored: List[Tuple[Slot, float]], next_cursor: Optional[Tuple[float, int]], start: int):
+    """Message text and keyboard of one page; (None, None) if nothing to show"""
+    text_lines = ["🎯 <b>Рекомендованные слоты:</b>\n"]
+    buttons = []
+    for i, (slot, score) in enumerate(scored, start):
+        if not slot.movie:
+            continue
+        participants_count = slot.participant_count
+        needed = max(0, slot.min_participants - participants_count)
+        stars = max(0, min(3, int(round(score * 3))))
+        stars_text = f" {'⭐'*stars}" if stars > 0 else ""
+        try:
+            datetime_str = slot.datetime.strftime('%d.%m.%Y %H:%M') if slot.datetime else "Дата не указана"
+            text_lines.append(
+                f"{i}. {slot.movie.title} — {datetime_str}{stars_text} "
+                f"({participants_count}/{slot.min_participants}, нужно еще {needed})"
+            )
+            btn_text = f"{slot.movie.title[:18]} {slot.datetime.strftime('%d.%m %H:%M') if slot.datetime else 'N/A'}{stars_text}"
+            buttons.append([InlineKeyboardButton(btn_text, callback_data=f"join_slot:{slot.id}")])
+        except Exception as e:
+            logger.warning(f"Error formatting slot {slot.id}: {e}")
+            continue
+
+    if not buttons:
+        return None, None
+    if next_cursor is not None:
+        cursor_score, cursor_slot_id = next_cursor
+        buttons.append([InlineKeyboardButton(
+            "Ещё ▶️", callback_data=f"recommend_page:{cursor_score!r}:{cursor_slot_id}:{start + len(scored)}"
+        )])
+    return "\n".join(text_lines), InlineKeyboardMarkup(buttons)
+
+
+def _render_page(db: Session, user_id: int, after: Optional[Tuple[float, int]], start: int):
+    """(whether the page has slots, text, keyboard) of one feed page; run through db.run_sync"""
+    scored, next_cursor = RecommendationFeedService.page(db, user_id, Config.RECOMMEND_PAGE_SIZE, after)
+    return (bool(scored),) + _page_markup(scored, next_cursor, start)
+
+
+def _render_similar(db: Session, user_id: int):
+    """Text and keyboard of the taste neighbours' slots; (None, None) if there are none"""
+    rows = TasteNeighbourRepository.get_neighbour_slots(db, user_id, Config.RECOMMEND_PAGE_SIZE)
+    if not rows:
+        return None, None
+
+    text_lines = ["👥 <b>Слоты с похожими на вас зрителями:</b>\n"]
+    buttons = []
+    for i, (slot, neighbours, _) in enumerate(rows, 1):
+        if not slot.movie:
+            continue
+        datetime_str = slot.datetime.strftime('%d.%m.%Y %H:%M') if slot.datetime else "Дата не указана"
+        text_lines.append(
+            f"{i}. {slot.movie.title} — {datetime_str} "
+            f"(похожих зрителей: {neighbours}, {slot.participant_count}/{slot.min_participants})"
+        )
+        btn_text = f"{slot.movie.title[:18]} {slot.datetime.strftime('%d.%m %H:%M') if slot.datetime else 'N/A'} 👥{neighbours}"
+        buttons.append([InlineKeyboardButton(btn_text, callback_data=f"join_slot:{slot.id}")])
+    return "\n".join(text_lines), InlineKeyboardMarkup(buttons)
+
 
 async def recommend_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show recommended slots ranked by movie interest; exclude watched movies"""
+    """Show recommended slots ranked by movie interest; exclude joined slots and watched movies"""
     user_id = update.effective_user.id
-    db: Session = SessionLocal()
     try:
-        # All open slots with eager loading of participants and movie
-        slots = db.query(Slot).options(
-            joinedload(Slot.participants),
-            joinedload(Slot.movie)
-        ).filter(Slot.status == SlotStatus.OPEN).all()
-        
-        if not slots:
-            await update.message.reply_text("Сейчас нет доступных слотов. Создайте свой через /add_movie.")
-            return
-        
-        # Exclude slots where user already participates
-        filtered = []
-        for s in slots:
-            if any(p.user_id == user_id for p in s.participants):
-                continue
-            filtered.append(s)
-        slots = filtered
-        
-        # Filter out slots without movies
-        slots = [s for s in slots if s.movie is not None]
-        
-        if not slots:
-            await update.message.reply_text("Сейчас нет доступных слотов. Создайте свой через /add_movie.")
-            return
-        
-        # Exclude watched movies using user votes (by kp id)
-        from bot.database.models import UserVote as UserVoteModel
-        try:
-            user_votes = db.query(UserVoteModel).filter(UserVoteModel.user_id == user_id).all()
-            exclude_kp_ids = {v.kinopoisk_id for v in user_votes if v.kinopoisk_id}
-        except Exception as e:
-            logger.warning(f"Error fetching user votes for user {user_id}: {e}")
-            exclude_kp_ids = set()
-        
-        try:
-            scored = MatchingService.annotate_slots_by_interest(db, user_id, slots, exclude_kp_ids)
-        except Exception as e:
-            logger.error(f"Error in annotate_slots_by_interest for user {user_id}: {e}", exc_info=True)
-            # Fallback: show all slots without scoring
-            scored = [(slot, 0.0) for slot in slots]
-        
-        if not scored:
-            await update.message.reply_text("Подходящих рекомендаций нет. Добавьте интересные фильмы через /add_movie.")
+        # The first /recommend materializes the user's feed on the primary;
+        # afterwards it is kept current by slot and vote events
+        async with async_unit_of_work() as write_db:
+            await write_db.run_sync(RecommendationFeedService.ensure, user_id)
+    except Exception as e:
+        logger.error(f"Error building recommendation feed for user {user_id}: {e}", exc_info=True)
+    try:
+        async with async_read_session(user_id) as db:
+            has_slots, text, markup = await db.run_sync(_render_page, user_id, None, 1)
+
+        if not has_slots:
+            await update.message.reply_text(NO_SLOTS_TEXT)
             return
-        
-        text_lines = ["🎯 <b>Рекомендованные слоты:</b>\n"]
-        buttons = []
-        for i, (slot, score) in enumerate(scored[:20], 1):
-            if not slot.movie:
-                continue
-            participants_count = len(slot.participants) if slot.participants else 0
-            needed = max(0, slot.min_participants - participants_count)
-            stars = max(0, min(3, int(round(score * 3))))
-            stars_text = f" {'⭐'*stars}" if stars > 0 else ""
-            try:
-                datetime_str = slot.datetime.strftime('%d.%m.%Y %H:%M') if slot.datetime else "Дата не указана"
-                text_lines.append(
-                    f"{i}. {slot.movie.title} — {datetime_str}{stars_text} "
-                    f"({participants_count}/{slot.min_participants}, нужно еще {needed})"
-                )
-                btn_text = f"{slot.movie.title[:18]} {slot.datetime.strftime('%d.%m %H:%M') if slot.datetime else 'N/A'}{stars_text}"
-                buttons.append([InlineKeyboardButton(btn_text, callback_data=f"join_slot:{slot.id}")])
-            except Exception as e:
-                logger.warning(f"Error formatting slot {slot.id}: {e}")
-                continue
-        
-        if not buttons:
+
+        if text is None:
             await update.message.reply_text("Подходящих рекомендаций нет. Добавьте интересные фильмы через /add_movie.")
             return
-        
-        await update.message.reply_text(
-            "\n".join(text_lines),
-            reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode="HTML"
-        )
+
+        await update.message.reply_text(text, reply_markup=markup, parse_mode="HTML")
     except Exception as e:
         logger.error(f"Error in recommend_command for user {user_id}: {e}", exc_info=True)
         await update.message.reply_text(
             "❌ Произошла ошибка при получении рекомендаций. Попробуйте позже."
         )
-    finally:
-        db.close()
 
 
+async def recommend_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Next page of recommendations (callback data: recommend_page:<score>:<slot_id>:<start>)"""
+    query = update.callback_query
+    await query.answer()
+
+    _, cursor_score, cursor_slot_id, start = query.data.split(":")
+    after = (float(cursor_score), int(cursor_slot_id))
+    user_id = query.from_user.id
+    try:
+        async with async_read_session(user_id) as db:
+            _, text, markup = await db.run_sync(_render_page, user_id, after, int(start))
+        if text is None:
+            await query.edit_message_text("Больше рекомендаций нет.")
+            return
+        await query.edit_message_text(text, reply_markup=markup, parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Error in recommend_page_callback for user {user_id}: {e}", exc_info=True)
+        await query.edit_message_text("❌ Произошла ошибка при получении рекомендаций. Попробуйте позже.")
+
+
+async def similar_slots_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show open slots joined by the user's taste neighbours (people with similar KP votes)"""
+    user_id = update.effective_user.id
+    try:
+        async with async_read_session(user_id) as db:
+            text, markup = await db.run_sync(_render_similar, user_id)
+        if text is None:
+            await update.message.reply_text(NO_NEIGHBOURS_TEXT)
+            return
+
+        await update.message.reply_text(text, reply_markup=markup, parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Error in similar_slots_command for user {user_id}: {e}", exc_info=True)
+        await update.message.reply_text(
+            "❌ Произошла ошибка при получении слотов. Попробуйте позже."
+        )
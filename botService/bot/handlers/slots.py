@@ -5,16 +5,18 @@ from telegram.ext import ContextTypes
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from bot.database.session import SessionLocal
+from bot.database.session import SessionLocal, unit_of_work
+from bot.database.routing import async_read_session
 from bot.database.repositories import (
     SlotRepository, SlotParticipantRepository, 
-    RoomRepository, UserRepository
+    RoomRepository, UserRepository, LoadProfile
 )
-from bot.database.models import SlotParticipant
+from bot.database.async_repositories import AsyncSlotRepository
 from bot.services.room_manager import RoomManager
+from bot.services.recommendation_feed import RecommendationFeedService
 from bot.utils.keyboards import get_user_slots_keyboard, get_participant_slots_keyboard
 from bot.utils.formatters import format_slot_info
-from bot.constants import SlotStatus
+from bot.constants import SlotStatus, JoinStatus
 
 logger = logging.getLogger(__name__)
 
@@ -23,24 +25,21 @@ async def my_slots_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /my_slots command"""
     user_id = update.effective_user.id
     
-    db: Session = SessionLocal()
-    try:
-        # Get slots created by user
-        created_slots = SlotRepository.get_by_creator(db, user_id)
-        
-        if not created_slots:
-            await update.message.reply_text("У вас пока нет созданных слотов.")
-            return
-        
-        text = "📅 <b>Ваши созданные слоты:</b>\n\n"
-        for slot in created_slots:
-            participants_count = len(slot.participants)
-            text += f"• {slot.movie.title} - {slot.datetime.strftime('%d.%m.%Y %H:%M')} "
-            text += f"({participants_count}/{slot.min_participants})\n"
-        
-        await update.message.reply_text(text, parse_mode="HTML")
-    finally:
-        db.close()
+    async with async_read_session(user_id) as db:
+        # Get slots created by user (LIST_CARD loads the movies the list shows)
+        created_slots = await AsyncSlotRepository.get_by_creator(db, user_id, profile=LoadProfile.LIST_CARD)
+    
+    if not created_slots:
+        await update.message.reply_text("У вас пока нет созданных слотов.")
+        return
+    
+    text = "📅 <b>Ваши созданные слоты:</b>\n\n"
+    for slot in created_slots:
+        participants_count = slot.participant_count
+        text += f"• {slot.movie.title} - {slot.datetime.strftime('%d.%m.%Y %H:%M')} "
+        text += f"({participants_count}/{slot.min_participants})\n"
+    
+    await update.message.reply_text(text, parse_mode="HTML")
 
 
 async def join_slot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -51,81 +50,58 @@ async def join_slot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     slot_id = int(query.data.split(":")[1])
     user_id = query.from_user.id
     
-    db: Session = SessionLocal()
     try:
-        slot = SlotRepository.get_by_id(db, slot_id)
-        if not slot:
+        # Capacity check, insert and room promotion are one atomic transaction;
+        # it is committed before any Telegram I/O so the slot lock is short
+        with unit_of_work() as db:
+            result = SlotParticipantRepository.join(db, slot_id, user_id)
+            RecommendationFeedService.on_joined(db, result, user_id)
+        
+        if result.status == JoinStatus.NOT_FOUND:
             await query.edit_message_text("❌ Слот не найден.")
             return
-        
-        # Check if already participating
-        existing = db.query(SlotParticipant).filter(
-            SlotParticipant.slot_id == slot_id,
-            SlotParticipant.user_id == user_id
-        ).first()
-        
-        if existing:
+        if result.status == JoinStatus.ALREADY_JOINED:
             await query.edit_message_text("Вы уже участвуете в этом слоте.")
             return
-        
-        # Check if slot is full
-        if slot.max_participants and len(slot.participants) >= slot.max_participants:
+        if result.status == JoinStatus.FULL:
             await query.edit_message_text("❌ Слот заполнен.")
             return
         
-        # Add participant
-        SlotParticipantRepository.add_participant(db, slot_id, user_id)
-        
-        # Reload slot to get updated participants count
-        updated_slot = SlotRepository.get_by_id(db, slot_id)
-        
-        # Check if should create room
-        if RoomManager.should_create_room(updated_slot):
-            # Check if room already exists
-            existing_room = RoomRepository.get_by_slot_id(db, slot_id)
-            if not existing_room:
-                # Create room only if it doesn't exist
-                room = RoomRepository.create(db, slot_id)
-                updated_slot.status = SlotStatus.FULL
-                db.commit()
-            else:
-                # Room already exists, use it
-                room = existing_room
-                if updated_slot.status != SlotStatus.FULL:
-                    updated_slot.status = SlotStatus.FULL
-                    db.commit()
+        db: Session = SessionLocal()
+        try:
+            updated_slot = SlotRepository.get_by_id(db, slot_id, profile=LoadProfile.ROOM_SETUP)
             
-            # Create Telegram group (only if room was just created or needs update)
-            if not existing_room or not room.telegram_group_id:
-                await RoomManager.create_room_for_slot(updated_slot, context.bot)
+            # Slot reached min_participants: room exists now
+            if result.room is not None:
+                room = RoomRepository.get_by_slot_id(db, slot_id)
+                
+                # Create Telegram group (only if room was just created or needs update)
+                if result.room_created or not room.telegram_group_id:
+                    await RoomManager.create_room_for_slot(updated_slot, context.bot)
+                
+                # Notify creator
+                creator = UserRepository.get_by_id(db, updated_slot.creator_id)
+                if creator:
+                    await context.bot.send_message(
+                        chat_id=updated_slot.creator_id,
+                        text=f"✅ Набралось достаточно участников для слота!\n\n{format_slot_info(updated_slot)}",
+                        parse_mode="HTML"
+                    )
             
-            # Notify creator
-            creator = UserRepository.get_by_id(db, updated_slot.creator_id)
-            if creator:
-                await context.bot.send_message(
-                    chat_id=updated_slot.creator_id,
-                    text=f"✅ Набралось достаточно участников для слота!\n\n{format_slot_info(updated_slot)}",
-                    parse_mode="HTML"
-                )
-        
-        # Use updated slot for final message
-        final_slot = updated_slot if 'updated_slot' in locals() else slot
-        await query.edit_message_text(
-            f"✅ Вы присоединились к слоту!\n\n{format_slot_info(final_slot)}",
-            parse_mode="HTML"
-        )
+            await query.edit_message_text(
+                f"✅ Вы присоединились к слоту!\n\n{format_slot_info(updated_slot)}",
+                parse_mode="HTML"
+            )
+        finally:
+            db.close()
     except Exception as e:
         logger.error(f"Error in join_slot_callback for user {user_id}, slot {slot_id}: {e}", exc_info=True)
         error_msg = "❌ Произошла ошибка при присоединении к слоту."
-        if "UNIQUE constraint" in str(e) or "already exists" in str(e).lower():
-            error_msg += "\n\nВозможно, вы уже участвуете в этом слоте или комната уже создана."
         try:
             await query.edit_message_text(error_msg)
         except:
             # If we can't edit, try to answer
             await query.answer(error_msg, show_alert=True)
-    finally:
-        db.close()
 
 
 async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -135,7 +111,7 @@ async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db: Session = SessionLocal()
     try:
         # Get slots where user is participant (not creator)
-        participations = SlotRepository.get_user_participations(db, user_id)
+        participations = SlotRepository.get_user_participations(db, user_id, profile=LoadProfile.LIST_CARD)
         
         # Filter out slots created by user
         user_slots = [s for s in participations if s.creator_id != user_id]
@@ -160,27 +136,21 @@ async def leave_slot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     slot_id = int(query.data.split(":")[1])
     user_id = query.from_user.id
     
-    db: Session = SessionLocal()
-    try:
+    # The leave is committed before the Telegram call, which would otherwise
+    # hold the write transaction open
+    with unit_of_work() as db:
         slot = SlotRepository.get_by_id(db, slot_id)
         if not slot:
-            await query.edit_message_text("❌ Слот не найден.")
-            return
-        
-        # Check if user is creator
-        if slot.creator_id == user_id:
-            await query.edit_message_text("❌ Вы не можете выйти из своего слота. Удалите слот, если нужно.")
-            return
-        
-        # Remove participant
-        success = SlotParticipantRepository.remove_participant(db, slot_id, user_id)
-        
-        if success:
-            await query.edit_message_text("✅ Вы вышли из слота.")
+            reply = "❌ Слот не найден."
+        elif slot.creator_id == user_id:
+            reply = "❌ Вы не можете выйти из своего слота. Удалите слот, если нужно."
+        elif SlotParticipantRepository.remove_participant(db, slot_id, user_id):
+            RecommendationFeedService.on_left(db, slot, user_id)
+            reply = "✅ Вы вышли из слота."
         else:
-            await query.edit_message_text("❌ Вы не участвуете в этом слоте.")
-    finally:
-        db.close()
+            reply = "❌ Вы не участвуете в этом слоте."
+    
+    await query.edit_message_text(reply)
 
 
 
@@ -195,7 +165,7 @@ async def create_group_callback(update: Update, context: ContextTypes.DEFAULT_TY
     
     db: Session = SessionLocal()
     try:
-        slot = SlotRepository.get_by_id(db, slot_id)
+        slot = SlotRepository.get_by_id(db, slot_id, profile=LoadProfile.ROOM_SETUP)
         if not slot:
             await query.edit_message_text("❌ Слот не найден.")
             return
@@ -207,7 +177,7 @@ async def create_group_callback(update: Update, context: ContextTypes.DEFAULT_TY
             return
         
         # Check if slot is full
-        if slot.status != SlotStatus.FULL or len(slot.participants) < slot.min_participants:
+        if slot.status != SlotStatus.FULL or slot.participant_count < slot.min_participants:
             await query.edit_message_text("❌ Слот еще не готов для создания группы.")
             return
         
@@ -3,7 +3,8 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from sqlalchemy.orm import Session
 
-from bot.database.session import SessionLocal
+from bot.database.session import unit_of_work
+from bot.database.routing import read_session
 from bot.database.repositories import UserRepository
 from bot.utils.keyboards import get_main_menu_keyboard
 
@@ -11,51 +12,48 @@ from bot.utils.keyboards import get_main_menu_keyboard
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with deep link support"""
     user = update.effective_user
-    db: Session = SessionLocal()
-    
-    try:
-        # Register or update user
-        db_user = UserRepository.get_or_create(
+    # Registration is committed before any Telegram I/O
+    with unit_of_work() as db:
+        UserRepository.get_or_create(
             db=db,
             user_id=user.id,
             username=user.username,
             first_name=user.first_name or "Unknown"
         )
+    
+    # Check for deep link parameters
+    if context.args:
+        param = context.args[0]
         
-        # Check for deep link parameters
-        if context.args:
-            param = context.args[0]
-            
-            # Handle group creation deep link
-            if param.startswith("movie_"):
+        # Handle group creation deep link
+        if param.startswith("movie_"):
+            with read_session(user.id) as db:
                 await handle_group_creation(update, context, param, db)
-                return
-        
-        # Default welcome message
-        welcome_text = (
-            f"Привет, {user.first_name}! 👋\n\n"
-            "Добро пожаловать в <b>CoWatch</b> - бот для совместного просмотра фильмов и сериалов!\n\n"
-            "🎬 Находите людей для просмотра\n"
-            "💬 Обсуждайте увиденное\n"
-            "⭐ Получайте рейтинги за активность\n\n"
-            "🔗 Чтобы улучшить рекомендации, свяжите аккаунт Кинопоиска: /link_kp\n"
-            "🎯 Посмотреть все рекомендованные слоты: /recommend\n\n"
-            "Используйте /help для списка команд."
-        )
-        
-        await update.message.reply_text(
-            welcome_text,
-            reply_markup=get_main_menu_keyboard(),
-            parse_mode="HTML"
-        )
-    finally:
-        db.close()
+            return
+    
+    # Default welcome message
+    welcome_text = (
+        f"Привет, {user.first_name}! 👋\n\n"
+        "Добро пожаловать в <b>CoWatch</b> - бот для совместного просмотра фильмов и сериалов!\n\n"
+        "🎬 Находите людей для просмотра\n"
+        "💬 Обсуждайте увиденное\n"
+        "⭐ Получайте рейтинги за активность\n\n"
+        "🔗 Чтобы улучшить рекомендации, свяжите аккаунт Кинопоиска: /link_kp\n"
+        "🎯 Посмотреть все рекомендованные слоты: /recommend\n\n"
+        "Используйте /help для списка команд."
+    )
+    
+    await update.message.reply_text(
+        welcome_text,
+        reply_markup=get_main_menu_keyboard(),
+        parse_mode="HTML"
+    )
 
 
 async def handle_group_creation(update: Update, context: ContextTypes.DEFAULT_TYPE, param: str, db: Session):
     """Handle group creation from deep link"""
     import logging
-    from bot.database.repositories import SlotRepository
+    from bot.database.repositories import SlotRepository, LoadProfile
     
     logger = logging.getLogger(__name__)
     
@@ -68,7 +66,7 @@ async def handle_group_creation(update: Update, context: ContextTypes.DEFAULT_TY
         context.user_data['pending_slot_id'] = slot_id
         
         # Get slot information
-        slot = SlotRepository.get_by_id(db, slot_id)
+        slot = SlotRepository.get_by_id(db, slot_id, profile=LoadProfile.ROOM_SETUP)
         if not slot:
             await update.message.reply_text("❌ Слот не найден.")
             return
@@ -115,7 +113,7 @@ async def handle_group_creation(update: Update, context: ContextTypes.DEFAULT_TY
 
 **Фильм:** {slot.movie.title}
 **Время:** {slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-**Участники:** {len(slot.participants)}
+**Участники:** {slot.participant_count}
 
 🤖 **Автоматическое создание:**
 1. Нажмите кнопку ниже
@@ -171,6 +169,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📖 <b>Справка по командам:</b>\n\n"
         "/start - Начать работу с ботом\n"
         "/recommend - Рекомендованные слоты по вашим предпочтениям\n"
+        "/similar_slots - Слоты, где смотрят зрители с похожим вкусом\n"
         "/link_kp - Привязать ваш ID на Кинопоиске (для рекомендаций)\n"
         "/add_movie - Добавить фильм/сериал для просмотра\n"
         "/my_slots - Мои созданные слоты\n"
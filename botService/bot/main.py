@@ -22,8 +22,11 @@ from bot.handlers.profile import profile_command, my_rooms_command
 from bot.handlers.rating import rate_command, rate_user_callback
 from bot.handlers.group import handle_bot_added_to_group
 from bot.handlers.kp import link_kp_command, handle_kp_id
-from bot.handlers.recommend import recommend_command
+from bot.handlers.recommend import recommend_command, recommend_page_callback, similar_slots_command
 from bot.utils.states import check_state, get_state
+from bot.database.instrumentation import track_queries
+from bot.database.routing import bind_user
+from bot.services import http_client
 
 # Configure logging
 logging.basicConfig(
@@ -33,6 +36,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def tracked(callback):
+    """Per-update wrappers: query accounting and user binding for read routing"""
+    return track_queries(bind_user(callback))
+
+
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle text messages based on user state"""
     user_id = update.effective_user.id
@@ -80,6 +88,11 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def close_http_client(application: Application) -> None:
+    """Close the pooled connections to external APIs"""
+    await http_client.aclose()
+
+
 def main():
     """Main function to start the bot"""
     # Validate configuration
@@ -90,34 +103,38 @@ def main():
         sys.exit(1)
     
     # Create application
-    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder().token(Config.TELEGRAM_BOT_TOKEN).post_shutdown(close_http_client).build()
+    )
     
     # Register command handlers
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("add_movie", add_movie_command))
-    application.add_handler(CommandHandler("my_slots", my_slots_command))
-    application.add_handler(CommandHandler("my_rooms", my_rooms_command))
-    application.add_handler(CommandHandler("profile", profile_command))
-    application.add_handler(CommandHandler("rate", rate_command))
-    application.add_handler(CommandHandler("cancel", cancel_command))
-    application.add_handler(CommandHandler("link_kp", link_kp_command))
-    application.add_handler(CommandHandler("recommend", recommend_command))
+    application.add_handler(CommandHandler("start", tracked(start_command)))
+    application.add_handler(CommandHandler("help", tracked(help_command)))
+    application.add_handler(CommandHandler("add_movie", tracked(add_movie_command)))
+    application.add_handler(CommandHandler("my_slots", tracked(my_slots_command)))
+    application.add_handler(CommandHandler("my_rooms", tracked(my_rooms_command)))
+    application.add_handler(CommandHandler("profile", tracked(profile_command)))
+    application.add_handler(CommandHandler("rate", tracked(rate_command)))
+    application.add_handler(CommandHandler("cancel", tracked(cancel_command)))
+    application.add_handler(CommandHandler("link_kp", tracked(link_kp_command)))
+    application.add_handler(CommandHandler("recommend", tracked(recommend_command)))
+    application.add_handler(CommandHandler("similar_slots", tracked(similar_slots_command)))
     
     # Register callback query handlers
-    application.add_handler(CallbackQueryHandler(create_slot_callback, pattern=r"^create_slot:"))
-    application.add_handler(CallbackQueryHandler(find_slots_callback, pattern=r"^find_slots:"))
-    application.add_handler(CallbackQueryHandler(join_slot_callback, pattern=r"^join_slot:"))
-    application.add_handler(CallbackQueryHandler(leave_slot_callback, pattern=r"^leave_slot:"))
-    application.add_handler(CallbackQueryHandler(create_group_callback, pattern=r"^create_group:"))
-    application.add_handler(CallbackQueryHandler(rate_user_callback, pattern=r"^rate_user:"))
+    application.add_handler(CallbackQueryHandler(tracked(create_slot_callback), pattern=r"^create_slot:"))
+    application.add_handler(CallbackQueryHandler(tracked(find_slots_callback), pattern=r"^find_slots:"))
+    application.add_handler(CallbackQueryHandler(tracked(join_slot_callback), pattern=r"^join_slot:"))
+    application.add_handler(CallbackQueryHandler(tracked(recommend_page_callback), pattern=r"^recommend_page:"))
+    application.add_handler(CallbackQueryHandler(tracked(leave_slot_callback), pattern=r"^leave_slot:"))
+    application.add_handler(CallbackQueryHandler(tracked(create_group_callback), pattern=r"^create_group:"))
+    application.add_handler(CallbackQueryHandler(tracked(rate_user_callback), pattern=r"^rate_user:"))
     
     # Register chat member handler for group management
     from telegram.ext import ChatMemberHandler
-    application.add_handler(ChatMemberHandler(handle_bot_added_to_group, ChatMemberHandler.MY_CHAT_MEMBER))
+    application.add_handler(ChatMemberHandler(tracked(handle_bot_added_to_group), ChatMemberHandler.MY_CHAT_MEMBER))
     
     # Register message handler (must be last)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, tracked(message_handler)))
     
     # Initialize database
     logger.info("Initializing database...")
@@ -0,0 +1,228 @@
+"""Implicit-feedback ALS embeddings of users and movies
+
+Every KP vote and every slot participation is a positive observation of a
+(user, movie) pair, movies keyed by Kinopoisk id. Following Hu, Koren and
+Volinsky, the preference of an observed pair is 1 with confidence
+1 + ALS_ALPHA * (rating / 10 for a vote, ALS_PARTICIPATION_WEIGHT for a
+participation); unobserved pairs have preference 0 and confidence 1.
+Alternating least squares fits ALS_FACTORS-dimensional user and movie
+factors whose dot product predicts the preference.
+
+Factors are stored as float32 blobs by train_embeddings.py (cron). Serving
+needs no model: the predicted interest of a user in a movie is the dot
+product of two stored vectors, clipped to [0, 1].
+"""
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from bot.config import Config
+from bot.database.repositories import EmbeddingRepository, SlotParticipantRepository, UserVoteRepository
+
+logger = logging.getLogger(__name__)
+
+
+def to_blob(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def from_blob(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class Interactions:
+    """Implicit feedback as a sparse user x movie confidence matrix (CSR both ways)"""
+
+    def __init__(self, confidence: Dict[Tuple[int, str], float]):
+        self.user_ids: List[int] = sorted({user_id for user_id, _ in confidence})
+        self.kinopoisk_ids: List[str] = sorted({kp_id for _, kp_id in confidence})
+        self.user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self.movie_index = {kp_id: i for i, kp_id in enumerate(self.kinopoisk_ids)}
+        rows = np.fromiter((self.user_index[u] for u, _ in confidence), dtype=np.int64, count=len(confidence))
+        cols = np.fromiter((self.movie_index[m] for _, m in confidence), dtype=np.int64, count=len(confidence))
+        values = np.fromiter(confidence.values(), dtype=np.float64, count=len(confidence))
+        self.by_user = _csr(rows, cols, values, len(self.user_ids))
+        self.by_movie = _csr(cols, rows, values, len(self.kinopoisk_ids))
+
+    @classmethod
+    def build(cls, votes: Iterable[Tuple[int, str, int]], participations: Iterable[Tuple[int, str]],
+              alpha: float, participation_weight: float) -> "Interactions":
+        """From (user_id, kinopoisk_id, rating) votes and (user_id, kinopoisk_id) participations"""
+        confidence: Dict[Tuple[int, str], float] = {}
+        for user_id, kinopoisk_id, rating in votes:
+            key = (user_id, kinopoisk_id)
+            confidence[key] = confidence.get(key, 1.0) + alpha * rating / 10.0
+        for user_id, kinopoisk_id in participations:
+            key = (user_id, kinopoisk_id)
+            confidence[key] = confidence.get(key, 1.0) + alpha * participation_weight
+        return cls(confidence)
+
+    @classmethod
+    def load(cls, db: Session) -> "Interactions":
+        return cls.build(
+            UserVoteRepository.iter_all_ratings(db), SlotParticipantRepository.iter_participations(db),
+            Config.ALS_ALPHA, Config.ALS_PARTICIPATION_WEIGHT,
+        )
+
+
+class Csr(NamedTuple):
+    indptr: np.ndarray
+    indices: np.ndarray
+    confidence: np.ndarray
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, values: np.ndarray, n_rows: int) -> Csr:
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return Csr(indptr, cols[order], values[order])
+
+
+def solve_rows(fixed: np.ndarray, matrix: Csr, regularization: float,
+               rows: Optional[Iterable[int]] = None, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """One ALS half-step: the least-squares factors of rows given the other side's factors.
+
+    For row u with observed columns I and confidences c:
+    x_u = (F'F + F_I' diag(c - 1) F_I + reg I)^-1 F_I' c. F'F is shared by all rows.
+    Rows without observations get zero vectors.
+    """
+    n_rows, factors = len(matrix.indptr) - 1, fixed.shape[1]
+    if out is None:
+        out = np.zeros((n_rows, factors), dtype=np.float64)
+    gram = fixed.T @ fixed + regularization * np.eye(factors)
+    for row in range(n_rows) if rows is None else rows:
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            out[row] = 0.0
+            continue
+        observed = fixed[matrix.indices[start:end]]
+        confidence = matrix.confidence[start:end]
+        a = gram + (observed.T * (confidence - 1.0)) @ observed
+        out[row] = np.linalg.solve(a, observed.T @ confidence)
+    return out
+
+
+def train_als(interactions: Interactions, factors: int, regularization: float, iterations: int,
+              seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Full training from random movie factors; returns (user factors, movie factors)"""
+    rng = np.random.default_rng(seed)
+    movie_factors = rng.normal(0.0, 0.01, (len(interactions.kinopoisk_ids), factors))
+    user_factors = np.zeros((len(interactions.user_ids), factors))
+    for _ in range(iterations):
+        solve_rows(movie_factors, interactions.by_user, regularization, out=user_factors)
+        solve_rows(user_factors, interactions.by_movie, regularization, out=movie_factors)
+    return user_factors, movie_factors
+
+
+class TrainResult(NamedTuple):
+    users: int      # user vectors written
+    movies: int     # movie vectors written
+    full: bool
+
+
+class EmbeddingService:
+    """Service for training, storing and scoring with ALS embeddings"""
+
+    @staticmethod
+    def train(db: Session, full: bool = False, factors: Optional[int] = None,
+              iterations: Optional[int] = None, seed: int = 0) -> TrainResult:
+        """Retrain embeddings from votes and participations and store them.
+
+        Incremental (the default once embeddings exist) keeps stored movie
+        factors, fits movies without factors against the stored users, then
+        refits only users who are new or voted/joined since the last run, and
+        finally the new movies again against those users. Full retraining
+        refits everything from scratch and replaces every stored vector.
+        Recommendation feeds scored with replaced vectors are dropped.
+        """
+        # recommendation_feed imports this module for scoring
+        from bot.services.recommendation_feed import RecommendationFeedService
+
+        factors = factors or Config.ALS_FACTORS
+        iterations = iterations or Config.ALS_ITERATIONS
+        regularization = Config.ALS_REGULARIZATION
+        since = EmbeddingRepository.last_trained_at(db)
+        started = datetime.utcnow()
+        interactions = Interactions.load(db)
+        if not interactions.user_ids:
+            return TrainResult(0, 0, full)
+
+        stored_movies = {} if full or since is None else EmbeddingRepository.get_movie_vectors(db)
+        if not stored_movies:
+            users, movies = train_als(interactions, factors, regularization, iterations, seed)
+            EmbeddingRepository.store(
+                db,
+                {user_id: to_blob(users[i]) for i, user_id in enumerate(interactions.user_ids)},
+                {kp_id: to_blob(movies[i]) for i, kp_id in enumerate(interactions.kinopoisk_ids)},
+                started, replace=True,
+            )
+            RecommendationFeedService.on_embeddings_trained(
+                db, interactions.user_ids, interactions.kinopoisk_ids, full=True
+            )
+            logger.info(f"Trained embeddings of {len(users)} users and {len(movies)} movies")
+            return TrainResult(len(users), len(movies), True)
+
+        stored_users = EmbeddingRepository.get_user_vectors(db)
+        dimension = len(from_blob(next(iter(stored_movies.values()))))
+        if dimension != factors:
+            raise ValueError(f"Stored embeddings have {dimension} factors, not {factors}; retrain with --full")
+        users = np.zeros((len(interactions.user_ids), factors))
+        for i, user_id in enumerate(interactions.user_ids):
+            if user_id in stored_users:
+                users[i] = from_blob(stored_users[user_id])
+        movies = np.zeros((len(interactions.kinopoisk_ids), factors))
+        new_movies = []
+        for i, kp_id in enumerate(interactions.kinopoisk_ids):
+            if kp_id in stored_movies:
+                movies[i] = from_blob(stored_movies[kp_id])
+            else:
+                new_movies.append(i)
+        changed = EmbeddingRepository.get_changed_user_ids(db, since) | (
+            set(interactions.user_ids) - set(stored_users)
+        )
+        changed_rows = sorted(interactions.user_index[u] for u in changed if u in interactions.user_index)
+
+        solve_rows(users, interactions.by_movie, regularization, new_movies, out=movies)
+        solve_rows(movies, interactions.by_user, regularization, changed_rows, out=users)
+        solve_rows(users, interactions.by_movie, regularization, new_movies, out=movies)
+        EmbeddingRepository.store(
+            db,
+            {interactions.user_ids[i]: to_blob(users[i]) for i in changed_rows},
+            {interactions.kinopoisk_ids[i]: to_blob(movies[i]) for i in new_movies},
+            started,
+        )
+        RecommendationFeedService.on_embeddings_trained(
+            db, [interactions.user_ids[i] for i in changed_rows], [interactions.kinopoisk_ids[i] for i in new_movies]
+        )
+        logger.info(
+            f"Updated embeddings of {len(changed_rows)} users and {len(new_movies)} new movies changed since {since}"
+        )
+        return TrainResult(len(changed_rows), len(new_movies), False)
+
+    @staticmethod
+    def user_vectors(db: Session, user_ids: List[int]) -> Dict[int, np.ndarray]:
+        if not Config.ALS_WEIGHT:
+            return {}
+        return {user_id: from_blob(blob) for user_id, blob in EmbeddingRepository.get_user_vectors(db, user_ids).items()}
+
+    @staticmethod
+    def movie_vectors(db: Session, kinopoisk_ids: List[str]) -> Dict[str, np.ndarray]:
+        if not Config.ALS_WEIGHT:
+            return {}
+        return {kp_id: from_blob(blob) for kp_id, blob in EmbeddingRepository.get_movie_vectors(db, kinopoisk_ids).items()}
+
+    @staticmethod
+    def predict(user_vector: np.ndarray, movie_vector: np.ndarray) -> float:
+        """Predicted preference of a user for a movie, in [0, 1]"""
+        return min(1.0, max(0.0, float(np.dot(user_vector, movie_vector))))
+
+    @staticmethod
+    def blend(interest: float, user_vector: Optional[np.ndarray], movie_vector: Optional[np.ndarray]) -> float:
+        """Heuristic interest mixed with the predicted preference when both embeddings exist"""
+        if user_vector is None or movie_vector is None:
+            return interest
+        weight = Config.ALS_WEIGHT
+        return (1.0 - weight) * interest + weight * EmbeddingService.predict(user_vector, movie_vector)
@@ -0,0 +1,106 @@
+"""Shared async HTTP client for the external APIs (Kinopoisk, Watch2Gether, images)
+
+One pooled httpx.AsyncClient serves every request of the event loop: TCP and
+TLS connections are kept alive and reused, HTTP/2 is negotiated (h2 comes
+with httpx[http2] in requirements.txt), and each host has its own cap on
+concurrent requests and its own default timeout. Handlers await requests
+instead of blocking the loop.
+
+    response = await http_client.get(url, headers=headers)
+
+A client is bound to the loop that created it; a different running loop
+(e.g. successive asyncio.run calls in scripts and tests) gets a fresh one.
+"""
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from bot.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Installed with httpx[http2]; without it the client falls back to HTTP/1.1
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+KINOPOISK_HOST = "kinopoiskapiunofficial.tech"
+# Concurrent requests per host; other hosts get HTTP_PER_HOST_LIMIT
+HOST_LIMITS: Dict[str, int] = {
+    KINOPOISK_HOST: Config.KINOPOISK_HTTP_LIMIT,
+}
+# Default timeout (seconds) per host; a request's own timeout= wins
+HOST_TIMEOUTS: Dict[str, float] = {
+    KINOPOISK_HOST: 10.0,
+    "api.w2g.tv": 10.0,
+}
+
+# Tests route requests through this instead of the network (e.g. httpx.MockTransport)
+_transport: Optional[httpx.AsyncBaseTransport] = None
+_current: Optional["_LoopClient"] = None
+
+
+class _LoopClient:
+    """The pooled client and per-host semaphores of one event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.client = httpx.AsyncClient(
+            http2=HTTP2,
+            transport=_transport,
+            timeout=httpx.Timeout(Config.HTTP_TIMEOUT, connect=Config.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            follow_redirects=True,
+        )
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def slots(self, host: str) -> asyncio.Semaphore:
+        if host not in self.host_slots:
+            self.host_slots[host] = asyncio.Semaphore(HOST_LIMITS.get(host, Config.HTTP_PER_HOST_LIMIT))
+        return self.host_slots[host]
+
+
+def _loop_client() -> _LoopClient:
+    global _current
+    loop = asyncio.get_running_loop()
+    if _current is None or _current.loop is not loop or _current.client.is_closed:
+        _current = _LoopClient(loop)
+    return _current
+
+
+def use_transport(transport: Optional[httpx.AsyncBaseTransport]) -> None:
+    """Send requests through transport from now on (None: the network)"""
+    global _transport, _current
+    _transport = transport
+    _current = None
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send a request through the shared client, within the host's concurrency limit"""
+    state = _loop_client()
+    host = httpx.URL(url).host
+    if "timeout" not in kwargs and host in HOST_TIMEOUTS:
+        kwargs["timeout"] = HOST_TIMEOUTS[host]
+    async with state.slots(host):
+        return await state.client.request(method, url, **kwargs)
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+
+async def aclose() -> None:
+    """Close the current loop's client (on application shutdown)"""
+    global _current
+    if _current is not None and _current.loop is asyncio.get_running_loop():
+        await _current.client.aclose()
+    _current = None
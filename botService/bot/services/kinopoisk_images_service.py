@@ -1,8 +1,8 @@
 """Service for fetching movie images from Kinopoisk API"""
 import logging
-import requests
 from typing import Optional, List, Dict
 from bot.config import Config
+from bot.services import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +13,7 @@ class KinopoiskImagesService:
     BASE_URL = "https://kinopoiskapiunofficial.tech/api/v2.2"
     
     @staticmethod
-    def get_movie_images(kinopoisk_id: str, image_type: str = "POSTER", page: int = 1) -> Optional[List[Dict]]:
+    async def get_movie_images(kinopoisk_id: str, image_type: str = "POSTER", page: int = 1) -> Optional[List[Dict]]:
         """
         Get movie images by Kinopoisk ID
         
@@ -39,7 +39,7 @@ class KinopoiskImagesService:
             }
             
             logger.info(f"Fetching {image_type} images for movie {kinopoisk_id}")
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            response = await http_client.get(url, headers=headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -55,7 +55,7 @@ class KinopoiskImagesService:
             return None
     
     @staticmethod
-    def get_best_poster(kinopoisk_id: str) -> Optional[str]:
+    async def get_best_poster(kinopoisk_id: str) -> Optional[str]:
         """
         Get the best poster URL for a movie
         
@@ -65,7 +65,7 @@ class KinopoiskImagesService:
         Returns:
             Best poster URL or None if not found
         """
-        posters = KinopoiskImagesService.get_movie_images(kinopoisk_id, "POSTER")
+        posters = await KinopoiskImagesService.get_movie_images(kinopoisk_id, "POSTER")
         
         if not posters:
             logger.warning(f"No posters found for movie {kinopoisk_id}")
@@ -88,7 +88,7 @@ class KinopoiskImagesService:
         return None
     
     @staticmethod
-    def download_image(image_url: str) -> Optional[bytes]:
+    async def download_image(image_url: str) -> Optional[bytes]:
         """
         Download image from URL
         
@@ -100,7 +100,7 @@ class KinopoiskImagesService:
         """
         try:
             logger.info(f"Downloading image from: {image_url}")
-            response = requests.get(image_url, timeout=30)
+            response = await http_client.get(image_url, timeout=30)
             
             if response.status_code == 200:
                 logger.info(f"Successfully downloaded image ({len(response.content)} bytes)")
@@ -1,81 +1,131 @@
 """Service to fetch and store Kinopoisk user votes"""
+import asyncio
 import logging
-from typing import Optional
-import requests
+from typing import Dict, List, Optional
+
+import httpx
 
 from bot.config import Config
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
+from bot.database.session import SessionLocal, unit_of_work
 from bot.database.repositories import UserKinopoiskRepository, UserVoteRepository
+from bot.services.recommendation_feed import RecommendationFeedService
+from bot.services import http_client
 
 logger = logging.getLogger(__name__)
 
 class KinopoiskUserService:
     BASE_URL = "https://kinopoiskapiunofficial.tech/api/v1/kp_users"
+    # Attempts per page when the API answers 429 (quota exceeded)
+    PAGE_ATTEMPTS = 3
     
     @staticmethod
     def set_user_kp_id(db: Session, user_id: int, kp_user_id: str) -> None:
         UserKinopoiskRepository.set_kp_user_id(db, user_id, kp_user_id)
     
     @staticmethod
-    def fetch_and_store_votes(db: Session, user_id: int) -> int:
+    async def fetch_and_store_votes(user_id: int, session_factory: sessionmaker = SessionLocal) -> int:
         """
         Fetch all votes for the user from Kinopoisk API and store them.
         Returns number of votes stored/updated.
-        """
-        record = UserKinopoiskRepository.get_by_user_id(db, user_id)
-        if not record:
-            raise ValueError("Kinopoisk user id is not linked. Use /link_kp first.")
         
-        kp_user_id = record.kp_user_id
+        Page 1 gives totalPages; the other pages are fetched concurrently,
+        at most KP_VOTES_CONCURRENCY at a time, and each page is stored as
+        soon as it arrives. Every page is committed in its own short unit of
+        work, so no transaction stays open while pages are fetched. A page
+        that fails (HTTP error status or network error) is logged and skipped.
+        """
+        with unit_of_work(session_factory) as db:
+            record = UserKinopoiskRepository.get_by_user_id(db, user_id)
+            if not record:
+                raise ValueError("Kinopoisk user id is not linked. Use /link_kp first.")
+            kp_user_id = record.kp_user_id
         headers = {"X-API-KEY": Config.KINOPOISK_API_KEY}
         
-        page = 1
-        total_pages = 1
-        stored = 0
+        first = await KinopoiskUserService._fetch_page(kp_user_id, 1, headers)
+        if first is None:
+            # Nothing imported: the feed does not change either
+            return 0
+        stored = KinopoiskUserService._store_page(session_factory, user_id, first.get("items") or [])
+        total_pages = first.get("totalPages", 1) or 1
+        
+        limit = asyncio.Semaphore(max(1, Config.KP_VOTES_CONCURRENCY))
         
-        while page <= total_pages:
-            url = f"{KinopoiskUserService.BASE_URL}/{kp_user_id}/votes?page={page}"
-            resp = requests.get(url, headers=headers, timeout=15)
+        async def fetch(page: int) -> Optional[Dict]:
+            async with limit:
+                return await KinopoiskUserService._fetch_page(kp_user_id, page, headers)
+        
+        pending = [asyncio.ensure_future(fetch(page)) for page in range(2, total_pages + 1)]
+        try:
+            for next_page in asyncio.as_completed(pending):
+                data = await next_page
+                if data is not None:
+                    stored += KinopoiskUserService._store_page(session_factory, user_id, data.get("items") or [])
+        finally:
+            for task in pending:
+                task.cancel()
+            # Committed pages stay even if a later one aborts the import, and
+            # their votes change the profile and the watched movies behind the feed
+            with unit_of_work(session_factory) as db:
+                RecommendationFeedService.on_votes_imported(db, user_id)
+        return stored
+    
+    @staticmethod
+    async def _fetch_page(kp_user_id: str, page: int, headers: Dict) -> Optional[Dict]:
+        """One page of a user's votes, or None if it could not be fetched"""
+        url = f"{KinopoiskUserService.BASE_URL}/{kp_user_id}/votes?page={page}"
+        for attempt in range(1, KinopoiskUserService.PAGE_ATTEMPTS + 1):
+            try:
+                resp = await http_client.get(url, headers=headers, timeout=15)
+            except httpx.HTTPError as e:
+                logger.error(f"Network error while fetching KP votes for {kp_user_id} page {page}: {e}")
+                return None
+            if resp.status_code == 429 and attempt < KinopoiskUserService.PAGE_ATTEMPTS:
+                try:
+                    delay = float(resp.headers.get("Retry-After", attempt))
+                except ValueError:
+                    delay = attempt
+                logger.warning(f"KP votes quota exceeded for {kp_user_id} page {page}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+                continue
             if resp.status_code != 200:
-                logger.error(f"Failed to fetch KP votes for {kp_user_id}, status={resp.status_code}, body={resp.text[:200]}")
-                break
-            
-            data = resp.json()
-            total_pages = data.get("totalPages", 1) or 1
-            items = data.get("items", []) or []
-            
-            for item in items:
+                logger.error(f"Failed to fetch KP votes for {kp_user_id} page {page}, status={resp.status_code}, body={resp.text[:200]}")
+                return None
+            return resp.json()
+        return None
+    
+    @staticmethod
+    def _store_page(session_factory: sessionmaker, user_id: int, items: List[Dict]) -> int:
+        """Store the votes of one page with one bulk upsert and commit; returns how many were stored"""
+        votes = []
+        for item in items:
+            try:
+                kinopoisk_id = str(item.get("kinopoiskId"))
+                title = item.get("nameRu") or item.get("nameEn") or item.get("nameOriginal")
+                year_raw = item.get("year")
+                year = None
                 try:
-                    kinopoisk_id = str(item.get("kinopoiskId"))
-                    title = item.get("nameRu") or item.get("nameEn") or item.get("nameOriginal")
-                    year_raw = item.get("year")
+                    year = int(year_raw) if year_raw is not None else None
+                except Exception:
                     year = None
-                    try:
-                        year = int(year_raw) if year_raw is not None else None
-                    except Exception:
-                        year = None
-                    movie_type = item.get("type")
-                    poster_url = item.get("posterUrlPreview") or item.get("posterUrl")
-                    user_rating = int(item.get("userRating")) if item.get("userRating") is not None else None
-                    if not kinopoisk_id or user_rating is None:
-                        continue
-                    
-                    UserVoteRepository.upsert_vote(
-                        db=db,
-                        user_id=user_id,
-                        kinopoisk_id=kinopoisk_id,
-                        title=title,
-                        year=year,
-                        movie_type=movie_type,
-                        user_rating=user_rating,
-                        poster_url=poster_url
-                    )
-                    stored += 1
-                except Exception as e:
-                    logger.warning(f"Failed to process vote item: {e}")
-            
-            page += 1
-        
-        return stored
-
-
+                movie_type = item.get("type")
+                poster_url = item.get("posterUrlPreview") or item.get("posterUrl")
+                genres = ", ".join(g.get("genre") for g in (item.get("genres") or []) if g.get("genre")) or None
+                user_rating = int(item.get("userRating")) if item.get("userRating") is not None else None
+                if not kinopoisk_id or user_rating is None:
+                    continue
+                
+                votes.append({
+                    "kinopoisk_id": kinopoisk_id,
+                    "title": title,
+                    "year": year,
+                    "movie_type": movie_type,
+                    "user_rating": user_rating,
+                    "poster_url": poster_url,
+                    "genres": genres,
+                })
+            except Exception as e:
+                logger.warning(f"Failed to process vote item: {e}")
+        with unit_of_work(session_factory) as db:
+            result = UserVoteRepository.upsert_votes(db, user_id, votes)
+        return result.inserted + result.updated
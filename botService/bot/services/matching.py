@@ -1,15 +1,171 @@
 """Matching service - preferences and peer rating similarity"""
+import json
 import logging
-from typing import Dict, List, Tuple
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, case, cast, func, literal, or_
 from sqlalchemy.orm import Session
-from bot.database.repositories import UserVoteRepository, UserRepository
-from bot.database.models import Slot, Movie
+from bot.database.repositories import (
+    UserVoteRepository, UserRepository, PreferenceProfileRepository, SlotRepository,
+    TasteNeighbourRepository,
+)
+from bot.database.user_cache import user_cache
+from bot.database.models import Slot, Movie, UserPreferenceProfile
+from bot.utils.genres import genre_bit
 
 logger = logging.getLogger(__name__)
 
+# Column of each kinopoisk_id in vote matrices, shared by the whole process
+_movie_columns: Dict[str, int] = {}
+_movie_columns_lock = threading.Lock()
+
+
+def _movie_column_ids(votes: Dict[str, int]) -> np.ndarray:
+    try:
+        return np.fromiter(map(_movie_columns.__getitem__, votes), dtype=np.int32, count=len(votes))
+    except KeyError:
+        with _movie_columns_lock:
+            columns = [_movie_columns.setdefault(kp_id, len(_movie_columns)) for kp_id in votes]
+        return np.array(columns, dtype=np.int32)
+
+
+class VoteVector(NamedTuple):
+    """One user's votes as parallel arrays: movie columns and ratings"""
+    columns: np.ndarray
+    ratings: np.ndarray
+
+
+def vote_vector(votes: Dict[str, int]) -> VoteVector:
+    return VoteVector(
+        _movie_column_ids(votes),
+        np.fromiter(votes.values(), dtype=np.int16, count=len(votes)),
+    )
+
+
+class VoteMatrix:
+    """Sparse user x movie matrix of KP votes (CSR: rows are users)"""
+
+    def __init__(self, user_ids: List[int], vectors: List[VoteVector]):
+        self.user_ids = user_ids
+        lengths = np.array([len(v.columns) for v in vectors], dtype=np.int64)
+        self.rows = np.repeat(np.arange(len(user_ids), dtype=np.int32), lengths)
+        self.columns = np.concatenate([v.columns for v in vectors]) if vectors else np.empty(0, np.int32)
+        self.ratings = np.concatenate([v.ratings for v in vectors]) if vectors else np.empty(0, np.int16)
+        self.width = int(self.columns.max()) + 1 if len(self.columns) else 0
+
+    def preference_similarity(self, target: VoteVector) -> np.ndarray:
+        """1 - normalized MAE over common movies of target and every row; 0 without overlap"""
+        n = len(self.user_ids)
+        sims = np.zeros(n)
+        if not len(target.columns) or not len(self.columns):
+            return sims
+        # Target as a dense row over the matrix columns
+        in_width = target.columns < self.width
+        voted = np.zeros(self.width, dtype=bool)
+        dense = np.zeros(self.width, dtype=np.int16)
+        voted[target.columns[in_width]] = True
+        dense[target.columns[in_width]] = target.ratings[in_width]
+        
+        common = voted[self.columns]
+        rows = self.rows[common]
+        diffs = np.abs(self.ratings[common] - dense[self.columns[common]])
+        counts = np.bincount(rows, minlength=n)
+        # Integer sums are exact in float64, so this matches the scalar formula bit for bit
+        sums = np.bincount(rows, weights=diffs, minlength=n)
+        has_common = counts > 0
+        sims[has_common] = 1.0 - (sums[has_common] / (counts[has_common] * 9.0))
+        np.maximum(sims, 0.0, out=sims)
+        return sims
+
+
+class PreferenceStats(NamedTuple):
+    """Decoded preference profile: the inputs of movie interest scoring"""
+    avg_year: Optional[float]
+    type_counts: Dict[str, int]
+    genre_counts: Dict[str, int]
+    total: int
+    # Bits of the user's top genres and (bit, share of votes) of each, by bit
+    genre_mask: int = 0
+    genre_weights: Tuple[Tuple[int, float], ...] = ()
+
+
 class MatchingService:
     """Service for matching users by preferences and peer ratings"""
     
+    @staticmethod
+    def _votes_map(db: Session, user_id: int) -> Dict[str, int]:
+        """KP votes of a user, from the process cache when possible"""
+        return user_cache.get_votes(user_id, lambda uid: UserVoteRepository.get_user_votes_map(db, uid))
+    
+    @staticmethod
+    def _peer_rating(db: Session, user_id: int) -> Optional[float]:
+        """In-bot rating of a user, from the process cache when possible"""
+        return user_cache.get_rating(user_id, lambda uid: UserRepository.get_rating(db, uid))
+    
+    @staticmethod
+    def _vote_vector(db: Session, user_id: int) -> VoteVector:
+        return user_cache.get_vector(user_id, lambda uid: vote_vector(MatchingService._votes_map(db, uid)))
+    
+    @staticmethod
+    def _vote_vectors(db: Session, user_ids: List[int]) -> Dict[int, VoteVector]:
+        """_vote_vector of many users; cache misses are read in one IN query"""
+        def load_many(missing: List[int]) -> Dict[int, VoteVector]:
+            maps = UserVoteRepository.get_votes_maps(db, missing)
+            return {uid: vote_vector(votes) for uid, votes in maps.items()}
+        return user_cache.get_vectors(user_ids, load_many)
+    
+    @staticmethod
+    def _peer_ratings(db: Session, user_ids: List[int]) -> Dict[int, Optional[float]]:
+        """_peer_rating of many users; cache misses are read in one IN query"""
+        return user_cache.get_ratings(user_ids, lambda missing: UserRepository.get_ratings(db, missing))
+    
+    @staticmethod
+    def score_users(db: Session, user_id: int, other_ids: Iterable[int]) -> Dict[int, float]:
+        """compute_user_similarity of user_id against many users in one batched operation.
+
+        Votes and ratings not in the process cache cost one query each for
+        all users together, however many there are.
+        """
+        other_ids = list(dict.fromkeys(other_ids))
+        if not other_ids:
+            return {}
+        vectors = MatchingService._vote_vectors(db, [user_id] + other_ids)
+        matrix = VoteMatrix(other_ids, [vectors[uid] for uid in other_ids])
+        pref_sim = matrix.preference_similarity(vectors[user_id])
+        scores = 0.7 * pref_sim + 0.3 * MatchingService._rating_closeness(db, user_id, other_ids)
+        return dict(zip(other_ids, scores.tolist()))
+    
+    @staticmethod
+    def _rating_closeness(db: Session, user_id: int, other_ids: List[int]) -> np.ndarray:
+        """Peer rating closeness of user_id to each of other_ids (0 where unknown)"""
+        peer_ratings = MatchingService._peer_ratings(db, [user_id] + other_ids)
+        own_rating = peer_ratings[user_id]
+        ratings = np.array([peer_ratings[uid] for uid in other_ids], dtype=float)  # None -> nan
+        if own_rating is None:
+            return np.zeros(len(other_ids))
+        rating_close = 1.0 - np.minimum(1.0, np.abs(own_rating - ratings) / 5.0)
+        rating_close[np.isnan(ratings)] = 0.0
+        return rating_close
+    
+    @staticmethod
+    def score_neighbours(db: Session, user_id: int, other_ids: Iterable[int]) -> Optional[Dict[int, float]]:
+        """score_users with vote similarity read from the taste_neighbours table.
+
+        Users outside the user's stored neighbours count as dissimilar. None if
+        no neighbours were computed for the user (new user, job not run yet).
+        """
+        other_ids = list(dict.fromkeys(other_ids))
+        if not other_ids:
+            return {}
+        taste = TasteNeighbourRepository.get_scores(db, user_id, other_ids)
+        if not taste and not TasteNeighbourRepository.has_neighbours(db, user_id):
+            return None
+        pref_sim = np.array([taste.get(uid, 0.0) for uid in other_ids], dtype=float)
+        scores = 0.7 * pref_sim + 0.3 * MatchingService._rating_closeness(db, user_id, other_ids)
+        return dict(zip(other_ids, scores.tolist()))
+    
     @staticmethod
     def compute_user_similarity(db: Session, user_a_id: int, user_b_id: int) -> float:
         """
@@ -18,8 +174,8 @@ class MatchingService:
         - Peer rating closeness based on in-bot rating (User.rating)
         Returns score in [0,1].
         """
-        votes_a = UserVoteRepository.get_user_votes_map(db, user_a_id)
-        votes_b = UserVoteRepository.get_user_votes_map(db, user_b_id)
+        votes_a = MatchingService._votes_map(db, user_a_id)
+        votes_b = MatchingService._votes_map(db, user_b_id)
         
         # Preference similarity
         common = set(votes_a.keys()) & set(votes_b.keys())
@@ -33,10 +189,10 @@ class MatchingService:
             pref_sim = 0.0
         
         # Peer rating closeness
-        ua = UserRepository.get_by_id(db, user_a_id)
-        ub = UserRepository.get_by_id(db, user_b_id)
-        if ua and ub:
-            diff = abs((ua.rating or 0.0) - (ub.rating or 0.0))
+        rating_a = MatchingService._peer_rating(db, user_a_id)
+        rating_b = MatchingService._peer_rating(db, user_b_id)
+        if rating_a is not None and rating_b is not None:
+            diff = abs(rating_a - rating_b)
             rating_close = 1.0 - min(1.0, diff / 5.0)  # ratings 0..5
         else:
             rating_close = 0.0
@@ -49,67 +205,146 @@ class MatchingService:
         """Average similarity to current participants"""
         if not slot.participants:
             return 0.0
-        sims = [MatchingService.compute_user_similarity(db, user_id, p.user_id) for p in slot.participants]
+        scores = MatchingService.score_users(db, user_id, [p.user_id for p in slot.participants])
+        return MatchingService._slot_score(slot, scores)
+    
+    @staticmethod
+    def _slot_score(slot: Slot, scores: Dict[int, float]) -> float:
+        if not slot.participants:
+            return 0.0
+        sims = [scores[p.user_id] for p in slot.participants]
         return sum(sims) / len(sims)
     
     @staticmethod
     def annotate_slots_by_compatibility(db: Session, user_id: int, slots: List[Slot]) -> List[Tuple[Slot, float]]:
         """Return list of (slot, score) sorted by score desc"""
-        scored = [(slot, MatchingService.compute_slot_compatibility(db, user_id, slot)) for slot in slots]
+        # Everyone in every candidate slot is scored in one batch
+        scores = MatchingService.score_users(db, user_id, [p.user_id for slot in slots for p in slot.participants])
+        scored = [(slot, MatchingService._slot_score(slot, scores)) for slot in slots]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored
+    
+    @staticmethod
+    def annotate_slots_by_neighbours(db: Session, user_id: int, slots: List[Slot]) -> List[Tuple[Slot, float]]:
+        """annotate_slots_by_compatibility using stored taste neighbours when the user has them"""
+        participant_ids = [p.user_id for slot in slots for p in slot.participants]
+        scores = MatchingService.score_neighbours(db, user_id, participant_ids)
+        if scores is None:
+            return MatchingService.annotate_slots_by_compatibility(db, user_id, slots)
+        scored = [(slot, MatchingService._slot_score(slot, scores)) for slot in slots]
         scored.sort(key=lambda x: x[1], reverse=True)
         return scored
 
     # ---- Interest-based ranking for movies (not user similarity) ----
     @staticmethod
-    def _compute_user_vote_stats(db: Session, user_id: int) -> Tuple[float | None, Dict[str, int], int]:
-        """Return (avg_year, type_counts, total_votes) from user votes"""
-        votes = db.query(UserVoteRepository).first()  # placeholder to satisfy linter types
-        user_votes = UserVoteRepository.get_user_votes_map(db, user_id)
-        # We need extended info, so re-query full rows
-        from bot.database.models import UserVote as UserVoteModel
-        rows = db.query(UserVoteModel).filter(UserVoteModel.user_id == user_id).all()
-        years = [r.year for r in rows if r.year is not None]
-        avg_year = sum(years) / len(years) if years else None
-        type_counts: Dict[str, int] = {}
-        for r in rows:
-            if r.type:
-                type_counts[r.type] = type_counts.get(r.type, 0) + 1
-        total = len(rows)
-        return avg_year, type_counts, total
+    def preference_stats(profile: Optional[UserPreferenceProfile]) -> PreferenceStats:
+        """Decode a stored preference profile (None: user without votes)"""
+        if profile is None or not profile.vote_count:
+            return PreferenceStats(None, {}, {}, 0)
+        avg_year = profile.year_sum / profile.year_count if profile.year_count else None
+        weights = sorted(
+            (genre_bit(int(genre_id)), count / profile.vote_count)
+            for genre_id, count in json.loads(profile.top_genre_counts).items()
+        )
+        return PreferenceStats(
+            avg_year, json.loads(profile.type_counts), json.loads(profile.genre_counts), profile.vote_count,
+            profile.genre_mask or 0, tuple((bit, share) for bit, share in weights if bit),
+        )
     
     @staticmethod
-    def compute_movie_interest(db: Session, user_id: int, movie: Movie) -> float:
+    def movie_interest(stats: PreferenceStats, movie: Movie) -> float:
         """
         Heuristic interest score in [0,1] based on:
         - type preference (user's distribution over FILM/TV_SERIES)
         - year proximity to user's average year
+        - genre affinity: share of the user's votes in each of their top genres
+          that the movie has (bitwise AND of genre masks), capped at 1
         - light popularity proxy (not here; handled at slot level if needed)
         """
-        avg_year, type_counts, total = MatchingService._compute_user_vote_stats(db, user_id)
-        
         # Type score
         type_score = 0.0
-        if total > 0 and movie.type:
-            type_score = type_counts.get(movie.type, 0) / total
+        if stats.total > 0 and movie.type:
+            type_score = stats.type_counts.get(movie.type, 0) / stats.total
         
         # Year score
         year_score = 0.0
-        if avg_year is not None and movie.year:
-            diff = abs(movie.year - avg_year)
+        if stats.avg_year is not None and movie.year:
+            diff = abs(movie.year - stats.avg_year)
             year_score = 1.0 - min(1.0, diff / 30.0)  # decay over ~30 years
         
+        # Genre score
+        genre_score = 0.0
+        overlap = (movie.genre_mask or 0) & stats.genre_mask
+        if overlap:
+            genre_score = min(1.0, sum(share for bit, share in stats.genre_weights if overlap & bit))
+        
         # Combine
-        return 0.7 * type_score + 0.3 * year_score
+        return 0.5 * type_score + 0.2 * year_score + 0.3 * genre_score
+    
+    @staticmethod
+    def compute_movie_interest(db: Session, user_id: int, movie: Movie) -> float:
+        """Interest of a user in a movie, from the stored preference profile"""
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, user_id))
+        return MatchingService.movie_interest(stats, movie)
+    
+    @staticmethod
+    def interest_sql(stats: PreferenceStats):
+        """movie_interest as a SQL expression over Movie columns (cheap pre-ranking)"""
+        type_score = literal(0.0)
+        if stats.total > 0 and stats.type_counts:
+            type_score = case(
+                *[(Movie.type == movie_type, count / stats.total) for movie_type, count in stats.type_counts.items()],
+                else_=0.0,
+            )
+        year_score = literal(0.0)
+        if stats.avg_year is not None:
+            distance = func.abs(cast(Movie.year, Float) - stats.avg_year) / 30.0
+            year_score = case(
+                (or_(Movie.year.is_(None), Movie.year == 0), 0.0),
+                (distance >= 1.0, 0.0),
+                else_=1.0 - distance,
+            )
+        genre_score = literal(0.0)
+        if stats.genre_weights:
+            matched = literal(0.0)
+            for bit, share in stats.genre_weights:
+                matched = matched + case((Movie.genre_mask.op("&")(bit) != 0, share), else_=0.0)
+            genre_score = case((matched > 1.0, 1.0), else_=matched)
+        return cast(0.5 * type_score + 0.2 * year_score + 0.3 * genre_score, Float)
+    
+    @staticmethod
+    def recommend(db: Session, user_id: int, limit: int, after: Optional[Tuple[float, int]] = None
+                  ) -> Tuple[List[Tuple[Slot, float]], Optional[Tuple[float, int]]]:
+        """One page of recommended slots and the cursor of the next page (None at the end).
+
+        Candidates are filtered and pre-ranked in SQL by interest_sql; only the
+        page's ``limit`` rows are loaded and scored with movie_interest.
+        RecommendationFeedService.build stores the first page of
+        RECOMMEND_FEED_SIZE slots as the user's feed.
+        """
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, user_id))
+        candidates = SlotRepository.get_recommendation_candidates(
+            db, user_id, MatchingService.interest_sql(stats), limit + 1, after
+        )
+        page = candidates[:limit]
+        next_cursor = None
+        if len(candidates) > limit:
+            last_slot, last_score = page[-1]
+            next_cursor = (last_score, last_slot.id)
+        scored = [(slot, MatchingService.movie_interest(stats, slot.movie)) for slot, _ in page]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored, next_cursor
     
     @staticmethod
     def annotate_slots_by_interest(db: Session, user_id: int, slots: List[Slot], exclude_kinopoisk_ids: set[str]) -> List[Tuple[Slot, float]]:
         """Score slots by movie interest, exclude watched (by kp id)"""
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, user_id))
         scored: List[Tuple[Slot, float]] = []
         for slot in slots:
             kp_id = slot.movie.kinopoisk_id
             if kp_id and kp_id in exclude_kinopoisk_ids:
                 continue
-            score = MatchingService.compute_movie_interest(db, user_id, slot.movie)
+            score = MatchingService.movie_interest(stats, slot.movie)
             scored.append((slot, score))
         scored.sort(key=lambda x: x[1], reverse=True)
         return scored
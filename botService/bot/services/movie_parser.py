@@ -1,11 +1,20 @@
 """Movie parser service with Kinopoisk API"""
 import re
 import json
+import asyncio
 import logging
-import requests
-from typing import Optional, Dict
+import httpx
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Union
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from bot.constants import MovieType
 from bot.config import Config
+from bot.database.models import Movie
+from bot.database.session import unit_of_work, async_unit_of_work
+from bot.database.repositories import MovieRepository
+from bot.services import http_client
+from bot.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +22,19 @@ class MovieParser:
     """Parser for movie links using Kinopoisk API"""
     
     API_BASE_URL = "https://kinopoiskapiunofficial.tech/api/v2.2/films"
+    # Background refreshes in flight, by Kinopoisk ID
+    _refreshes: Dict[str, asyncio.Task] = {}
+    # API fetches in flight, by (source, ID): concurrent pastes of one link share a request
+    _fetches = SingleFlight()
     
     @staticmethod
-    def parse_url(url: str) -> Optional[Dict]:
-        """Parse movie URL and return movie data"""
+    async def parse_url(url: str, db: Union[Session, AsyncSession, None] = None) -> Optional[Dict]:
+        """Parse movie URL and return movie data.
+
+        With a session (sync or async), a movie already in the database is
+        returned from it (under the "movie" key) without calling the API; a
+        stale one is refreshed in the background.
+        """
         url_lower = url.strip().lower()
         original_url = url.strip()
 
@@ -26,8 +44,13 @@ class MovieParser:
                 logger.warning(f"Could not extract ID from URL: {url}")
                 return None
             
+            if db is not None:
+                movie = await MovieParser._find_stored(db, MovieRepository.find_by_kinopoisk_id, movie_id)
+                if movie:
+                    return MovieParser._from_db(db, movie)
+            
             # Try to parse with API
-            result = MovieParser._parse_kinopoisk(movie_id)
+            result = await MovieParser._parse_kinopoisk(movie_id)
             if result:
                 return result
             
@@ -48,10 +71,84 @@ class MovieParser:
 
         elif "imdb" in url_lower:
             movie_id = MovieParser.extract_id_from_url(original_url, "imdb")
-            return MovieParser._parse_imdb(movie_id)
+            if db is not None and movie_id:
+                movie = await MovieParser._find_stored(db, MovieRepository.find_by_imdb_id, movie_id)
+                if movie:
+                    return MovieParser._from_db(db, movie)
+            return await MovieParser._parse_imdb(movie_id)
 
         return None
 
+    @staticmethod
+    def is_fresh(movie: Movie) -> bool:
+        """Whether the movie was refreshed from the API within MOVIE_CACHE_TTL_HOURS"""
+        if movie.updated_at is None:
+            return False
+        return datetime.utcnow() - movie.updated_at < timedelta(hours=Config.MOVIE_CACHE_TTL_HOURS)
+
+    @staticmethod
+    async def _find_stored(db: Union[Session, AsyncSession], find, movie_id: str) -> Optional[Movie]:
+        """find(db, movie_id) of MovieRepository on a sync or an async session"""
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(find, movie_id)
+        return find(db, movie_id)
+
+    @staticmethod
+    def _from_db(db: Union[Session, AsyncSession], movie: Movie) -> Dict:
+        """Movie data for a stored movie; schedules a refresh when it is stale"""
+        if movie.kinopoisk_id and Config.KINOPOISK_API_KEY and not MovieParser.is_fresh(movie):
+            if isinstance(db, AsyncSession):
+                session_factory = async_sessionmaker(bind=db.bind, autoflush=False, expire_on_commit=False)
+            else:
+                session_factory = sessionmaker(bind=db.get_bind(), autoflush=False)
+            MovieParser.schedule_refresh(movie.kinopoisk_id, session_factory)
+        return {
+            "movie": movie,
+            "title": movie.title,
+            "year": movie.year,
+            "type": movie.type,
+            "kinopoisk_id": movie.kinopoisk_id,
+            "imdb_id": movie.imdb_id,
+        }
+
+    @staticmethod
+    def schedule_refresh(kinopoisk_id: str,
+                         session_factory: Union[sessionmaker, async_sessionmaker]) -> asyncio.Task:
+        """Refresh the stored movie from the API in the background, once per ID at a time"""
+        task = MovieParser._refreshes.get(kinopoisk_id)
+        if task is None or task.done():
+            task = asyncio.create_task(MovieParser.refresh(kinopoisk_id, session_factory))
+            MovieParser._refreshes[kinopoisk_id] = task
+
+            def forget(done: asyncio.Task):
+                if MovieParser._refreshes.get(kinopoisk_id) is done:
+                    del MovieParser._refreshes[kinopoisk_id]
+
+            task.add_done_callback(forget)
+        return task
+
+    @staticmethod
+    async def refresh(kinopoisk_id: str, session_factory: Union[sessionmaker, async_sessionmaker]) -> None:
+        """Fetch the movie from the API and store it if the payload changed"""
+        movie_data = await MovieParser._parse_kinopoisk(kinopoisk_id)
+        if not movie_data:
+            return
+        try:
+            if isinstance(session_factory, async_sessionmaker):
+                async with async_unit_of_work(session_factory) as db:
+                    await db.run_sync(MovieParser._store_refresh, kinopoisk_id, movie_data["api_data"])
+            else:
+                with unit_of_work(session_factory) as db:
+                    MovieParser._store_refresh(db, kinopoisk_id, movie_data["api_data"])
+        except Exception as e:
+            logger.error(f"Error refreshing movie {kinopoisk_id}: {e}", exc_info=True)
+
+    @staticmethod
+    def _store_refresh(db: Session, kinopoisk_id: str, api_data: Dict) -> None:
+        movie = MovieRepository.find_by_kinopoisk_id(db, kinopoisk_id)
+        if movie:
+            MovieRepository.update_from_api(db, movie, api_data)
+
     @staticmethod
     def extract_id_from_url(url: str, source: str) -> Optional[str]:
         """Extract movie ID from URL"""
@@ -64,7 +161,7 @@ class MovieParser:
         return None
     
     @staticmethod
-    def _parse_imdb(imdb_id: str) -> Optional[Dict]:
+    async def _parse_imdb(imdb_id: str) -> Optional[Dict]:
         """Parse IMDb ID by fetching from Kinopoisk API"""
         if not imdb_id:
             return None
@@ -73,9 +170,14 @@ class MovieParser:
             logger.warning("Kinopoisk API key not configured")
             return None
 
+        return await MovieParser._fetches.do(("imdb", imdb_id), lambda: MovieParser._fetch_imdb(imdb_id))
+
+    @staticmethod
+    async def _fetch_imdb(imdb_id: str) -> Optional[Dict]:
+        """The API request behind _parse_imdb"""
         headers = {"X-API-KEY": Config.KINOPOISK_API_KEY}
         url = f"{MovieParser.API_BASE_URL}?imdbId={imdb_id}"
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = await http_client.get(url, headers=headers)
         if resp.status_code != 200:
             logger.warning(f"Failed to fetch IMDb {imdb_id}: {resp.status_code}")
             return None
@@ -89,7 +191,7 @@ class MovieParser:
 
     
     @staticmethod
-    def _parse_kinopoisk(kinopoisk_id: str) -> Optional[Dict]:
+    async def _parse_kinopoisk(kinopoisk_id: str) -> Optional[Dict]:
         """Parse Kinopoisk ID by fetching from API"""
         if not kinopoisk_id:
             logger.warning("No Kinopoisk ID provided")
@@ -99,11 +201,18 @@ class MovieParser:
             logger.error("Kinopoisk API key not configured. Please set KINOPOISK_API_KEY in .env file")
             return None
 
+        return await MovieParser._fetches.do(
+            ("kinopoisk", kinopoisk_id), lambda: MovieParser._fetch_kinopoisk(kinopoisk_id)
+        )
+
+    @staticmethod
+    async def _fetch_kinopoisk(kinopoisk_id: str) -> Optional[Dict]:
+        """The API request behind _parse_kinopoisk"""
         headers = {"X-API-KEY": Config.KINOPOISK_API_KEY}
         url = f"{MovieParser.API_BASE_URL}/{kinopoisk_id}"
 
         try:
-            resp = requests.get(url, headers=headers, timeout=10)
+            resp = await http_client.get(url, headers=headers)
             if resp.status_code != 200:
                 logger.error(f"Failed to fetch Kinopoisk {kinopoisk_id}: HTTP {resp.status_code}")
                 if resp.status_code == 401:
@@ -118,7 +227,7 @@ class MovieParser:
                 return None
                 
             return MovieParser._map_kinopoisk_data(data)
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error while fetching Kinopoisk data: {e}")
             return None
         except Exception as e:
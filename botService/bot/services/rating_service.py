@@ -1,8 +1,11 @@
 """Rating service"""
+import logging
 from sqlalchemy.orm import Session
 from bot.database.repositories import RatingRepository, UserRepository
 from bot.utils.validators import validate_rating
 
+logger = logging.getLogger(__name__)
+
 class RatingService:
     """Service for managing ratings"""
     
@@ -21,14 +24,19 @@ class RatingService:
         if RatingRepository.has_rated(db, room_id, rater_id, rated_id):
             return False
         
-        # Create rating
+        # Create rating; the rated user's aggregates are updated in the same transaction
         RatingRepository.create(db, room_id, rater_id, rated_id, score)
         
-        # Update rated user's rating
-        UserRepository.update_rating(db, rated_id)
-        
         return True
     
+    @staticmethod
+    def reconcile_aggregates(db: Session) -> list:
+        """Verify users' rating aggregates against the ratings table and repair drift"""
+        fixed = UserRepository.reconcile_rating_aggregates(db)
+        if fixed:
+            logger.warning(f"Rating aggregates drifted for {len(fixed)} users, repaired: {fixed[:20]}")
+        return fixed
+    
     @staticmethod
     def get_users_to_rate(db: Session, room_id: int, rater_id: int) -> list:
         """Get list of user IDs that need to be rated"""
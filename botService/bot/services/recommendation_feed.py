@@ -0,0 +1,135 @@
+"""Materialized per-user recommendation feeds
+
+A user's feed is built on their first /recommend (the first RECOMMEND_FEED_SIZE
+slots of MatchingService.recommend, their movie_interest blended with the ALS
+embedding score when the user and movie have embeddings) and then kept
+current by events, each applied in the transaction of the change:
+
+- slot created: scored for every user with a feed
+- join: the slot leaves the joiner's feed, or every feed once it is full
+- leave: the slot returns to the leaver's feed while it is still open
+- votes imported: the user's feed is rebuilt (profile and exclusions changed)
+- embeddings trained: feeds scored with replaced vectors are dropped and
+  rebuilt by the next /recommend (all of them after a full retrain)
+
+Started slots are purged on slot creation and skipped when pages are read,
+so a page is one indexed range read instead of a ranking of all open slots.
+
+/recommend pages through the feed only, so paging stops after at most
+RECOMMEND_FEED_SIZE slots (plus those created since the build); before the
+feed, the listing paged through every open slot.
+"""
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from bot.config import Config
+from bot.constants import JoinStatus, SlotStatus
+from bot.database.models import Slot
+from bot.database.repositories import JoinResult, RecommendationFeedRepository
+from bot.services.matching import MatchingService
+from bot.services.embeddings import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+class RecommendationFeedService:
+    """Service for building, reading and updating recommendation feeds"""
+    
+    @staticmethod
+    def build(db: Session, user_id: int) -> int:
+        """(Re)build a user's feed from the current open slots; return its size"""
+        scored, _ = MatchingService.recommend(db, user_id, Config.RECOMMEND_FEED_SIZE)
+        user_vector = EmbeddingService.user_vectors(db, [user_id]).get(user_id)
+        movie_vectors = {}
+        if user_vector is not None:
+            movie_vectors = EmbeddingService.movie_vectors(db, [slot.movie.kinopoisk_id for slot, _ in scored])
+        items = [
+            (slot.id, EmbeddingService.blend(interest, user_vector, movie_vectors.get(slot.movie.kinopoisk_id)))
+            for slot, interest in scored
+        ]
+        RecommendationFeedRepository.replace(db, user_id, items)
+        return len(items)
+    
+    @staticmethod
+    def ensure(db: Session, user_id: int) -> None:
+        """Build the user's feed if there is none yet"""
+        if not RecommendationFeedRepository.exists(db, user_id):
+            RecommendationFeedService.build(db, user_id)
+    
+    @staticmethod
+    def page(db: Session, user_id: int, limit: int, after: Optional[Tuple[float, int]] = None
+             ) -> Tuple[List[Tuple[Slot, float]], Optional[Tuple[float, int]]]:
+        """One page of the stored feed and the cursor of the next page (None at the end)"""
+        rows = RecommendationFeedRepository.get_page(db, user_id, limit + 1, after)
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last_slot, last_score = page[-1]
+            next_cursor = (last_score, last_slot.id)
+        return page, next_cursor
+    
+    @staticmethod
+    def on_slot_created(db: Session, slot: Slot) -> None:
+        """Score a new slot for every user with a feed"""
+        RecommendationFeedRepository.purge_closed(db)
+        subscribers = RecommendationFeedRepository.get_subscribers(db, slot)
+        scores = RecommendationFeedService._score_slot(db, slot, subscribers)
+        RecommendationFeedRepository.add_items(db, slot.id, scores)
+    
+    @staticmethod
+    def _score_slot(db: Session, slot: Slot, subscribers) -> Dict[int, float]:
+        """Feed score of one slot for each (user_id, profile) subscriber"""
+        movie_vector = None
+        user_vectors = {}
+        if subscribers:
+            movie_vector = EmbeddingService.movie_vectors(db, [slot.movie.kinopoisk_id]).get(slot.movie.kinopoisk_id)
+        if movie_vector is not None:
+            user_vectors = EmbeddingService.user_vectors(db, [user_id for user_id, _ in subscribers])
+        return {
+            user_id: EmbeddingService.blend(
+                MatchingService.movie_interest(MatchingService.preference_stats(profile), slot.movie),
+                user_vectors.get(user_id), movie_vector,
+            )
+            for user_id, profile in subscribers
+        }
+    
+    @staticmethod
+    def on_joined(db: Session, result: JoinResult, user_id: int) -> None:
+        if result.status != JoinStatus.JOINED:
+            return
+        if result.slot.status != SlotStatus.OPEN:
+            RecommendationFeedRepository.remove_slot(db, result.slot.id)
+        else:
+            RecommendationFeedRepository.remove_item(db, user_id, result.slot.id)
+    
+    @staticmethod
+    def on_left(db: Session, slot: Slot, user_id: int) -> None:
+        if slot.status != SlotStatus.OPEN or slot.datetime <= datetime.now():
+            return
+        subscribers = RecommendationFeedRepository.get_subscribers(db, slot, user_id)
+        if subscribers:
+            scores = RecommendationFeedService._score_slot(db, slot, subscribers)
+            RecommendationFeedRepository.add_items(db, slot.id, scores)
+    
+    @staticmethod
+    def on_votes_imported(db: Session, user_id: int) -> None:
+        if RecommendationFeedRepository.exists(db, user_id):
+            RecommendationFeedService.build(db, user_id)
+    
+    @staticmethod
+    def on_embeddings_trained(db: Session, user_ids: List[int], kinopoisk_ids: List[str],
+                              full: bool = False) -> int:
+        """Drop the feeds of users with a new vector and the feeds holding a slot of
+        a movie with a new vector; return how many were dropped.
+
+        ensure() rebuilds a dropped feed on the user's next /recommend, so
+        training does not rescore every feed in its own transaction.
+        """
+        if full:
+            return RecommendationFeedRepository.delete(db)
+        return RecommendationFeedRepository.delete(
+            db, RecommendationFeedRepository.get_user_ids(db, user_ids, kinopoisk_ids)
+        )
@@ -11,7 +11,7 @@ class RoomManager:
     @staticmethod
     def should_create_room(slot: Slot) -> bool:
         """Check if room should be created for slot"""
-        participants_count = len(slot.participants)
+        participants_count = slot.participant_count
         # Room should be created when we have enough participants and slot is not yet processed
         return participants_count >= slot.min_participants and slot.status in ["open", "full"]
     
@@ -75,7 +75,7 @@ class RoomManager:
 
 🎬 **Фильм:** {slot.movie.title}
 📅 **Время:** {slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-👥 **Участники:** {len(slot.participants)}
+👥 **Участники:** {slot.participant_count}
 
 👥 **Все участники:**
 {chr(10).join(participants_info)}
@@ -104,7 +104,7 @@ class RoomManager:
 
 🎬 **Фильм:** {slot.movie.title}
 📅 **Время:** {slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-👥 **Участники:** {len(slot.participants)}
+👥 **Участники:** {slot.participant_count}
 
 👥 **Участники слота:**
 {chr(10).join(participants_info)}
@@ -171,7 +171,7 @@ class RoomManager:
 
 🎬 **Фильм:** {slot.movie.title}
 📅 **Время:** {slot.datetime.strftime('%d.%m.%Y в %H:%M')}
-👥 **Участники:** {len(slot.participants)}
+👥 **Участники:** {slot.participant_count}
 
 👥 **Контакты участников:**
 {chr(10).join(participants_info)}
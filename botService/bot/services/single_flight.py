@@ -0,0 +1,39 @@
+"""Coalescing of concurrent identical async calls
+
+When many updates ask for the same thing at once (a new release pasted in a
+big chat), only the first caller runs the call; the others await its result.
+The key is forgotten as soon as the call finishes, so this is not a cache:
+a later caller starts a new call.
+
+    movie = await fetches.do(("kinopoisk", kinopoisk_id), lambda: fetch(kinopoisk_id))
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """At most one in-flight call per key; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of call(), or of the call already running for key.
+
+        Exceptions reach every caller. A cancelled caller does not cancel the
+        shared call, which the others are still waiting for.
+        """
+        future = self._calls.get(key)
+        if future is None or future.get_loop() is not asyncio.get_running_loop():
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+
+            def forget(done: asyncio.Future):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            future.add_done_callback(forget)
+        return await asyncio.shield(future)
@@ -0,0 +1,68 @@
+"""Precomputed taste neighbours: each user's most similar users by KP votes
+
+Similarity is the vote part of MatchingService.compute_user_similarity
+(1 - normalized MAE over co-rated movies). Instead of comparing all pairs,
+an inverted index kinopoisk_id -> raters is built once; a user is compared
+only with users who rated at least one of the same movies, and only users
+with TASTE_MIN_COMMON co-rated movies qualify. The TASTE_NEIGHBOURS best per
+user are stored in taste_neighbours by compute_taste_neighbours.py (cron).
+"""
+import heapq
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from bot.config import Config
+from bot.database.repositories import TasteNeighbourRepository, UserVoteRepository
+
+logger = logging.getLogger(__name__)
+
+# (neighbour_id, score, common_count)
+Neighbour = Tuple[int, float, int]
+
+
+class RatingIndex:
+    """All KP votes, by user and inverted by movie"""
+
+    def __init__(self, votes: Iterable[Tuple[int, str, int]]):
+        self.by_user: Dict[int, Dict[str, int]] = defaultdict(dict)
+        self.by_movie: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for user_id, kinopoisk_id, rating in votes:
+            self.by_user[user_id][kinopoisk_id] = rating
+            self.by_movie[kinopoisk_id].append((user_id, rating))
+
+    def neighbours(self, user_id: int, top_n: int, min_common: int) -> List[Neighbour]:
+        """The top_n users most similar to user_id, best first"""
+        counts: Dict[int, int] = defaultdict(int)
+        diffs: Dict[int, int] = defaultdict(int)
+        for kinopoisk_id, rating in self.by_user.get(user_id, {}).items():
+            for other_id, other_rating in self.by_movie[kinopoisk_id]:
+                counts[other_id] += 1
+                diffs[other_id] += abs(rating - other_rating)
+        counts.pop(user_id, None)
+        candidates = (
+            # Same expression as compute_user_similarity, so scores match it exactly
+            (max(0.0, 1.0 - (diffs[other_id] / (common * 9.0))), common, other_id)
+            for other_id, common in counts.items() if common >= min_common
+        )
+        best = heapq.nlargest(top_n, candidates)
+        return [(other_id, score, common) for score, common, other_id in best]
+
+
+class TasteNeighbourService:
+    """Service for computing and storing taste neighbours"""
+
+    @staticmethod
+    def compute(db: Session, user_ids: Optional[List[int]] = None,
+                top_n: Optional[int] = None, min_common: Optional[int] = None) -> int:
+        """Recompute neighbours of user_ids (None: every user with votes); return rows stored"""
+        top_n = top_n or Config.TASTE_NEIGHBOURS
+        min_common = min_common or Config.TASTE_MIN_COMMON
+        index = RatingIndex(UserVoteRepository.iter_all_ratings(db))
+        targets = list(index.by_user) if user_ids is None else user_ids
+        neighbours = {user_id: index.neighbours(user_id, top_n, min_common) for user_id in targets}
+        stored = TasteNeighbourRepository.replace(db, neighbours, user_ids)
+        logger.info(f"Stored {stored} taste neighbours of {len(targets)} users")
+        return stored
@@ -1,10 +1,11 @@
 import logging
-import requests
+import httpx
 from typing import Optional
 from bot.config import Config
 from sqlalchemy.orm import Session
 from bot.database.models import Slot, Movie
 from bot.database.repositories import MovieRepository
+from bot.services import http_client
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +14,7 @@ class WatchTogetherService:
     API_BASE_URL = "https://api.w2g.tv/rooms/create.json"
 
     @staticmethod
-    def create_wt_room(db: Session, slot: Slot) -> Optional[str]:
+    async def create_wt_room(db: Session, slot: Slot) -> Optional[str]:
         # Check if API key is configured
         if not Config.WATCH_TOGETHER_API_KEY:
             logger.warning(f"Watch Together API key not configured, skipping room creation for slot {slot.id}")
@@ -35,9 +36,9 @@ class WatchTogetherService:
         }
 
         try:
-            response = requests.post(WatchTogetherService.API_BASE_URL, json=payload, timeout=10)
+            response = await http_client.post(WatchTogetherService.API_BASE_URL, json=payload)
             response.raise_for_status()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Network error creating W2G room for slot {slot.id}: {e}")
             return None
 
@@ -1,6 +1,7 @@
 """Message formatting utilities"""
 from datetime import datetime
 from bot.database.models import Movie, Slot, User, Room
+from bot.utils.genres import split_genres
 
 def format_movie_info(movie: Movie) -> str:
     """Format movie information for display"""
@@ -39,14 +40,9 @@ def format_movie_info(movie: Movie) -> str:
         text += "\n" + " | ".join(metadata_parts)
     
     # Genres and countries
-    if movie.genres:
-        import json
-        try:
-            genres_list = json.loads(movie.genres)
-            if genres_list:
-                text += f"\n🎭 {', '.join(genres_list[:3])}"  # Показываем первые 3 жанра
-        except:
-            pass
+    genres_list = split_genres(movie.genres)
+    if genres_list:
+        text += f"\n🎭 {', '.join(genres_list[:3])}"  # Показываем первые 3 жанра
     
     if movie.slogan:
         text += f"\n💬 <i>{movie.slogan}</i>"
@@ -62,7 +58,7 @@ def format_movie_info(movie: Movie) -> str:
 def format_slot_info(slot: Slot) -> str:
     """Format slot information for display"""
     datetime_str = slot.datetime.strftime("%d.%m.%Y в %H:%M")
-    participants_count = len(slot.participants)
+    participants_count = slot.participant_count
     text = f"📅 <b>{slot.movie.title}</b>\n"
     text += f"Время: {datetime_str}\n"
     text += f"Участников: {participants_count}/{slot.min_participants}"
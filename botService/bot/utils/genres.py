@@ -0,0 +1,49 @@
+"""Genre list parsing and genre bitmasks
+
+Genres are catalogued in the ``genres`` table. Genre ``id`` n owns bit n - 1
+of the 64-bit ``genre_mask`` columns (movies, preference profiles), so
+overlap checks are a bitwise AND. Kinopoisk has about 30 genres; ids past
+GENRE_MASK_BITS get no bit and are ignored by mask-based scoring.
+"""
+import json
+from typing import Dict, Iterable, List, Optional
+
+# Signed BIGINT: bit 63 is left unused
+GENRE_MASK_BITS = 63
+
+
+def split_genres(value: Optional[str]) -> List[str]:
+    """Genres stored either as a JSON list (Movie from the API) or comma-separated"""
+    if not value:
+        return []
+    if value.lstrip().startswith("["):
+        try:
+            return [g.strip() for g in json.loads(value) if g and g.strip()]
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return [g.strip() for g in value.split(",") if g.strip()]
+
+
+def join_genres(names: Iterable[str]) -> Optional[str]:
+    """The stored text form: comma-separated, duplicates dropped; None if empty"""
+    names = list(dict.fromkeys(n.strip() for n in names if n and n.strip()))
+    return ", ".join(names) if names else None
+
+
+def genre_bit(genre_id: int) -> int:
+    """Mask bit of a genre id (0 if the id has no bit)"""
+    if 1 <= genre_id <= GENRE_MASK_BITS:
+        return 1 << (genre_id - 1)
+    return 0
+
+
+def genres_mask(genre_ids: Iterable[int]) -> int:
+    mask = 0
+    for genre_id in genre_ids:
+        mask |= genre_bit(genre_id)
+    return mask
+
+
+def top_genres(genre_counts: Dict[str, int], limit: int) -> List[str]:
+    """The ``limit`` most frequent genre names (ties by name)"""
+    return sorted(genre_counts, key=lambda name: (-genre_counts[name], name))[:limit]
@@ -30,7 +30,7 @@ def get_slots_list_keyboard(slots):
         slot_datetime = slot.datetime.strftime("%d.%m.%Y %H:%M")
         buttons.append([
             InlineKeyboardButton(
-                f"{slot_datetime} ({len(slot.participants)}/{slot.min_participants})",
+                f"{slot_datetime} ({slot.participant_count}/{slot.min_participants})",
                 callback_data=f"join_slot:{slot.id}"
             )
         ])
@@ -44,7 +44,7 @@ def get_user_slots_keyboard(slots):
     buttons = []
     for slot in slots:
         slot_datetime = slot.datetime.strftime("%d.%m.%Y %H:%M")
-        participants_count = len(slot.participants)
+        participants_count = slot.participant_count
         buttons.append([
             InlineKeyboardButton(
                 f"{slot.movie.title} - {slot_datetime} ({participants_count}/{slot.min_participants})",
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""Recompute every user's taste neighbours (most similar users by KP votes)
+
+Run periodically (e.g. from cron, hourly or nightly). Handlers read the
+stored neighbours; users without them fall back to on-demand similarity.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database.session import unit_of_work
+from bot.services.taste_neighbours import TasteNeighbourService
+
+def compute_taste_neighbours():
+    """Rebuild the taste_neighbours table"""
+    print("🔍 Computing taste neighbours...")
+    with unit_of_work() as db:
+        stored = TasteNeighbourService.compute(db)
+    print(f"✅ Stored {stored} neighbour pairs")
+    return stored
+
+if __name__ == "__main__":
+    compute_taste_neighbours()
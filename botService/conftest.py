@@ -0,0 +1,165 @@
+"""Shared fixtures of the botService tests
+
+Every test database is a SQLite file under pytest's tmp_path. The bot's own
+engine (bot.database.session) is pointed at a migrated copy of cowatch.db
+for the whole run, so tests never write to the working copy.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+# Must be set before bot.config is imported
+_run_dir = Path(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{_run_dir / 'cowatch.db'}"
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot.database.session import Base, unit_of_work, async_unit_of_work, to_async_url
+from bot.database.instrumentation import instrument_engine
+import bot.database.routing as routing
+
+
+def upgrade(url: str, revision: str = "head") -> str:
+    """Run the migrations of alembic.ini on url up to revision"""
+    cfg = AlembicConfig(str(project_root / "alembic.ini"))
+    cfg.cmd_opts = argparse.Namespace(x=[f"db_url={url}"])
+    command.upgrade(cfg, revision)
+    return url
+
+
+@pytest.fixture(scope="session", autouse=True)
+def bot_database():
+    """Migrated copy of cowatch.db behind bot.database.session.SessionLocal"""
+    if (project_root / "cowatch.db").exists():
+        shutil.copy(project_root / "cowatch.db", _run_dir / "cowatch.db")
+    upgrade(os.environ["DATABASE_URL"])
+    yield
+    shutil.rmtree(_run_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """make_db(name, instrument=False, **connect_args): session factory of a new
+    SQLite file under tmp_path with every table created"""
+    engines = []
+
+    def make(name: str = "test.db", instrument: bool = False, **connect_args) -> sessionmaker:
+        engine = create_engine(f"sqlite:///{tmp_path / name}", connect_args=connect_args)
+        if instrument:
+            instrument_engine(engine)
+        Base.metadata.create_all(engine)
+        engines.append(engine)
+        return sessionmaker(bind=engine, autoflush=False)
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def migrated_db(tmp_path):
+    """migrated_db(revision, name): URL of a SQLite file under tmp_path migrated to revision"""
+    def make(revision: str, name: str = "migrated.db") -> str:
+        return upgrade(f"sqlite:///{tmp_path / name}", revision)
+    return make
+
+
+@pytest.fixture
+def use_db(monkeypatch):
+    """use_db(factory, *modules): handlers of modules and the read router use
+    factory, and an instrumented async factory on the same database"""
+    def use(factory: sessionmaker, *modules) -> None:
+        engine = factory.kw["bind"]
+        async_engine = create_async_engine(to_async_url(engine.url.render_as_string(hide_password=False)))
+        instrument_engine(async_engine.sync_engine)
+        async_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+        monkeypatch.setattr(routing, "read_router", routing.ReadRouter(factory, async_primary=async_factory))
+        for module in modules:
+            if hasattr(module, "unit_of_work"):
+                monkeypatch.setattr(module, "unit_of_work", partial(unit_of_work, factory))
+            if hasattr(module, "async_unit_of_work"):
+                monkeypatch.setattr(module, "async_unit_of_work", partial(async_unit_of_work, async_factory))
+            if hasattr(module, "SessionLocal"):
+                monkeypatch.setattr(module, "SessionLocal", factory)
+    return use
+
+
+@pytest.fixture
+def behind_utc():
+    """Local clock five hours behind UTC, so naive local and UTC times differ"""
+    old = os.environ.get("TZ")
+    os.environ["TZ"] = "EST+5"
+    time.tzset()
+    yield
+    if old is None:
+        os.environ.pop("TZ", None)
+    else:
+        os.environ["TZ"] = old
+    time.tzset()
+
+
+class FakeMessage:
+    """Telegram message recording the texts and keyboards it was answered with"""
+
+    def __init__(self, text: str = "", delay: float = 0.0):
+        self.text = text
+        self.delay = delay
+        self.replies = []
+        self.markups = []
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        self.replies.append(text)
+        self.markups.append(reply_markup)
+
+
+class FakeQuery:
+    """Callback query recording the texts and keyboards its message was edited to"""
+
+    def __init__(self, data: str, user):
+        self.data = data
+        self.from_user = user
+        self.edits = []
+        self.markups = []
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append(text)
+        self.markups.append(reply_markup)
+
+
+def _fake_update(user_id: int = 1, text: str = "", update_id: int = None, callback_data: str = None,
+                 delay: float = 0.0) -> SimpleNamespace:
+    user = SimpleNamespace(id=user_id, first_name=f"User {user_id}", username=f"user{user_id}")
+    return SimpleNamespace(
+        update_id=user_id if update_id is None else update_id,
+        effective_user=user,
+        message=FakeMessage(text, delay),
+        callback_query=FakeQuery(callback_data, user) if callback_data is not None else None,
+    )
+
+
+@pytest.fixture
+def fake_update():
+    """fake_update(user_id, text, update_id, callback_data, delay): a Telegram update
+    whose message (and callback query, given callback_data) records the answers;
+    delay is how long each reply takes"""
+    return _fake_update
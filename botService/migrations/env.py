@@ -12,8 +12,9 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
+# Keep loggers created before migrations (init_database runs inside the bot).
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # Add project path to import modules
 # migrations/env.py located in botService/migrations/
@@ -0,0 +1,53 @@
+"""add secondary indexes for hot lookup paths
+
+Revision ID: 20261016_000005
+Revises: 20251113_000004
+Create Date: 2026-10-16 10:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000005"
+down_revision = "20251113_000004"
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns) - composite indexes put the equality column first
+INDEXES = [
+    # slots: open-slot listings, per-movie listings, /my_slots
+    ("ix_slots_status_datetime", "slots", ["status", "datetime"]),
+    ("ix_slots_movie_status", "slots", ["movie_id", "status"]),
+    ("ix_slots_creator_id", "slots", ["creator_id"]),
+    # slot_participants: participations of a user (slot_id, user_id is already unique)
+    ("ix_slot_participants_user_slot", "slot_participants", ["user_id", "slot_id"]),
+    # movies: lookups by external ids
+    ("ix_movies_kinopoisk_id", "movies", ["kinopoisk_id"]),
+    ("ix_movies_imdb_id", "movies", ["imdb_id"]),
+    # user_votes: covering index for vote maps, reverse lookup by movie
+    ("ix_user_votes_user_kp_rating", "user_votes", ["user_id", "kinopoisk_id", "user_rating"]),
+    ("ix_user_votes_kinopoisk_id", "user_votes", ["kinopoisk_id"]),
+    # rooms
+    ("ix_rooms_status", "rooms", ["status"]),
+    ("ix_rooms_telegram_group_id", "rooms", ["telegram_group_id"]),
+    # ratings: covering index for rating aggregates, ratings given by a user
+    ("ix_ratings_rated_score", "ratings", ["rated_id", "score"]),
+    ("ix_ratings_rater_id", "ratings", ["rater_id"]),
+    # watch_history: recent history of a user
+    ("ix_watch_history_user_watched_at", "watch_history", ["user_id", "watched_at"]),
+    # comments: per-episode threads and replies
+    ("ix_comments_episode_created_at", "comments", ["episode_id", "created_at"]),
+    ("ix_comments_reply_to_created_at", "comments", ["reply_to_id", "created_at"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, _columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,33 @@
+"""add denormalized participant_count to slots
+
+Revision ID: 20261016_000006
+Revises: 20261016_000005
+Create Date: 2026-10-16 11:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000006"
+down_revision = "20261016_000005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "slots",
+        sa.Column("participant_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # Backfill from existing participant rows
+    op.execute(
+        "UPDATE slots SET participant_count = ("
+        "SELECT COUNT(*) FROM slot_participants WHERE slot_participants.slot_id = slots.id"
+        ")"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("slots") as batch_op:
+        batch_op.drop_column("participant_count")
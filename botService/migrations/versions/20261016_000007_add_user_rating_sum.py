@@ -0,0 +1,36 @@
+"""add running rating_sum to users
+
+Revision ID: 20261016_000007
+Revises: 20261016_000006
+Create Date: 2026-10-16 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000007"
+down_revision = "20261016_000006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("rating_sum", sa.Integer(), nullable=False, server_default="0"),
+    )
+    # Backfill sum and count from existing ratings
+    op.execute(
+        "UPDATE users SET "
+        "rating_sum = COALESCE((SELECT SUM(score) FROM ratings WHERE ratings.rated_id = users.id), 0), "
+        "total_ratings = (SELECT COUNT(*) FROM ratings WHERE ratings.rated_id = users.id)"
+    )
+    op.execute(
+        "UPDATE users SET rating = CAST(rating_sum AS FLOAT) / total_ratings WHERE total_ratings > 0"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("rating_sum")
@@ -0,0 +1,68 @@
+"""add user_preference_profiles
+
+Revision ID: 20261016_000008
+Revises: 20261016_000007
+Create Date: 2026-10-16 13:00:00
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000008"
+down_revision = "20261016_000007"
+branch_labels = None
+depends_on = None
+
+
+def _split_genres(value):
+    if not value:
+        return []
+    if value.lstrip().startswith("["):
+        try:
+            return [g.strip() for g in json.loads(value) if g and g.strip()]
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return [g.strip() for g in value.split(",") if g.strip()]
+
+
+def upgrade() -> None:
+    profiles = op.create_table(
+        "user_preference_profiles",
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("vote_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("year_sum", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("year_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("type_counts", sa.Text(), nullable=False, server_default="{}"),
+        sa.Column("genre_counts", sa.Text(), nullable=False, server_default="{}"),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+    )
+    
+    # Backfill from existing votes (JSON histograms are built in Python)
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT user_id, year, type, genres FROM user_votes ORDER BY user_id"))
+    aggregates = {}
+    for user_id, year, vote_type, genres in rows:
+        profile = aggregates.setdefault(user_id, {
+            "user_id": user_id, "vote_count": 0, "year_sum": 0, "year_count": 0,
+            "type_counts": {}, "genre_counts": {},
+        })
+        profile["vote_count"] += 1
+        if year is not None:
+            profile["year_sum"] += year
+            profile["year_count"] += 1
+        if vote_type:
+            profile["type_counts"][vote_type] = profile["type_counts"].get(vote_type, 0) + 1
+        for genre in _split_genres(genres):
+            profile["genre_counts"][genre] = profile["genre_counts"].get(genre, 0) + 1
+    if aggregates:
+        for profile in aggregates.values():
+            profile["type_counts"] = json.dumps(profile["type_counts"], ensure_ascii=False, sort_keys=True)
+            profile["genre_counts"] = json.dumps(profile["genre_counts"], ensure_ascii=False, sort_keys=True)
+        op.bulk_insert(profiles, list(aggregates.values()))
+
+
+def downgrade() -> None:
+    op.drop_table("user_preference_profiles")
@@ -0,0 +1,39 @@
+"""add materialized recommendation feed
+
+Revision ID: 20261016_000009
+Revises: 20261016_000008
+Create Date: 2026-10-16 14:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000009"
+down_revision = "20261016_000008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Feeds are built on a user's first /recommend, so nothing to backfill
+    op.create_table(
+        "recommendation_feeds",
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("built_at", sa.DateTime(), nullable=True),
+    )
+    op.create_table(
+        "recommendation_feed_items",
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("slot_id", sa.Integer(), sa.ForeignKey("slots.id"), primary_key=True),
+        sa.Column("score", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_feed_items_user_score", "recommendation_feed_items", ["user_id", "score", "slot_id"])
+    op.create_index("ix_feed_items_slot_id", "recommendation_feed_items", ["slot_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_feed_items_slot_id", table_name="recommendation_feed_items")
+    op.drop_index("ix_feed_items_user_score", table_name="recommendation_feed_items")
+    op.drop_table("recommendation_feed_items")
+    op.drop_table("recommendation_feeds")
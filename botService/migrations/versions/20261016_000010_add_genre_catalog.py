@@ -0,0 +1,140 @@
+"""add genre catalog, movie_genres and genre masks
+
+Revision ID: 20261016_000010
+Revises: 20261016_000009
+Create Date: 2026-10-16 15:00:00
+"""
+import json
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000010"
+down_revision = "20261016_000009"
+branch_labels = None
+depends_on = None
+
+# Same bit layout as bot.utils.genres: genre id n owns bit n - 1
+GENRE_MASK_BITS = 63
+TOP_GENRES = int(os.getenv("PROFILE_TOP_GENRES", "5"))
+
+
+def _split_genres(value):
+    if not value:
+        return []
+    if value.lstrip().startswith("["):
+        try:
+            return list(dict.fromkeys(g.strip() for g in json.loads(value) if g and g.strip()))
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return list(dict.fromkeys(g.strip() for g in value.split(",") if g.strip()))
+
+
+def _mask(genre_ids):
+    mask = 0
+    for genre_id in genre_ids:
+        if genre_id <= GENRE_MASK_BITS:
+            mask |= 1 << (genre_id - 1)
+    return mask
+
+
+def upgrade() -> None:
+    genres = op.create_table(
+        "genres",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+    )
+    movie_genres = op.create_table(
+        "movie_genres",
+        sa.Column("movie_id", sa.Integer(), sa.ForeignKey("movies.id"), primary_key=True),
+        sa.Column("genre_id", sa.Integer(), sa.ForeignKey("genres.id"), primary_key=True),
+    )
+    op.create_index("ix_movie_genres_genre_id", "movie_genres", ["genre_id"])
+    op.add_column("movies", sa.Column("genre_mask", sa.BigInteger(), nullable=False, server_default="0"))
+    op.add_column(
+        "user_preference_profiles",
+        sa.Column("genre_mask", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "user_preference_profiles",
+        sa.Column("top_genre_counts", sa.Text(), nullable=False, server_default="{}"),
+    )
+
+    # Convert existing rows: JSON genre lists become comma-separated text,
+    # every name gets a catalog id (ids in name order), masks are filled in
+    conn = op.get_bind()
+    movie_rows = [(movie_id, _split_genres(value)) for movie_id, value in conn.execute(
+        sa.text("SELECT id, genres FROM movies WHERE genres IS NOT NULL")
+    )]
+    vote_rows = [(vote_id, value, _split_genres(value)) for vote_id, value in conn.execute(
+        sa.text("SELECT id, genres FROM user_votes WHERE genres IS NOT NULL")
+    )]
+    profile_rows = [(user_id, json.loads(counts or "{}")) for user_id, counts in conn.execute(
+        sa.text("SELECT user_id, genre_counts FROM user_preference_profiles")
+    )]
+    names = set()
+    for _, movie_genres_list in movie_rows:
+        names.update(movie_genres_list)
+    for _, _, vote_genres in vote_rows:
+        names.update(vote_genres)
+    for _, counts in profile_rows:
+        names.update(counts)
+    if not names:
+        return
+    genre_ids = {name: i for i, name in enumerate(sorted(names), 1)}
+    op.bulk_insert(genres, [{"id": genre_id, "name": name} for name, genre_id in genre_ids.items()])
+    if conn.dialect.name == "postgresql":
+        conn.execute(sa.text("SELECT setval('genres_id_seq', (SELECT MAX(id) FROM genres))"))
+
+    links = [
+        {"movie_id": movie_id, "genre_id": genre_ids[name]}
+        for movie_id, movie_genres_list in movie_rows for name in movie_genres_list
+    ]
+    if links:
+        op.bulk_insert(movie_genres, links)
+    if movie_rows:
+        conn.execute(
+            sa.text("UPDATE movies SET genres = :genres, genre_mask = :mask WHERE id = :id"),
+            [
+                {
+                    "id": movie_id,
+                    "genres": ", ".join(movie_genres_list) or None,
+                    "mask": _mask(genre_ids[name] for name in movie_genres_list),
+                }
+                for movie_id, movie_genres_list in movie_rows
+            ],
+        )
+    changed_votes = [
+        {"id": vote_id, "genres": ", ".join(vote_genres) or None}
+        for vote_id, value, vote_genres in vote_rows if (", ".join(vote_genres) or None) != value
+    ]
+    if changed_votes:
+        conn.execute(sa.text("UPDATE user_votes SET genres = :genres WHERE id = :id"), changed_votes)
+    profile_updates = []
+    for user_id, counts in profile_rows:
+        top = sorted(counts, key=lambda name: (-counts[name], name))[:TOP_GENRES]
+        profile_updates.append({
+            "user_id": user_id,
+            "mask": _mask(genre_ids[name] for name in top),
+            "top": json.dumps({str(genre_ids[name]): counts[name] for name in top}, sort_keys=True),
+        })
+    if profile_updates:
+        conn.execute(
+            sa.text("UPDATE user_preference_profiles SET genre_mask = :mask, top_genre_counts = :top "
+                    "WHERE user_id = :user_id"),
+            profile_updates,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("user_preference_profiles") as batch_op:
+        batch_op.drop_column("top_genre_counts")
+        batch_op.drop_column("genre_mask")
+    with op.batch_alter_table("movies") as batch_op:
+        batch_op.drop_column("genre_mask")
+    op.drop_index("ix_movie_genres_genre_id", table_name="movie_genres")
+    op.drop_table("movie_genres")
+    op.drop_table("genres")
@@ -0,0 +1,35 @@
+"""add taste_neighbours
+
+Revision ID: 20261016_000011
+Revises: 20261016_000010
+Create Date: 2026-10-16 16:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000011"
+down_revision = "20261016_000010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled by compute_taste_neighbours.py, nothing to backfill here
+    op.create_table(
+        "taste_neighbours",
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("neighbour_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("common_count", sa.Integer(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_taste_neighbours_user_score", "taste_neighbours", ["user_id", "score"])
+    op.create_index("ix_taste_neighbours_neighbour_id", "taste_neighbours", ["neighbour_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_taste_neighbours_neighbour_id", table_name="taste_neighbours")
+    op.drop_index("ix_taste_neighbours_user_score", table_name="taste_neighbours")
+    op.drop_table("taste_neighbours")
@@ -0,0 +1,36 @@
+"""add user_embeddings and movie_embeddings
+
+Revision ID: 20261016_000012
+Revises: 20261016_000011
+Create Date: 2026-10-16 17:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000012"
+down_revision = "20261016_000011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Filled by train_embeddings.py, nothing to backfill here
+    op.create_table(
+        "user_embeddings",
+        sa.Column("user_id", sa.BigInteger(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.Column("trained_at", sa.DateTime(), nullable=False),
+    )
+    op.create_table(
+        "movie_embeddings",
+        sa.Column("kinopoisk_id", sa.String(), primary_key=True),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.Column("trained_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("movie_embeddings")
+    op.drop_table("user_embeddings")
@@ -0,0 +1,26 @@
+"""add movies.api_hash
+
+Revision ID: 20261016_000013
+Revises: 20261016_000012
+Create Date: 2026-10-16 18:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000013"
+down_revision = "20261016_000012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing movies have no hash: their first refresh rewrites them once
+    with op.batch_alter_table("movies") as batch_op:
+        batch_op.add_column(sa.Column("api_hash", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("movies") as batch_op:
+        batch_op.drop_column("api_hash")
@@ -0,0 +1,51 @@
+"""make movies.kinopoisk_id unique
+
+Revision ID: 20261016_000014
+Revises: 20261016_000013
+Create Date: 2026-10-16 19:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "20261016_000014"
+down_revision = "20261016_000013"
+branch_labels = None
+depends_on = None
+
+# (table, column) pointing at movies.id
+MOVIE_REFERENCES = [("slots", "movie_id"), ("episodes", "series_id"), ("watch_history", "movie_id")]
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    conn.execute(sa.text("UPDATE movies SET kinopoisk_id = NULL WHERE kinopoisk_id = ''"))
+
+    # Merge duplicates into the oldest movie of each Kinopoisk ID
+    duplicated = conn.execute(sa.text(
+        "SELECT kinopoisk_id, MIN(id) FROM movies WHERE kinopoisk_id IS NOT NULL "
+        "GROUP BY kinopoisk_id HAVING COUNT(*) > 1"
+    )).all()
+    for kinopoisk_id, keep_id in duplicated:
+        duplicate_ids = [movie_id for (movie_id,) in conn.execute(
+            sa.text("SELECT id FROM movies WHERE kinopoisk_id = :kp AND id != :keep"),
+            {"kp": kinopoisk_id, "keep": keep_id},
+        )]
+        params = {"keep": keep_id, "ids": duplicate_ids}
+        for table, column in MOVIE_REFERENCES:
+            conn.execute(
+                sa.text(f"UPDATE {table} SET {column} = :keep WHERE {column} IN :ids")
+                .bindparams(sa.bindparam("ids", expanding=True)),
+                params,
+            )
+        for statement in ("DELETE FROM movie_genres WHERE movie_id IN :ids", "DELETE FROM movies WHERE id IN :ids"):
+            conn.execute(sa.text(statement).bindparams(sa.bindparam("ids", expanding=True)), params)
+
+    op.drop_index("ix_movies_kinopoisk_id", table_name="movies")
+    op.create_index("ix_movies_kinopoisk_id", "movies", ["kinopoisk_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_movies_kinopoisk_id", table_name="movies")
+    op.create_index("ix_movies_kinopoisk_id", "movies", ["kinopoisk_id"])
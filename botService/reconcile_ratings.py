@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Verify users' running rating aggregates against the ratings table
+
+Run periodically (e.g. from cron). Users whose rating_sum / total_ratings
+drifted are repaired and reported.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database.session import unit_of_work
+from bot.services.rating_service import RatingService
+
+def reconcile_ratings():
+    """Repair drifted rating aggregates"""
+    print("🔍 Reconciling user rating aggregates...")
+    with unit_of_work() as db:
+        fixed = RatingService.reconcile_aggregates(db)
+    if fixed:
+        print(f"⚠️  Repaired {len(fixed)} users: {fixed}")
+    else:
+        print("✅ All rating aggregates are consistent")
+    return fixed
+
+if __name__ == "__main__":
+    reconcile_ratings()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test that batched similarity scoring matches the pairwise formula exactly"""
+import sys
+import random
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.user_cache import user_cache
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    UserVoteRepository, LoadProfile,
+)
+from bot.services.matching import MatchingService
+
+USERS = 40
+MISSING_USER = 999
+
+
+def make_database(make_db, seed: int = 7):
+    """Users with random overlapping votes and ratings; user USERS has no votes"""
+    rng = random.Random(seed)
+    factory = make_db("similarity.db", instrument=True)
+    with unit_of_work(factory) as db:
+        for user_id in range(1, USERS + 1):
+            user = UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+            user.rating = rng.choice([0.0, 1.5, 3.0, 4.25, 5.0])
+            if user_id == USERS:
+                continue
+            for kp_id in rng.sample(range(60), rng.randint(1, 40)):
+                UserVoteRepository.upsert_vote(db, user_id, str(kp_id), None, None, "FILM", rng.randint(1, 10))
+        for i in range(8):
+            movie = MovieRepository.create(db, title=f"Movie {i}", year=2020)
+            members = rng.sample(range(1, USERS + 1), rng.randint(1, 6))
+            slot = SlotRepository.create(db, movie.id, members[0], datetime.utcnow() + timedelta(days=1))
+            for user_id in members:
+                SlotParticipantRepository.add_participant(db, slot.id, user_id)
+    user_cache.clear()
+    return factory
+
+
+def test_score_users_matches_pairwise_formula(make_db):
+    factory = make_database(make_db)
+    others = list(range(1, USERS + 1)) + [MISSING_USER]
+    with factory() as db:
+        for user_id in (1, 2, USERS, MISSING_USER):
+            batched = MatchingService.score_users(db, user_id, others)
+            for other_id in others:
+                assert batched[other_id] == MatchingService.compute_user_similarity(db, user_id, other_id), \
+                    (user_id, other_id)
+
+
+def test_slot_ranking_matches_pairwise_average(make_db):
+    factory = make_database(make_db, seed=11)
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        for user_id in (1, 5, USERS):
+            expected = {}
+            for slot in slots:
+                sims = [MatchingService.compute_user_similarity(db, user_id, p.user_id) for p in slot.participants]
+                expected[slot.id] = sum(sims) / len(sims)
+            ranked = MatchingService.annotate_slots_by_compatibility(db, user_id, slots)
+            assert {slot.id: score for slot, score in ranked} == expected
+            assert [score for _, score in ranked] == sorted(expected.values(), reverse=True)
+            for slot in slots:
+                assert MatchingService.compute_slot_compatibility(db, user_id, slot) == expected[slot.id]
+
+
+def test_cold_cache_costs_one_query_per_kind(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        user_cache.clear()
+        # Votes of every participant in one IN query, ratings in another
+        with assert_max_queries(2):
+            cold = MatchingService.annotate_slots_by_compatibility(db, 1, slots)
+        with assert_max_queries(0):
+            warm = MatchingService.annotate_slots_by_compatibility(db, 1, slots)
+        assert cold == warm
+
+
+def test_vote_change_updates_batched_scores(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        before = MatchingService.score_users(db, 1, [2])[2]
+        for kp_id, rating in UserVoteRepository.get_user_votes_map(db, 1).items():
+            UserVoteRepository.upsert_vote(db, 2, kp_id, None, None, "FILM", rating)
+        after = MatchingService.score_users(db, 1, [2])[2]
+        assert after == MatchingService.compute_user_similarity(db, 1, 2)
+        # Identical votes on all of user 1's movies: preference similarity is 1
+        assert after > before
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
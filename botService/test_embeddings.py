@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Test ALS embedding training, incremental retraining and feed scoring"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+import numpy as np
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.models import UserEmbedding, UserVote
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    EmbeddingRepository, PreferenceProfileRepository, RecommendationFeedRepository,
+)
+from bot.services.embeddings import EmbeddingService, Interactions, from_blob, train_als
+from bot.services.matching import MatchingService
+from bot.services.recommendation_feed import RecommendationFeedService
+
+# Two taste groups of users, each voting for most of its own movies
+GROUPS = {"a": [f"a{i}" for i in range(8)], "b": [f"b{i}" for i in range(8)]}
+
+
+def group_votes():
+    votes = []
+    for user_id in range(1, 21):
+        movies = GROUPS["a" if user_id % 2 else "b"]
+        # Every user skips one movie of their group
+        votes.extend((user_id, kp_id, 8) for i, kp_id in enumerate(movies) if i != user_id % len(movies))
+    return votes
+
+
+def make_factory(make_db):
+    factory = make_db("embeddings.db")
+    with unit_of_work(factory) as db:
+        for user_id in range(1, 21):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        db.add_all(UserVote(user_id=u, kinopoisk_id=kp_id, user_rating=r) for u, kp_id, r in group_votes())
+    return factory
+
+
+def test_als_ranks_own_group_first():
+    interactions = Interactions.build(group_votes(), [], 10.0, 0.5)
+    users, movies = train_als(interactions, factors=4, regularization=1.0, iterations=10)
+    for user_id in range(1, 21):
+        own, other = ("a", "b") if user_id % 2 else ("b", "a")
+        skipped = interactions.movie_index[GROUPS[own][user_id % 8]]
+        scores = movies @ users[interactions.user_index[user_id]]
+        assert scores[skipped] > max(scores[interactions.movie_index[kp_id]] for kp_id in GROUPS[other])
+
+
+def test_participations_count_as_interactions():
+    interactions = Interactions.build([(1, "m", 5)], [(1, "m"), (2, "m")], 10.0, 0.5)
+    by_user = interactions.by_user
+    assert list(by_user.confidence[by_user.indptr[0]:by_user.indptr[1]]) == [1.0 + 5.0 + 5.0]
+    assert list(by_user.confidence[by_user.indptr[1]:by_user.indptr[2]]) == [1.0 + 5.0]
+
+
+def test_full_training_stores_float32_blobs(make_db):
+    factory = make_factory(make_db)
+    with unit_of_work(factory) as db:
+        result = EmbeddingService.train(db, factors=4, iterations=5)
+    assert result == (20, 16, True)
+    with factory() as db:
+        blob = db.query(UserEmbedding.vector).filter(UserEmbedding.user_id == 1).scalar()
+        assert len(blob) == 4 * 4
+        vector = EmbeddingService.user_vectors(db, [1])[1]
+        assert vector.dtype == np.float32
+        movie = EmbeddingService.movie_vectors(db, ["a0"])["a0"]
+        assert EmbeddingService.predict(vector, movie) == min(1.0, max(0.0, float(vector @ movie)))
+
+
+def test_incremental_training_updates_only_changes(make_db):
+    factory = make_factory(make_db)
+    with unit_of_work(factory) as db:
+        EmbeddingService.train(db, factors=4, iterations=5)
+    with factory() as db:
+        before = EmbeddingRepository.get_user_vectors(db)
+        old_movies = EmbeddingRepository.get_movie_vectors(db)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 21, "new", "New")
+        db.add(UserVote(user_id=21, kinopoisk_id="a1", user_rating=9))
+        db.add(UserVote(user_id=3, kinopoisk_id="new", user_rating=9, updated_at=datetime.utcnow()))
+    with unit_of_work(factory) as db:
+        result = EmbeddingService.train(db, factors=4)
+    assert result == (2, 1, False)
+    with factory() as db:
+        after = EmbeddingRepository.get_user_vectors(db)
+        assert set(after) == set(before) | {21}
+        assert after[3] != before[3]
+        assert all(after[u] == before[u] for u in before if u != 3)
+        movies = EmbeddingRepository.get_movie_vectors(db)
+        assert {kp: movies[kp] for kp in old_movies} == old_movies
+        assert np.any(from_blob(movies["new"]))
+    with unit_of_work(factory) as db:
+        try:
+            EmbeddingService.train(db, factors=8)
+            assert False, "Changing the factor count needs a full retrain"
+        except ValueError:
+            pass
+        assert EmbeddingService.train(db, full=True, factors=8).full
+
+
+def test_feed_blends_embedding_scores(make_db):
+    factory = make_factory(make_db)
+    soon = datetime.utcnow() + timedelta(days=1)
+    with unit_of_work(factory) as db:
+        for kp_id in ("b0", "b1", "x"):
+            movie = MovieRepository.create(db, title=kp_id, year=2000, kinopoisk_id=kp_id)
+            SlotRepository.create(db, movie.id, 2, soon)
+        EmbeddingService.train(db, factors=4, iterations=5)
+        RecommendationFeedService.build(db, 1)
+        RecommendationFeedService.build(db, 3)
+        # Scored by the slot-created event rather than the build
+        movie = MovieRepository.create(db, title="later", year=2000, kinopoisk_id="b2")
+        slot = SlotRepository.create(db, movie.id, 2, soon)
+        SlotParticipantRepository.add_participant(db, slot.id, 2)
+        RecommendationFeedService.on_slot_created(db, slot)
+    with factory() as db:
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, 1))
+        user_vector = EmbeddingService.user_vectors(db, [1])[1]
+        movie_vectors = EmbeddingService.movie_vectors(db, ["b0", "b1", "b2", "x"])
+        assert set(movie_vectors) == {"b0", "b1", "b2"}
+        page, _ = RecommendationFeedService.page(db, 1, 10)
+        scores = {slot.movie.kinopoisk_id: score for slot, score in page}
+        assert set(scores) == {"b0", "b1", "x", "b2"}
+        for slot, score in page:
+            interest = MatchingService.movie_interest(stats, slot.movie)
+            kp_id = slot.movie.kinopoisk_id
+            expected = EmbeddingService.blend(interest, user_vector, movie_vectors.get(kp_id))
+            assert abs(score - expected) < 1e-9
+        # "x" was never voted for: no embedding, heuristic only
+        unvoted = next(slot.movie for slot, _ in page if slot.movie.kinopoisk_id == "x")
+        assert scores["x"] == MatchingService.movie_interest(stats, unvoted)
+    old_weight = Config.ALS_WEIGHT
+    Config.ALS_WEIGHT = 0.0
+    try:
+        with factory() as db:
+            assert EmbeddingService.user_vectors(db, [1]) == {}
+    finally:
+        Config.ALS_WEIGHT = old_weight
+
+
+def test_training_rescores_existing_feeds(make_db):
+    factory = make_factory(make_db)
+    soon = datetime.utcnow() + timedelta(days=1)
+    with unit_of_work(factory) as db:
+        # User 1 (group "a") never voted for a1; b0 and b1 are the other group's
+        for kp_id in ("a1", "b0", "b1"):
+            movie = MovieRepository.create(db, title=kp_id, year=2000, kinopoisk_id=kp_id)
+            SlotRepository.create(db, movie.id, 2, soon)
+        for user_id in (1, 3, 5):
+            RecommendationFeedService.build(db, user_id)
+    with factory() as db:
+        page, _ = RecommendationFeedService.page(db, 1, 10)
+        before = [slot.movie.kinopoisk_id for slot, _ in page]
+    assert before[0] != "a1"
+
+    with unit_of_work(factory) as db:
+        EmbeddingService.train(db, factors=4, iterations=10)
+    with unit_of_work(factory) as db:
+        # As /recommend does: the feed scored without embeddings was dropped
+        RecommendationFeedService.ensure(db, 1)
+        RecommendationFeedService.ensure(db, 3)
+        RecommendationFeedService.ensure(db, 5)
+        page, _ = RecommendationFeedService.page(db, 1, 10)
+        after = [slot.movie.kinopoisk_id for slot, _ in page]
+    assert after[0] == "a1" and after != before
+
+    # Incremental: only the feed of the user whose vector changed is dropped
+    with unit_of_work(factory) as db:
+        db.add(UserVote(user_id=3, kinopoisk_id="b7", user_rating=9, updated_at=datetime.utcnow()))
+    with unit_of_work(factory) as db:
+        EmbeddingService.train(db, factors=4)
+    with factory() as db:
+        assert not RecommendationFeedRepository.exists(db, 3)
+        assert RecommendationFeedRepository.exists(db, 1) and RecommendationFeedRepository.exists(db, 5)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Test the genre catalog, genre masks and genre affinity scoring"""
+import sys
+import json
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.session import unit_of_work
+from bot.database.models import Genre, MovieGenre, Movie
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, UserVoteRepository,
+    GenreRepository, PreferenceProfileRepository,
+)
+from bot.services.matching import MatchingService
+from bot.utils.formatters import format_movie_info
+from bot.utils.genres import genre_bit, genres_mask
+
+VIEWER = 1
+
+
+def make_factory(make_db):
+    return make_db("genres.db")
+
+
+def test_movie_genres_are_catalogued(make_db):
+    factory = make_factory(make_db)
+    with unit_of_work(factory) as db:
+        movie = MovieRepository.create(db, title="A", year=2000, genres='["драма", "криминал", "драма"]')
+        movie_id = movie.id
+    with factory() as db:
+        movie = MovieRepository.get_by_id(db, movie_id)
+        ids = GenreRepository.get_ids(db, ["драма", "криминал"])
+        assert movie.genres == "драма, криминал"
+        assert movie.genre_mask == genre_bit(ids["драма"]) | genre_bit(ids["криминал"])
+        assert {g.name for g in movie.genre_entries} == {"драма", "криминал"}
+    with unit_of_work(factory) as db:
+        movie = MovieRepository.get_by_id(db, movie_id)
+        MovieRepository.update_from_api(db, movie, {"genres": [{"genre": "комедия"}, {"genre": "драма"}]})
+    with factory() as db:
+        movie = MovieRepository.get_by_id(db, movie_id)
+        assert movie.genres == "комедия, драма"
+        assert db.query(Genre).count() == 3
+        assert db.query(MovieGenre).filter(MovieGenre.movie_id == movie_id).count() == 2
+        assert movie.genre_mask == genres_mask(GenreRepository.get_ids(db, ["комедия", "драма"]).values())
+        assert "🎭 комедия, драма" in format_movie_info(movie)
+
+
+def test_profile_keeps_top_genres(make_db):
+    factory = make_factory(make_db)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, VIEWER, "viewer", "Viewer")
+        for kp_id, genres in (("1", "драма, криминал"), ("2", '["драма"]'), ("3", "комедия")):
+            UserVoteRepository.upsert_vote(db, VIEWER, kp_id, None, 2000, "movie", 8, genres=genres)
+    with factory() as db:
+        profile = PreferenceProfileRepository.get(db, VIEWER)
+        ids = GenreRepository.get_ids(db, ["драма", "криминал", "комедия"])
+        assert profile.genre_mask == genres_mask(ids.values())
+        assert json.loads(profile.top_genre_counts) == {
+            str(ids["драма"]): 2, str(ids["криминал"]): 1, str(ids["комедия"]): 1,
+        }
+        stats = MatchingService.preference_stats(profile)
+        drama = Movie(title="D", year=2000, type="movie", genre_mask=genre_bit(ids["драма"]))
+        western = Movie(title="W", year=2000, type="movie", genre_mask=0)
+        gain = MatchingService.movie_interest(stats, drama) - MatchingService.movie_interest(stats, western)
+        assert abs(gain - 0.3 * 2 / 3) < 1e-9
+
+
+def test_sql_genre_score_matches_movie_interest(make_db):
+    factory = make_factory(make_db)
+    soon = datetime.utcnow() + timedelta(days=1)
+    genre_sets = [None, "драма", "драма, криминал", "комедия, мюзикл", "криминал, комедия, драма", "ужасы"]
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, VIEWER, "viewer", "Viewer")
+        UserRepository.get_or_create(db, 2, "creator", "Creator")
+        for i, genres in enumerate(["драма, криминал", "драма", "комедия", "драма, комедия"]):
+            UserVoteRepository.upsert_vote(db, VIEWER, f"v{i}", None, 1990 + i, "movie", 8, genres=genres)
+        for i, genres in enumerate(genre_sets):
+            movie = MovieRepository.create(db, title=f"Movie {i}", year=1990, kinopoisk_id=str(i), genres=genres)
+            SlotRepository.create(db, movie.id, 2, soon + timedelta(hours=i))
+    with factory() as db:
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, VIEWER))
+        rows = SlotRepository.get_recommendation_candidates(db, VIEWER, MatchingService.interest_sql(stats), 100)
+        assert len(rows) == len(genre_sets)
+        for slot, cheap in rows:
+            assert abs(cheap - MatchingService.movie_interest(stats, slot.movie)) < 1e-9
+        # Drama + crime + comedy covers every vote: the genre term is capped at 1
+        assert rows[0][0].movie.title == "Movie 4"
+        assert rows[-1][0].movie.title in ("Movie 0", "Movie 5")
+
+
+def test_migration_converts_existing_rows(migrated_db):
+    url = migrated_db("20261016_000009", "convert.db")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, first_name, rating, total_ratings, created_at) VALUES (1, 'A', 0, 0, CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO movies (id, title, type, genres) VALUES (1, 'API', 'movie', :g)"),
+                     {"g": '["триллер", "драма", "триллер"]'})
+        conn.execute(text("INSERT INTO movies (id, title, type, genres) VALUES (2, 'Parsed', 'movie', 'драма, комедия')"))
+        conn.execute(text("INSERT INTO movies (id, title, type) VALUES (3, 'None', 'movie')"))
+        conn.execute(text("INSERT INTO user_votes (user_id, kinopoisk_id, user_rating, genres) VALUES (1, '7', 8, :g)"),
+                     {"g": '["драма"]'})
+        conn.execute(text("INSERT INTO user_preference_profiles (user_id, vote_count, genre_counts) VALUES (1, 1, :g)"),
+                     {"g": json.dumps({"драма": 1})})
+    engine.dispose()
+    # Through head: the ORM below maps the current schema
+    migrated_db("head", "convert.db")
+    factory = sessionmaker(bind=create_engine(url))
+    with factory() as db:
+        ids = GenreRepository.get_ids(db, ["драма", "комедия", "триллер"])
+        assert db.query(Genre).count() == 3
+        api, parsed, plain = (MovieRepository.get_by_id(db, i) for i in (1, 2, 3))
+        assert api.genres == "триллер, драма"
+        assert api.genre_mask == genres_mask([ids["триллер"], ids["драма"]])
+        assert parsed.genre_mask == genres_mask([ids["драма"], ids["комедия"]])
+        assert plain.genres is None and plain.genre_mask == 0
+        assert db.query(MovieGenre).count() == 4
+        assert db.execute(text("SELECT genres FROM user_votes")).scalar() == "драма"
+        migrated = PreferenceProfileRepository.get(db, 1)
+        assert migrated.genre_mask == genre_bit(ids["драма"])
+        assert json.loads(migrated.top_genre_counts) == {str(ids["драма"]): 1}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Test the shared async HTTP client and the API services that use it"""
+import sys
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+import httpx
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, UserKinopoiskRepository, UserVoteRepository,
+)
+from bot.services import http_client
+from bot.services.movie_parser import MovieParser
+from bot.services.kinopoisk_user_service import KinopoiskUserService
+from bot.services.recommendation_feed import RecommendationFeedService
+from bot.services.kinopoisk_images_service import KinopoiskImagesService
+from bot.services.watch_together_service import WatchTogetherService
+
+
+class FakeApi:
+    """httpx transport answering like the external APIs; records requests"""
+
+    def __init__(self, routes: dict, delay: float = 0.0):
+        self.routes = routes
+        self.delay = delay
+        self.requests = []
+        self.active = {}
+        self.peak = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests.append(request)
+        self.active[host] = self.active.get(host, 0) + 1
+        self.peak[host] = max(self.peak.get(host, 0), self.active[host])
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active[host] -= 1
+        for prefix, reply in self.routes.items():
+            if str(request.url).startswith(prefix):
+                return reply(request) if callable(reply) else httpx.Response(200, **reply)
+        return httpx.Response(404)
+
+
+def with_api(api: FakeApi, coroutine_fn):
+    """Run coroutine_fn() against api, with a Kinopoisk and W2G key configured"""
+    old_keys = Config.KINOPOISK_API_KEY, Config.WATCH_TOGETHER_API_KEY
+    Config.KINOPOISK_API_KEY, Config.WATCH_TOGETHER_API_KEY = "kp-key", "w2g-key"
+    http_client.use_transport(httpx.MockTransport(api))
+    try:
+        return asyncio.run(coroutine_fn())
+    finally:
+        http_client.use_transport(None)
+        Config.KINOPOISK_API_KEY, Config.WATCH_TOGETHER_API_KEY = old_keys
+
+
+def test_one_client_per_loop():
+    api = FakeApi({"https://example.org/": {"text": "ok"}})
+
+    async def two_requests():
+        first = await http_client.get("https://example.org/a")
+        client = http_client._current.client
+        await http_client.get("https://example.org/b")
+        return first.text, client, http_client._current.client
+
+    text, client, same = with_api(api, two_requests)
+    assert text == "ok" and client is same
+    http_client.use_transport(httpx.MockTransport(api))
+    try:
+        asyncio.run(http_client.get("https://example.org/c"))
+        assert http_client._current.client is not client
+    finally:
+        http_client.use_transport(None)
+
+
+def test_per_host_concurrency_limit():
+    api = FakeApi({"https://": {"json": {}}}, delay=0.01)
+
+    async def burst():
+        urls = [f"https://{http_client.KINOPOISK_HOST}/api/{i}" for i in range(12)]
+        urls += [f"https://other.example/{i}" for i in range(12)]
+        await asyncio.gather(*(http_client.get(url) for url in urls))
+
+    with_api(api, burst)
+    assert api.peak[http_client.KINOPOISK_HOST] == Config.KINOPOISK_HTTP_LIMIT
+    assert api.peak["other.example"] == min(12, Config.HTTP_PER_HOST_LIMIT)
+
+
+def test_movie_parser_awaits_api():
+    api = FakeApi({f"{MovieParser.API_BASE_URL}/590286": {"json": {
+        "kinopoiskId": 590286, "nameRu": "Бэтмен", "year": 2022, "type": "FILM",
+        "genres": [{"genre": "боевик"}], "rating": {"kp": 7.8},
+    }}})
+    data = with_api(api, lambda: MovieParser.parse_url("https://www.kinopoisk.ru/film/590286/"))
+    assert data["title"] == "Бэтмен" and data["genres"] == "боевик"
+    assert api.requests[0].headers["X-API-KEY"] == "kp-key"
+    missing = with_api(api, lambda: MovieParser.parse_url("https://www.kinopoisk.ru/film/1/"))
+    assert missing is None
+
+
+def test_vote_import_pages(make_db):
+    def votes_page(request):
+        page = int(request.url.params["page"])
+        if page == 2:
+            # Page 1 is committed and no write lock is held while page 2 is fetched
+            with unit_of_work(factory) as db:
+                assert len(UserVoteRepository.get_user_votes_map(db, 1)) == 3
+                UserRepository.get_or_create(db, 2, "other", "Other")
+        items = [{"kinopoiskId": page * 10 + i, "nameRu": f"M{page}{i}", "userRating": 7, "type": "FILM"}
+                 for i in range(3)]
+        return httpx.Response(200, json={"totalPages": 2, "items": items})
+
+    factory = make_db("http.db", timeout=1)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "viewer", "Viewer")
+        UserKinopoiskRepository.set_kp_user_id(db, 1, "42")
+    api = FakeApi({f"{KinopoiskUserService.BASE_URL}/42/votes": votes_page})
+
+    async def import_votes():
+        return await KinopoiskUserService.fetch_and_store_votes(1, factory)
+
+    assert with_api(api, import_votes) == 6
+    with factory() as db:
+        assert len(UserVoteRepository.get_user_votes_map(db, 1)) == 6
+
+
+def test_vote_import_fetches_pages_concurrently(make_db):
+    attempts = {}
+
+    def votes_page(request):
+        page = int(request.url.params["page"])
+        attempts[page] = attempts.get(page, 0) + 1
+        if page == 3 and attempts[page] == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        if page == 5:
+            return httpx.Response(500)
+        items = [{"kinopoiskId": page * 10 + i, "nameRu": f"M{page}{i}", "userRating": 7, "type": "FILM"}
+                 for i in range(2)]
+        return httpx.Response(200, json={"totalPages": 8, "items": items})
+
+    factory = make_db("pages.db")
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "viewer", "Viewer")
+        UserKinopoiskRepository.set_kp_user_id(db, 1, "42")
+    api = FakeApi({f"{KinopoiskUserService.BASE_URL}/42/votes": votes_page}, delay=0.01)
+
+    async def import_votes():
+        return await KinopoiskUserService.fetch_and_store_votes(1, factory)
+
+    # Page 5 fails and is skipped; page 3 is retried after the 429
+    assert with_api(api, import_votes) == 14
+    assert attempts[3] == 2
+    assert api.peak[http_client.KINOPOISK_HOST] == Config.KP_VOTES_CONCURRENCY
+    with factory() as db:
+        votes = UserVoteRepository.get_user_votes_map(db, 1)
+        assert len(votes) == 14 and "50" not in votes and "30" in votes
+
+
+def test_vote_import_skips_page_with_network_error(make_db, monkeypatch):
+    def votes_page(request):
+        page = int(request.url.params["page"])
+        if page == 2:
+            raise httpx.ReadTimeout("timed out", request=request)
+        items = [{"kinopoiskId": page * 10 + i, "nameRu": f"M{page}{i}", "userRating": 7, "type": "FILM"}
+                 for i in range(2)]
+        return httpx.Response(200, json={"totalPages": 3, "items": items})
+
+    factory = make_db("timeout.db")
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "viewer", "Viewer")
+        UserKinopoiskRepository.set_kp_user_id(db, 1, "42")
+    rebuilt = []
+    monkeypatch.setattr(RecommendationFeedService, "on_votes_imported",
+                        staticmethod(lambda db, user_id: rebuilt.append(user_id)))
+    api = FakeApi({f"{KinopoiskUserService.BASE_URL}/42/votes": votes_page})
+
+    async def import_votes():
+        return await KinopoiskUserService.fetch_and_store_votes(1, factory)
+
+    assert with_api(api, import_votes) == 4
+    assert rebuilt == [1]
+    with factory() as db:
+        assert set(UserVoteRepository.get_user_votes_map(db, 1)) == {"10", "11", "30", "31"}
+
+
+def test_images_and_watch_together(make_db):
+    api = FakeApi({
+        f"{KinopoiskImagesService.BASE_URL}/films/7/images": {"json": {"items": [{"previewUrl": "https://img.example/p.jpg"}]}},
+        "https://img.example/": {"content": b"jpeg"},
+        WatchTogetherService.API_BASE_URL: {"json": {"streamkey": "abc"}},
+    })
+
+    async def poster():
+        url = await KinopoiskImagesService.get_best_poster("7")
+        return await KinopoiskImagesService.download_image(url)
+
+    assert with_api(api, poster) == b"jpeg"
+    assert api.requests[0].url.params["type"] == "POSTER"
+
+    factory = make_db("w2g.db")
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "creator", "Creator")
+        movie = MovieRepository.create(db, title="Movie", year=2000, kinopoisk_id="7")
+        slot_id = SlotRepository.create(db, movie.id, 1, datetime.utcnow() + timedelta(days=1)).id
+
+    async def room():
+        with factory() as db:
+            return await WatchTogetherService.create_wt_room(db, SlotRepository.get_by_id(db, slot_id))
+
+    assert with_api(api, room) == "https://w2g.tv/rooms/abc"
+    assert b"flcksbr.top/film/7/" in api.requests[-1].content
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Stress test: hundreds of simultaneous joins of one slot
+
+Every join runs SlotParticipantRepository.join in its own unit of work on its
+own thread, all released at once by a barrier. The slot must end up with
+exactly max_participants participants, a matching participant_count, a
+single room and no errors. Runs on a temporary SQLite file and, when
+TEST_POSTGRES_URL points to an empty scratch database, on Postgres too.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.session import Base, unit_of_work
+from bot.database.sqlite_profile import apply_sqlite_profile
+from bot.database.models import SlotParticipant, Room
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+)
+from bot.constants import JoinStatus, SlotStatus
+
+JOINERS = 300
+MAX_PARTICIPANTS = 40
+MIN_PARTICIPANTS = 10
+
+
+def make_factory(url: str):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=20, max_overflow=0)
+    apply_sqlite_profile(engine, "production")
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+
+def seed(factory) -> int:
+    """Users 1..JOINERS and one popular slot"""
+    with unit_of_work(factory) as db:
+        for user_id in range(1, JOINERS + 1):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        movie = MovieRepository.create(db, title="Popular", year=2024)
+        slot = SlotRepository.create(
+            db, movie.id, 1, datetime.utcnow() + timedelta(days=1),
+            min_participants=MIN_PARTICIPANTS, max_participants=MAX_PARTICIPANTS,
+        )
+        return slot.id
+
+
+def run_burst(factory, slot_id: int, user_ids: list) -> tuple:
+    """Join slot_id from every user id at the same moment"""
+    barrier = threading.Barrier(len(user_ids))
+    outcomes = []
+    errors = []
+    lock = threading.Lock()
+
+    def join(user_id):
+        barrier.wait()
+        try:
+            with unit_of_work(factory) as db:
+                result = SlotParticipantRepository.join(db, slot_id, user_id)
+            with lock:
+                outcomes.append((result.status, result.room_created))
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=join, args=(user_id,)) for user_id in user_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes, errors
+
+
+def check_backend(url: str):
+    engine, factory = make_factory(url)
+    try:
+        slot_id = seed(factory)
+        # Every user once, plus a few users firing twice
+        user_ids = list(range(1, JOINERS + 1)) + list(range(1, 11))
+        outcomes, errors = run_burst(factory, slot_id, user_ids)
+
+        assert not errors, f"{engine.dialect.name}: {len(errors)} joins failed: {errors[:3]}"
+        statuses = Counter(status for status, _ in outcomes)
+        assert statuses[JoinStatus.JOINED] == MAX_PARTICIPANTS, statuses
+        assert statuses[JoinStatus.FULL] + statuses[JoinStatus.ALREADY_JOINED] == len(user_ids) - MAX_PARTICIPANTS
+        assert sum(1 for _, created in outcomes if created) == 1
+
+        with factory() as db:
+            slot = SlotRepository.get_by_id(db, slot_id)
+            rows = db.query(SlotParticipant).filter(SlotParticipant.slot_id == slot_id).count()
+            rooms = db.query(Room).filter(Room.slot_id == slot_id).count()
+            assert rows == MAX_PARTICIPANTS
+            assert slot.participant_count == MAX_PARTICIPANTS
+            assert slot.status == SlotStatus.FULL
+            assert rooms == 1
+    finally:
+        if not url.startswith("sqlite"):
+            Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def backend_urls(tmp_path) -> list:
+    urls = [f"sqlite:///{tmp_path / 'joins.db'}"]
+    if os.getenv("TEST_POSTGRES_URL"):
+        urls.append(os.environ["TEST_POSTGRES_URL"])
+    return urls
+
+
+def test_concurrent_joins_respect_capacity(tmp_path):
+    for url in backend_urls(tmp_path):
+        check_backend(url)
+
+
+def test_join_outcomes(tmp_path):
+    engine, factory = make_factory(f"sqlite:///{tmp_path / 'join.db'}")
+    with unit_of_work(factory) as db:
+        for user_id in (1, 2, 3):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        movie = MovieRepository.create(db, title="Movie", year=2020)
+        slot_id = SlotRepository.create(
+            db, movie.id, 1, datetime.utcnow() + timedelta(days=1), min_participants=2, max_participants=2
+        ).id
+    with unit_of_work(factory) as db:
+        assert SlotParticipantRepository.join(db, 999, 1).status == JoinStatus.NOT_FOUND
+        first = SlotParticipantRepository.join(db, slot_id, 1)
+        assert first.status == JoinStatus.JOINED and first.room is None
+        assert SlotParticipantRepository.join(db, slot_id, 1).status == JoinStatus.ALREADY_JOINED
+        second = SlotParticipantRepository.join(db, slot_id, 2)
+        assert second.status == JoinStatus.JOINED and second.room_created
+        assert second.slot.status == SlotStatus.FULL
+        assert SlotParticipantRepository.join(db, slot_id, 3).status == JoinStatus.FULL
+    with factory() as db:
+        assert SlotParticipantRepository.get_participants_count(db, slot_id) == 2
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Test that list views issue a constant number of queries (no N+1)"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import event
+
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository,
+    SlotParticipantRepository, RoomRepository, LoadProfile,
+)
+from bot.utils.formatters import format_slot_info, format_room_info
+from bot.utils.keyboards import (
+    get_slots_list_keyboard, get_user_slots_keyboard, get_participant_slots_keyboard,
+)
+
+
+def make_population(make_db, slot_count: int):
+    """SQLite database with slot_count slots of one creator, each with a room and two participants"""
+    factory = make_db(f"profiles_{slot_count}.db")
+    engine = factory.kw["bind"]
+    with factory() as db:
+        creator = UserRepository.get_or_create(db, 1, "creator", "Creator")
+        guest = UserRepository.get_or_create(db, 2, "guest", "Guest")
+        movie_id = MovieRepository.create(db, title="Movie", year=2020).id
+        for i in range(slot_count):
+            slot = SlotRepository.create(
+                db, movie_id, creator.id, datetime.utcnow() + timedelta(days=1, hours=i), min_participants=3
+            )
+            SlotParticipantRepository.add_participant(db, slot.id, creator.id)
+            SlotParticipantRepository.add_participant(db, slot.id, guest.id)
+            RoomRepository.create(db, slot.id)
+    return engine, factory, movie_id
+
+
+def count_queries(engine, factory, movie_id, render) -> int:
+    """Number of SELECTs issued by render(db)"""
+    selects = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        with factory() as db:
+            render(db, movie_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(selects)
+
+
+def render_slot_lists(db, movie_id):
+    """Same loads and rendering as find_slots, /my_slots and /recommend"""
+    slots = SlotRepository.get_by_movie(db, movie_id, profile=LoadProfile.LIST_CARD)
+    get_slots_list_keyboard(slots)
+    created = SlotRepository.get_by_creator(db, 1, profile=LoadProfile.LIST_CARD)
+    get_user_slots_keyboard(created)
+    participations = SlotRepository.get_user_participations(db, 2, profile=LoadProfile.LIST_CARD)
+    get_participant_slots_keyboard(participations)
+    for slot in SlotRepository.get_all_open(db, profile=LoadProfile.LIST_CARD):
+        format_slot_info(slot)
+
+
+def render_room_list(db, movie_id):
+    """Same loads and rendering as /my_rooms"""
+    for room in RoomRepository.get_user_rooms(db, 2, profile=LoadProfile.LIST_CARD):
+        format_room_info(room)
+
+
+def render_room_setup(db, movie_id):
+    """Room creation reads participants' users of every slot"""
+    for slot in SlotRepository.get_user_participations(db, 1, profile=LoadProfile.ROOM_SETUP):
+        format_slot_info(slot)
+        [p.user.first_name for p in slot.participants]
+        slot.room
+
+
+def assert_constant(make_db, render):
+    small = count_queries(*make_population(make_db, 3), render=render)
+    large = count_queries(*make_population(make_db, 30), render=render)
+    assert small == large, f"{render.__name__}: {small} queries for 3 slots, {large} for 30"
+
+
+def test_slot_lists_do_not_grow_with_slots(make_db):
+    assert_constant(make_db, render_slot_lists)
+
+
+def test_room_list_does_not_grow_with_rooms(make_db):
+    assert_constant(make_db, render_room_list)
+
+
+def test_room_setup_does_not_grow_with_slots(make_db):
+    assert_constant(make_db, render_room_setup)
+
+
+def test_unknown_profile_is_rejected(make_db):
+    engine, factory, movie_id = make_population(make_db, 1)
+    with factory() as db:
+        try:
+            SlotRepository.get_by_movie(db, movie_id, profile="everything")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unknown profile accepted")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
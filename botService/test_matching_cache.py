@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Test the vote-map / peer-rating cache behind MatchingService"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.user_cache import LRUCache, user_cache
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    RoomRepository, UserVoteRepository, LoadProfile,
+)
+from bot.services.matching import MatchingService
+from bot.services.rating_service import RatingService
+
+VIEWER = 1
+
+
+def make_database(make_db):
+    """Viewer plus two open slots with two participants each, everyone with KP votes"""
+    factory = make_db("matching.db", instrument=True)
+    with unit_of_work(factory) as db:
+        for user_id in range(1, 6):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+            for kp_id in range(10):
+                UserVoteRepository.upsert_vote(
+                    db, user_id, str(kp_id), f"Movie {kp_id}", 2000, "FILM", (kp_id + user_id) % 10 + 1
+                )
+        for i, members in enumerate(((2, 3), (4, 5))):
+            movie = MovieRepository.create(db, title=f"Slot movie {i}", year=2020)
+            slot = SlotRepository.create(db, movie.id, members[0], datetime.utcnow() + timedelta(days=1))
+            for user_id in members:
+                SlotParticipantRepository.add_participant(db, slot.id, user_id)
+    user_cache.clear()
+    return factory
+
+
+def test_repeated_ranking_hits_no_rows(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        first = MatchingService.annotate_slots_by_compatibility(db, VIEWER, slots)
+        with assert_max_queries(0):
+            second = MatchingService.annotate_slots_by_compatibility(db, VIEWER, slots)
+        assert [score for _, score in first] == [score for _, score in second]
+    assert user_cache.vectors.hits > 0
+
+
+def test_vote_changes_invalidate_cache(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        before = MatchingService.compute_user_similarity(db, VIEWER, 2)
+    with unit_of_work(factory) as db:
+        for kp_id in range(10):
+            UserVoteRepository.upsert_vote(db, 2, str(kp_id), f"Movie {kp_id}", 2000, "FILM", (kp_id + VIEWER) % 10 + 1)
+        # The writing session reads its own new votes
+        assert 2 not in user_cache.votes
+        mid = MatchingService.compute_user_similarity(db, VIEWER, 2)
+    # ...and the value cached from inside the transaction is dropped on commit
+    assert 2 not in user_cache.votes
+    with factory() as db:
+        after = MatchingService.compute_user_similarity(db, VIEWER, 2)
+    assert after > before and mid == after
+
+
+def test_rating_changes_invalidate_cache(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        slot = SlotRepository.get_all_open(db)[0]
+        room_id = RoomRepository.create(db, slot.id).id
+    with factory() as db:
+        assert MatchingService._peer_rating(db, 2) == 0.0
+        RatingService.create_rating(db, room_id, 3, 2, 5)
+        assert MatchingService._peer_rating(db, 2) == 5.0
+        UserRepository.update_rating(db, 2)
+        assert 2 not in user_cache.ratings
+
+
+def test_rolled_back_write_is_not_cached(make_db):
+    factory = make_database(make_db)
+    try:
+        with unit_of_work(factory) as db:
+            UserVoteRepository.upsert_vote(db, 2, "99", "New", 2001, "FILM", 10)
+            assert "99" in MatchingService._votes_map(db, 2)
+            raise RuntimeError("handler failed")
+    except RuntimeError:
+        pass
+    assert 2 not in user_cache.votes
+    with factory() as db:
+        assert "99" not in MatchingService._votes_map(db, 2)
+
+
+def test_lru_eviction():
+    cache = LRUCache(2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    assert cache.get(1) == "a"
+    cache.put(3, "c")
+    assert 2 not in cache and 1 in cache and 3 in cache
+    assert len(cache) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Test that known movies are served from the database and refreshed in the background"""
+import sys
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.repositories import MovieRepository, payload_hash
+from bot.services import http_client
+from bot.services.movie_parser import MovieParser
+
+URL = "https://www.kinopoisk.ru/film/590286/"
+
+
+def payload(title: str = "Бэтмен") -> dict:
+    return {
+        "kinopoiskId": 590286, "nameRu": title, "year": 2022, "type": "FILM",
+        "genres": [{"genre": "боевик"}, {"genre": "драма"}], "rating": {"kp": 7.8},
+    }
+
+
+def make_database(make_db, updated_at: datetime):
+    """SQLite database holding the movie of URL, last refreshed at updated_at"""
+    factory = make_db("movie_cache.db", instrument=True)
+    with unit_of_work(factory) as db:
+        movie = MovieRepository.create(
+            db, title="Бэтмен", year=2022, kinopoisk_id="590286", genres="боевик, драма",
+            api_hash=payload_hash(payload()),
+        )
+        movie.updated_at = updated_at
+    return factory
+
+
+def with_api(body: dict, coroutine_fn):
+    """Run coroutine_fn() with a Kinopoisk key, the API answering body; returns (result, requests)"""
+    requests = []
+
+    def answer(request):
+        requests.append(request)
+        return httpx.Response(200, json=body)
+
+    old_key = Config.KINOPOISK_API_KEY
+    Config.KINOPOISK_API_KEY = "kp-key"
+    http_client.use_transport(httpx.MockTransport(answer))
+    try:
+        return asyncio.run(coroutine_fn()), requests
+    finally:
+        http_client.use_transport(None)
+        Config.KINOPOISK_API_KEY = old_key
+
+
+def test_fresh_movie_skips_api(make_db):
+    factory = make_database(make_db, datetime.utcnow())
+
+    async def parse():
+        with unit_of_work(factory) as db:
+            data = await MovieParser.parse_url(URL, db)
+            assert not MovieParser._refreshes
+            return data["movie"].kinopoisk_id, "api_data" in data
+
+    (kinopoisk_id, from_api), requests = with_api(payload(), parse)
+    assert kinopoisk_id == "590286" and not from_api
+    assert requests == []
+
+
+def test_unknown_movie_goes_to_api(make_db):
+    factory = make_database(make_db, datetime.utcnow())
+
+    async def parse():
+        with unit_of_work(factory) as db:
+            return await MovieParser.parse_url("https://www.kinopoisk.ru/film/1/", db)
+
+    data, requests = with_api(payload("Другой"), parse)
+    assert "movie" not in data and data["title"] == "Другой"
+    assert len(requests) == 1
+
+
+def test_stale_movie_refreshes_in_background(make_db):
+    factory = make_database(make_db, datetime.utcnow() - timedelta(hours=Config.MOVIE_CACHE_TTL_HOURS + 1))
+
+    async def parse_then_wait():
+        with unit_of_work(factory) as db:
+            data = await MovieParser.parse_url(URL, db)
+            title = data["title"]
+        # The stored copy is answered before the API call finishes
+        await asyncio.gather(*MovieParser._refreshes.values())
+        return title
+
+    title, requests = with_api(payload("Бэтмен (2022)"), parse_then_wait)
+    assert title == "Бэтмен" and len(requests) == 1
+    with factory() as db:
+        movie = MovieRepository.find_by_kinopoisk_id(db, "590286")
+        assert movie.title == "Бэтмен (2022)"
+        assert movie.api_hash == payload_hash(payload("Бэтмен (2022)"))
+        assert MovieParser.is_fresh(movie)
+
+
+def test_async_session_refreshes_stale_movie(make_db):
+    factory = make_database(make_db, datetime.utcnow() - timedelta(hours=Config.MOVIE_CACHE_TTL_HOURS + 1))
+
+    async def parse_then_wait():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{factory.kw['bind'].url.database}")
+        try:
+            async with async_sessionmaker(bind=engine, expire_on_commit=False)() as db:
+                data = await MovieParser.parse_url(URL, db)
+            await asyncio.gather(*MovieParser._refreshes.values())
+            return data["movie"].title
+        finally:
+            await engine.dispose()
+
+    title, requests = with_api(payload("Бэтмен (2022)"), parse_then_wait)
+    assert title == "Бэтмен" and len(requests) == 1
+    with factory() as db:
+        assert MovieRepository.find_by_kinopoisk_id(db, "590286").title == "Бэтмен (2022)"
+
+
+def test_unchanged_payload_only_marks_fresh(make_db):
+    stale = datetime.utcnow() - timedelta(hours=Config.MOVIE_CACHE_TTL_HOURS + 1)
+    factory = make_database(make_db, stale)
+
+    async def refresh():
+        # Movie lookup + updated_at; fields and genres are not rewritten
+        with assert_max_queries(2):
+            await MovieParser.refresh("590286", factory)
+
+    with_api(payload(), refresh)
+    with factory() as db:
+        movie = MovieRepository.find_by_kinopoisk_id(db, "590286")
+        assert movie.updated_at > stale and movie.title == "Бэтмен"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -3,6 +3,7 @@
 
 import sys
 import os
+import asyncio
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from bot.services.movie_parser import MovieParser
@@ -18,7 +19,7 @@ def test_parser():
     print(f"\nTesting URL: {url}")
     
     try:
-        result = MovieParser.parse_url(url)
+        result = asyncio.run(MovieParser.parse_url(url))
         print(f"\nResult: {result}")
         
         if result:
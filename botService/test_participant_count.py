@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Test the denormalized Slot.participant_count"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from bot.database.session import unit_of_work
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository, LoadProfile,
+)
+from bot.services.room_manager import RoomManager
+from bot.utils.formatters import format_slot_info
+from bot.utils.keyboards import get_slots_list_keyboard, get_user_slots_keyboard
+
+
+def make_database(make_db):
+    factory = make_db("count.db")
+    engine = factory.kw["bind"]
+    with factory() as db:
+        for user_id in (1, 2, 3):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        movie_id = MovieRepository.create(db, title="Movie", year=2020).id
+        slot_id = SlotRepository.create(
+            db, movie_id, 1, datetime.utcnow() + timedelta(days=1), min_participants=2
+        ).id
+    return engine, factory, movie_id, slot_id
+
+
+def test_add_and_remove_keep_count(make_db):
+    _, factory, _, slot_id = make_database(make_db)
+    with factory() as db:
+        slot = SlotRepository.get_by_id(db, slot_id)
+        assert slot.participant_count == 0
+        SlotParticipantRepository.add_participant(db, slot_id, 1)
+        SlotParticipantRepository.add_participant(db, slot_id, 2)
+        # Repeated join is a no-op
+        SlotParticipantRepository.add_participant(db, slot_id, 2)
+        assert slot.participant_count == 2
+        assert RoomManager.should_create_room(slot)
+        SlotParticipantRepository.remove_participant(db, slot_id, 2)
+        SlotParticipantRepository.remove_participant(db, slot_id, 3)
+        assert slot.participant_count == 1
+        assert SlotParticipantRepository.get_participants_count(db, slot_id) == 1
+
+
+def test_count_in_unit_of_work_and_rollback(make_db):
+    _, factory, _, slot_id = make_database(make_db)
+    with unit_of_work(factory) as db:
+        SlotParticipantRepository.add_participant(db, slot_id, 1)
+        assert SlotRepository.get_by_id(db, slot_id).participant_count == 1
+    try:
+        with unit_of_work(factory) as db:
+            SlotParticipantRepository.add_participant(db, slot_id, 2)
+            raise RuntimeError("handler failed")
+    except RuntimeError:
+        pass
+    with factory() as db:
+        assert SlotRepository.get_by_id(db, slot_id).participant_count == 1
+
+
+def test_list_views_do_not_load_participants(make_db):
+    engine, factory, movie_id, slot_id = make_database(make_db)
+    with factory() as db:
+        SlotParticipantRepository.add_participant(db, slot_id, 1)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    with factory() as db:
+        slots = SlotRepository.get_by_movie(db, movie_id, profile=LoadProfile.LIST_CARD)
+        get_slots_list_keyboard(slots)
+        get_user_slots_keyboard(slots)
+        format_slot_info(slots[0])
+        RoomManager.should_create_room(slots[0])
+    assert statements
+    assert not [s for s in statements if "slot_participants" in s], statements
+
+
+def test_migration_backfills_count(migrated_db):
+    url = migrated_db("20261016_000005", "backfill.db")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, first_name, rating, total_ratings, created_at) VALUES (1, 'A', 0, 0, CURRENT_TIMESTAMP), (2, 'B', 0, 0, CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO movies (id, title, type, created_at) VALUES (1, 'Movie', 'movie', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO slots (id, movie_id, creator_id, datetime, min_participants, status, created_at) VALUES (1, 1, 1, CURRENT_TIMESTAMP, 2, 'open', CURRENT_TIMESTAMP), (2, 1, 1, CURRENT_TIMESTAMP, 2, 'open', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO slot_participants (slot_id, user_id, joined_at) VALUES (1, 1, CURRENT_TIMESTAMP), (1, 2, CURRENT_TIMESTAMP)"))
+    engine.dispose()
+    migrated_db("20261016_000006", "backfill.db")
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        counts = dict(conn.execute(text("SELECT id, participant_count FROM slots")).fetchall())
+    engine.dispose()
+    assert counts == {1: 2, 2: 0}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -3,6 +3,7 @@
 
 import sys
 import os
+import asyncio
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from bot.services.kinopoisk_images_service import KinopoiskImagesService
@@ -16,7 +17,7 @@ def test_get_poster():
     
     # Get all poster images
     print("\n📸 Getting all poster images...")
-    posters = KinopoiskImagesService.get_movie_images(kinopoisk_id, "POSTER")
+    posters = asyncio.run(KinopoiskImagesService.get_movie_images(kinopoisk_id, "POSTER"))
     
     if posters:
         print(f"✅ Found {len(posters)} posters")
@@ -29,14 +30,14 @@ def test_get_poster():
     
     # Get best poster URL
     print("\n🏆 Getting best poster...")
-    best_poster_url = KinopoiskImagesService.get_best_poster(kinopoisk_id)
+    best_poster_url = asyncio.run(KinopoiskImagesService.get_best_poster(kinopoisk_id))
     
     if best_poster_url:
         print(f"✅ Best poster URL: {best_poster_url}")
         
         # Try to download the image
         print("\n⬇️ Downloading poster...")
-        image_data = KinopoiskImagesService.download_image(best_poster_url)
+        image_data = asyncio.run(KinopoiskImagesService.download_image(best_poster_url))
         
         if image_data:
             print(f"✅ Downloaded {len(image_data)} bytes")
@@ -60,7 +61,7 @@ def test_different_image_types():
     
     for image_type in image_types:
         print(f"\n📷 Getting {image_type} images...")
-        images = KinopoiskImagesService.get_movie_images(kinopoisk_id, image_type)
+        images = asyncio.run(KinopoiskImagesService.get_movie_images(kinopoisk_id, image_type))
         
         if images:
             print(f"✅ Found {len(images)} {image_type} images")
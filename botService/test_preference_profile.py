@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Test the stored preference profile behind interest scoring"""
+import sys
+import json
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.models import Movie, UserVote
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, UserVoteRepository,
+    PreferenceProfileRepository, GenreRepository, LoadProfile,
+)
+from bot.services.matching import MatchingService
+from bot.utils.genres import split_genres, genres_mask
+
+VOTES = [
+    ("1", 1999, "FILM", "драма, криминал"),
+    ("2", 2010, "FILM", None),
+    ("3", None, "TV_SERIES", '["комедия", "драма"]'),
+    ("4", 1985, None, "боевик"),
+]
+
+
+def make_database(make_db, name: str = "profile.db"):
+    factory = make_db(name, instrument=True)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "viewer", "Viewer")
+        for kp_id, year, vote_type, genres in VOTES:
+            UserVoteRepository.upsert_vote(db, 1, kp_id, f"Movie {kp_id}", year, vote_type, 8, genres=genres)
+    return factory
+
+
+def reference_interest(db, user_id: int, movie: Movie) -> float:
+    """The per-call computation straight from user_votes, genres matched by name"""
+    rows = db.query(UserVote).filter(UserVote.user_id == user_id).all()
+    years = [r.year for r in rows if r.year is not None]
+    avg_year = sum(years) / len(years) if years else None
+    type_counts = {}
+    for r in rows:
+        if r.type:
+            type_counts[r.type] = type_counts.get(r.type, 0) + 1
+    type_score = type_counts.get(movie.type, 0) / len(rows) if rows and movie.type else 0.0
+    year_score = 1.0 - min(1.0, abs(movie.year - avg_year) / 30.0) if avg_year is not None and movie.year else 0.0
+    genre_counts = {}
+    for r in rows:
+        for genre in split_genres(r.genres):
+            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+    top = sorted(genre_counts, key=lambda g: (-genre_counts[g], g))[:Config.PROFILE_TOP_GENRES]
+    matched = [genre_counts[g] / len(rows) for g in top if g in split_genres(movie.genres)]
+    genre_score = min(1.0, sum(matched)) if matched else 0.0
+    return 0.5 * type_score + 0.2 * year_score + 0.3 * genre_score
+
+
+def profile_state(profile) -> tuple:
+    return (profile.vote_count, profile.year_sum, profile.year_count,
+            json.loads(profile.type_counts), json.loads(profile.genre_counts),
+            profile.genre_mask, json.loads(profile.top_genre_counts))
+
+
+def test_profile_is_maintained_incrementally(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        profile = PreferenceProfileRepository.get(db, 1)
+        assert profile_state(profile)[:5] == (
+            4, 1999 + 2010 + 1985, 3, {"FILM": 2, "TV_SERIES": 1},
+            {"драма": 2, "криминал": 1, "комедия": 1, "боевик": 1},
+        )
+    with unit_of_work(factory) as db:
+        # Changed year/type/genres replace the vote's old contribution
+        UserVoteRepository.upsert_vote(db, 1, "1", "Movie 1", 2001, "TV_SERIES", 9, genres="комедия")
+        UserVoteRepository.upsert_vote(db, 1, "5", "Movie 5", 2020, "FILM", 6)
+    with factory() as db:
+        incremental = profile_state(PreferenceProfileRepository.get(db, 1))
+        rebuilt = profile_state(PreferenceProfileRepository.rebuild(db, 1))
+        assert incremental == rebuilt
+        assert incremental[3] == {"FILM": 2, "TV_SERIES": 2}
+        assert "криминал" not in incremental[4]
+
+
+def test_bulk_upsert_matches_single_upserts(make_db):
+    single, bulk = make_database(make_db, "single.db"), make_database(make_db, "bulk.db")
+    page = [
+        {"kinopoisk_id": "1", "title": "Movie 1", "year": 2001, "movie_type": "TV_SERIES", "user_rating": 9, "genres": "комедия"},
+        # No genres: the stored ones are kept
+        {"kinopoisk_id": "4", "title": "Movie 4", "year": 1985, "movie_type": "FILM", "user_rating": 3},
+        {"kinopoisk_id": "5", "title": "Movie 5", "year": 2020, "movie_type": "FILM", "user_rating": 6},
+        {"kinopoisk_id": "6", "title": "Movie 6", "year": None, "movie_type": None, "user_rating": 7, "genres": "драма"},
+    ]
+    with unit_of_work(single) as db:
+        for vote in page:
+            UserVoteRepository.upsert_vote(db, 1, **vote)
+    with unit_of_work(bulk) as db:
+        # Lookup + upsert + profile + genre ids (select, insert of new ones), not per vote
+        with assert_max_queries(5):
+            result = UserVoteRepository.upsert_votes(db, 1, page)
+        assert result == (2, 2)
+    columns = (UserVote.kinopoisk_id, UserVote.title, UserVote.year, UserVote.type,
+               UserVote.user_rating, UserVote.genres)
+    with single() as one, bulk() as many:
+        assert one.query(*columns).order_by(UserVote.kinopoisk_id).all() == \
+            many.query(*columns).order_by(UserVote.kinopoisk_id).all()
+        assert many.query(UserVote.genres).filter(UserVote.kinopoisk_id == "4").scalar() == "боевик"
+        bulk_state = profile_state(PreferenceProfileRepository.get(many, 1))
+        assert bulk_state == profile_state(PreferenceProfileRepository.get(one, 1))
+        assert bulk_state == profile_state(PreferenceProfileRepository.rebuild(many, 1))
+    with unit_of_work(bulk) as db:
+        assert UserVoteRepository.upsert_votes(db, 1, []) == (0, 0)
+
+
+def test_interest_matches_former_formula(make_db):
+    factory = make_database(make_db)
+    candidates = (
+        (1999, "FILM", None), (2024, "TV_SERIES", "драма"), (None, "FILM", "криминал, драма, комедия"),
+        (1960, None, "мюзикл"),
+    )
+    with factory() as db:
+        for year, movie_type, genres in candidates:
+            genre_ids = GenreRepository.get_ids(db, split_genres(genres))
+            movie = Movie(title="Candidate", year=year, type=movie_type, genres=genres,
+                          genre_mask=genres_mask(genre_ids.values()))
+            assert MatchingService.compute_movie_interest(db, 1, movie) == reference_interest(db, 1, movie)
+        # Users without votes get zero interest
+        UserRepository.get_or_create(db, 2, "new", "New")
+        assert MatchingService.compute_movie_interest(db, 2, Movie(title="X", year=2000, type="FILM")) == 0.0
+
+
+def test_interest_ranking_reads_profile_once(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        for i in range(10):
+            movie = MovieRepository.create(db, title=f"Slot {i}", year=1980 + 4 * i, kinopoisk_id=str(100 + i))
+            movie.type = "movie" if i % 2 else "series"
+            SlotRepository.create(db, movie.id, 1, datetime.utcnow() + timedelta(days=1))
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.LIST_CARD)
+        with assert_max_queries(1):
+            scored = MatchingService.annotate_slots_by_interest(db, 1, slots, {"100"})
+        assert len(scored) == 9
+        assert all(score == reference_interest(db, 1, slot.movie) for slot, score in scored)
+
+
+def test_migration_backfills_profiles(migrated_db):
+    url = migrated_db("20261016_000007", "backfill.db")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, first_name, rating, total_ratings, created_at) VALUES (1, 'A', 0, 0, CURRENT_TIMESTAMP)"))
+        for kp_id, year, vote_type, genres in VOTES:
+            conn.execute(
+                text("INSERT INTO user_votes (user_id, kinopoisk_id, year, type, user_rating, genres) VALUES (1, :kp, :year, :type, 8, :genres)"),
+                {"kp": kp_id, "year": year, "type": vote_type, "genres": genres},
+            )
+    engine.dispose()
+    migrated_db("head", "backfill.db")
+    engine = create_engine(url)
+    factory = sessionmaker(bind=engine)
+    with factory() as db:
+        migrated = profile_state(PreferenceProfileRepository.get(db, 1))
+        assert migrated == profile_state(PreferenceProfileRepository.rebuild(db, 1))
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Test per-update statement counting and the query budget helpers"""
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import (
+    instrument_engine, query_scope, current_stats, track_queries, assert_max_queries,
+)
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository, LoadProfile,
+)
+from bot.database.async_repositories import AsyncSlotRepository
+from bot.database.user_cache import user_cache
+from bot.utils.states import set_state
+import bot.handlers.recommend as recommend_module
+import bot.handlers.movie as movie_module
+
+
+def make_database(make_db, slot_count: int = 3):
+    """Instrumented SQLite database with open slots of different movies"""
+    factory = make_db("budget.db", instrument=True)
+    with factory() as db:
+        creator = UserRepository.get_or_create(db, 1, "creator", "Creator")
+        UserRepository.get_or_create(db, 2, "viewer", "Viewer")
+        for i in range(slot_count):
+            movie = MovieRepository.create(db, title=f"Movie {i}", year=2000 + i, kinopoisk_id=str(100 + i))
+            slot = SlotRepository.create(
+                db, movie.id, creator.id, datetime.utcnow() + timedelta(days=1, hours=i), min_participants=2
+            )
+            SlotParticipantRepository.add_participant(db, slot.id, creator.id)
+    return factory.kw["bind"].url.database, factory
+
+
+def fake_parse_url(movie_data: dict):
+    """Stand-in for MovieParser.parse_url that returns movie_data without the API"""
+    async def parse_url(url, db=None):
+        return movie_data
+    return parse_url
+
+
+def test_assert_max_queries_counts_statements(make_db):
+    _, factory = make_database(make_db)
+    with factory() as db:
+        with assert_max_queries(2) as stats:
+            SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        assert stats.count == 2
+        try:
+            with assert_max_queries(1):
+                SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        except AssertionError as e:
+            assert "at most 1 queries, got 2" in str(e)
+        else:
+            raise AssertionError("budget overrun not reported")
+
+
+def test_statements_outside_scope_are_not_counted(make_db):
+    _, factory = make_database(make_db)
+    with factory() as db:
+        with query_scope() as stats:
+            pass
+        SlotRepository.get_all_open(db)
+        assert stats.count == 0
+
+
+def test_failed_statement_leaves_no_start_time(make_db):
+    _, factory = make_database(make_db)
+    with factory.kw["bind"].connect() as conn:
+        with query_scope() as stats:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM missing_table"))
+            assert conn.info["query_start"] == []
+            conn.execute(text("SELECT 1"))
+        assert conn.info["query_start"] == []
+    assert stats.count == 1
+
+
+def test_async_sessions_are_counted(make_db):
+    db_path, _ = make_database(make_db)
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        instrument_engine(async_engine.sync_engine)
+        factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+        try:
+            async with factory() as db:
+                with query_scope() as stats:
+                    await AsyncSlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+            return stats
+        finally:
+            await async_engine.dispose()
+
+    stats = asyncio.run(run())
+    assert stats.count == 2
+    assert stats.db_time > 0
+
+
+def test_concurrent_updates_are_counted_separately(make_db, fake_update):
+    _, factory = make_database(make_db)
+    seen = {}
+
+    @track_queries
+    async def handler(update, context):
+        with factory() as db:
+            for _ in range(update.update_id):
+                UserRepository.get_by_id(db, 1)
+                await asyncio.sleep(0)
+            seen[update.update_id] = current_stats()
+
+    async def run():
+        await asyncio.gather(handler(fake_update(1, update_id=2), None), handler(fake_update(1, update_id=5), None))
+
+    asyncio.run(run())
+    assert seen[2].count == 2 and seen[2].handler == "handler"
+    assert seen[5].count == 5
+
+
+def test_budget_overrun_is_logged(make_db, fake_update):
+    _, factory = make_database(make_db)
+    records = []
+    log_handler = logging.Handler()
+    log_handler.emit = records.append
+    instrumentation_logger = logging.getLogger("bot.database.instrumentation")
+    instrumentation_logger.addHandler(log_handler)
+    old_budget = Config.QUERY_BUDGET
+    Config.QUERY_BUDGET = 1
+
+    @track_queries
+    async def chatty_handler(update, context):
+        with factory() as db:
+            UserRepository.get_by_id(db, 1)
+            UserRepository.get_by_id(db, 2)
+
+    try:
+        asyncio.run(chatty_handler(fake_update(1, update_id=42), None))
+    finally:
+        Config.QUERY_BUDGET = old_budget
+        instrumentation_logger.removeHandler(log_handler)
+    messages = [r.getMessage() for r in records if r.levelno == logging.WARNING]
+    assert len(messages) == 1
+    assert "update=42" in messages[0] and "handler=chatty_handler" in messages[0]
+    assert "queries=2/1" in messages[0]
+
+
+def test_recommend_command_query_budget(make_db, use_db, fake_update):
+    _, factory = make_database(make_db, slot_count=3)
+    use_db(factory, recommend_module)
+    # The first /recommend builds the user's feed
+    asyncio.run(recommend_module.recommend_command(fake_update(2, update_id=1), None))
+    update = fake_update(2)
+    # Feed check + one page read, independent of the slot count
+    with assert_max_queries(2):
+        asyncio.run(recommend_module.recommend_command(update, None))
+    assert "Рекомендованные слоты" in update.message.replies[0]
+
+
+def movie_url_queries(make_db, use_db, fake_update, monkeypatch, slot_count: int) -> int:
+    """Statements of handle_movie_url for a movie with slot_count open slots of 3 users each"""
+    factory = make_db(f"movie_url_{slot_count}.db", instrument=True)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "viewer", "Viewer")
+        movie = MovieRepository.create(db, title="Popular", year=2020, kinopoisk_id="777")
+        for i in range(slot_count):
+            slot = SlotRepository.create(
+                db, movie.id, 100 + 3 * i, datetime.utcnow() + timedelta(days=1, hours=i),
+                min_participants=5, max_participants=10,
+            )
+            for user_id in range(100 + 3 * i, 103 + 3 * i):
+                UserRepository.get_or_create(db, user_id, f"u{user_id}", f"U {user_id}")
+                SlotParticipantRepository.add_participant(db, slot.id, user_id)
+    user_cache.clear()
+
+    monkeypatch.setattr(movie_module.MovieParser, "parse_url",
+                        staticmethod(fake_parse_url({"title": "Popular", "kinopoisk_id": "777"})))
+    use_db(factory, movie_module)
+    update = fake_update(1, "https://www.kinopoisk.ru/film/777/")
+    set_state(1, "waiting_for_movie_url")
+    with query_scope() as stats:
+        asyncio.run(movie_module.handle_movie_url(update, None))
+    assert "Доступные слоты" in update.message.replies[0]
+    return stats.count
+
+
+def test_movie_url_query_count_is_independent_of_slots(make_db, use_db, fake_update, monkeypatch):
+    fixtures = (make_db, use_db, fake_update, monkeypatch)
+    # Participants' votes and ratings are loaded with one IN query each
+    assert movie_url_queries(*fixtures, 5) == movie_url_queries(*fixtures, 50)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Query-plan test: every repository read must be served by an index.
+
+The schema is built with the Alembic migrations (not create_all) so the
+test checks the indexes that production databases actually have. Each
+repository query is captured with a cursor event and re-run under EXPLAIN:
+
+- SQLite: always, on a temporary file. A plan step ``SCAN <table>`` without
+  an index is a full scan.
+- Postgres: only when TEST_POSTGRES_URL points to an empty scratch database.
+  ``enable_seqscan`` is turned off so a remaining ``Seq Scan`` means there is
+  no usable index (tiny test tables would otherwise always be seq-scanned).
+"""
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.session import Base
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    RoomRepository, RatingRepository, EpisodeRepository, CommentRepository,
+    LikeRepository, WatchHistoryRepository, UserKinopoiskRepository, UserVoteRepository,
+)
+from bot.constants import MovieType
+
+
+def migrate(url: str, revision: str = "head"):
+    """Run Alembic migrations against url"""
+    cfg = AlembicConfig(str(project_root / "alembic.ini"))
+    cfg.cmd_opts = argparse.Namespace(x=[f"db_url={url}"])
+    if revision == "base":
+        command.downgrade(cfg, revision)
+    else:
+        command.upgrade(cfg, revision)
+
+
+def seed(db) -> dict:
+    """Create a small connected data set and return the ids"""
+    user = UserRepository.get_or_create(db, 1001, "alice", "Alice")
+    other = UserRepository.get_or_create(db, 1002, "bob", "Bob")
+    movie = MovieRepository.create(db, title="Movie", year=2010, kinopoisk_id="447301", imdb_id="tt1375666")
+    series = MovieRepository.create(db, title="Series", movie_type=MovieType.SERIES, kinopoisk_id="404900")
+    slot = SlotRepository.create(db, movie.id, user.id, datetime.utcnow() + timedelta(days=1), min_participants=2)
+    SlotParticipantRepository.add_participant(db, slot.id, user.id)
+    SlotParticipantRepository.add_participant(db, slot.id, other.id)
+    room = RoomRepository.create(db, slot.id)
+    RatingRepository.create(db, room.id, user.id, other.id, 5)
+    episode = EpisodeRepository.create(db, series.id, 1, 1, title="Pilot")
+    comment = CommentRepository.create(db, room.id, user.id, "Hi", episode_id=episode.id)
+    LikeRepository.toggle_like(db, comment.id, other.id)
+    WatchHistoryRepository.create_or_update(db, user.id, movie.id, room_id=room.id, completed=1)
+    UserKinopoiskRepository.set_kp_user_id(db, user.id, "777")
+    UserVoteRepository.upsert_vote(db, user.id, "447301", "Movie", 2010, "FILM", 9)
+    return {
+        "user": user.id, "other": other.id, "movie": movie.id, "series": series.id,
+        "slot": slot.id, "room": room.id, "episode": episode.id, "comment": comment.id,
+    }
+
+
+# Every read path of the repositories, including the lazy loads handlers trigger
+REPOSITORY_READS = [
+    ("UserRepository.get_by_id", lambda db, ids: UserRepository.get_by_id(db, ids["user"])),
+    ("UserRepository.update_rating", lambda db, ids: UserRepository.update_rating(db, ids["other"])),
+    ("MovieRepository.get_by_id", lambda db, ids: MovieRepository.get_by_id(db, ids["movie"])),
+    ("MovieRepository.find_by_kinopoisk_id", lambda db, ids: MovieRepository.find_by_kinopoisk_id(db, "447301")),
+    ("MovieRepository.find_by_imdb_id", lambda db, ids: MovieRepository.find_by_imdb_id(db, "tt1375666")),
+    ("SlotRepository.get_by_id", lambda db, ids: SlotRepository.get_by_id(db, ids["slot"])),
+    ("SlotRepository.get_by_movie", lambda db, ids: SlotRepository.get_by_movie(db, ids["movie"])),
+    ("SlotRepository.get_all_open", lambda db, ids: SlotRepository.get_all_open(db)),
+    ("SlotRepository.get_by_creator", lambda db, ids: SlotRepository.get_by_creator(db, ids["user"])),
+    ("SlotRepository.get_user_participations", lambda db, ids: SlotRepository.get_user_participations(db, ids["other"])),
+    ("Slot lazy loads", lambda db, ids: [
+        (p.user.first_name, s.movie.title, s.room)
+        for s in [SlotRepository.get_by_id(db, ids["slot"])] for p in s.participants
+    ]),
+    ("SlotParticipantRepository.get_participants_count",
+     lambda db, ids: SlotParticipantRepository.get_participants_count(db, ids["slot"])),
+    ("RoomRepository.get_by_slot_id", lambda db, ids: RoomRepository.get_by_slot_id(db, ids["slot"])),
+    ("RoomRepository.get_user_rooms", lambda db, ids: RoomRepository.get_user_rooms(db, ids["other"])),
+    ("RatingRepository.has_rated", lambda db, ids: RatingRepository.has_rated(db, ids["room"], ids["user"], ids["other"])),
+    ("RatingRepository.get_room_participants_to_rate",
+     lambda db, ids: RatingRepository.get_room_participants_to_rate(db, ids["room"], ids["other"])),
+    ("EpisodeRepository.get_by_id", lambda db, ids: EpisodeRepository.get_by_id(db, ids["episode"])),
+    ("EpisodeRepository.get_by_series", lambda db, ids: EpisodeRepository.get_by_series(db, ids["series"])),
+    ("EpisodeRepository.get_by_series_season", lambda db, ids: EpisodeRepository.get_by_series_season(db, ids["series"], 1)),
+    ("EpisodeRepository.find_by_series_season_episode",
+     lambda db, ids: EpisodeRepository.find_by_series_season_episode(db, ids["series"], 1, 1)),
+    ("CommentRepository.get_by_id", lambda db, ids: CommentRepository.get_by_id(db, ids["comment"])),
+    ("CommentRepository.get_by_room", lambda db, ids: CommentRepository.get_by_room(db, ids["room"], limit=10)),
+    ("CommentRepository.get_by_episode", lambda db, ids: CommentRepository.get_by_episode(db, ids["episode"])),
+    ("CommentRepository.get_replies", lambda db, ids: CommentRepository.get_replies(db, ids["comment"])),
+    ("LikeRepository.has_liked", lambda db, ids: LikeRepository.has_liked(db, ids["comment"], ids["other"])),
+    ("LikeRepository.get_likes_count", lambda db, ids: LikeRepository.get_likes_count(db, ids["comment"])),
+    ("LikeRepository.get_likes_for_comment", lambda db, ids: LikeRepository.get_likes_for_comment(db, ids["comment"])),
+    ("WatchHistoryRepository.get_user_history", lambda db, ids: WatchHistoryRepository.get_user_history(db, ids["user"], 10)),
+    ("WatchHistoryRepository.get_by_movie", lambda db, ids: WatchHistoryRepository.get_by_movie(db, ids["user"], ids["movie"])),
+    ("WatchHistoryRepository.get_by_episode", lambda db, ids: WatchHistoryRepository.get_by_episode(db, ids["user"], ids["episode"])),
+    ("WatchHistoryRepository.get_completed_count", lambda db, ids: WatchHistoryRepository.get_completed_count(db, ids["user"])),
+    ("UserKinopoiskRepository.get_by_user_id", lambda db, ids: UserKinopoiskRepository.get_by_user_id(db, ids["user"])),
+    ("UserVoteRepository.get_user_votes_map", lambda db, ids: UserVoteRepository.get_user_votes_map(db, ids["user"])),
+]
+
+
+def capture_selects(engine, session_factory, ids) -> list:
+    """Run every repository read and collect (name, statement, parameters)"""
+    captured = []
+    current = {"name": None}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((current["name"], statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        for name, read in REPOSITORY_READS:
+            current["name"] = name
+            with session_factory() as db:
+                read(db, ids)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def sqlite_full_scans(conn, statement, parameters, tables) -> list:
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables and "INDEX" not in detail:
+            scans.append(detail)
+    return scans
+
+
+def postgres_full_scans(conn, statement, parameters, tables) -> list:
+    conn.exec_driver_sql("SET enable_seqscan = off")
+    plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+    stack = [plan[0]["Plan"]]
+    while stack:
+        node = stack.pop()
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in tables:
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        stack.extend(node.get("Plans", []))
+    return scans
+
+
+def check_backend(url: str) -> list:
+    """Return a list of 'query -> full scan' failures for one database"""
+    migrate(url)
+    engine = create_engine(url)
+    try:
+        session_factory = sessionmaker(bind=engine, autoflush=False)
+        with session_factory() as db:
+            ids = seed(db)
+        captured = capture_selects(engine, session_factory, ids)
+        tables = set(Base.metadata.tables)
+        detect = sqlite_full_scans if engine.dialect.name == "sqlite" else postgres_full_scans
+        failures = []
+        with engine.connect() as conn:
+            for name, statement, parameters in captured:
+                for scan in detect(conn, statement, parameters, tables):
+                    failures.append(f"{engine.dialect.name}: {name}: {scan}\n    {statement}")
+        return failures
+    finally:
+        engine.dispose()
+        if not url.startswith("sqlite"):
+            migrate(url, "base")
+
+
+def backend_urls(tmp_path) -> list:
+    urls = [f"sqlite:///{tmp_path / 'plans.db'}"]
+    if os.getenv("TEST_POSTGRES_URL"):
+        urls.append(os.environ["TEST_POSTGRES_URL"])
+    return urls
+
+
+def test_repository_queries_use_indexes(tmp_path):
+    failures = []
+    for url in backend_urls(tmp_path):
+        failures.extend(check_backend(url))
+    assert not failures, "Full table scans found:\n" + "\n".join(failures)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
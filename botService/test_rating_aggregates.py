@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Test incremental user rating aggregates and their reconciliation"""
+import sys
+import asyncio
+from functools import partial
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from bot.database.session import unit_of_work, async_unit_of_work
+from bot.database.instrumentation import query_scope
+from bot.database.models import User
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, RoomRepository,
+)
+from bot.services.rating_service import RatingService
+import bot.handlers.rating as rating_module
+
+RATERS = 30
+
+
+def make_database(make_db):
+    """SQLite database with one room, a rated user (1) and RATERS raters"""
+    factory = make_db("ratings.db", instrument=True)
+    with unit_of_work(factory) as db:
+        for user_id in range(1, RATERS + 2):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        movie = MovieRepository.create(db, title="Movie", year=2020)
+        slot = SlotRepository.create(db, movie.id, 1, datetime.utcnow() + timedelta(days=1))
+        room_id = RoomRepository.create(db, slot.id).id
+    return factory, room_id
+
+
+def loads_received_ratings(statement: str) -> bool:
+    """SELECT over all ratings of a rated user (the old O(n) recompute)"""
+    select_list, _, rest = statement.partition("FROM ratings")
+    return select_list.lstrip().startswith("SELECT ratings.id") and rest.strip() == "WHERE ratings.rated_id = ?"
+
+
+def test_rating_updates_running_aggregates(make_db):
+    factory, room_id = make_database(make_db)
+    scores = [(rater_id % 5) + 1 for rater_id in range(2, RATERS + 2)]
+    statements_per_rating = []
+    for rater_id, score in zip(range(2, RATERS + 2), scores):
+        with unit_of_work(factory) as db, query_scope() as stats:
+            assert RatingService.create_rating(db, room_id, rater_id, 1, score)
+        statements_per_rating.append(stats.count)
+        assert not [s for s in stats.statements if loads_received_ratings(s)], stats.statements
+    # Cost of a rating does not grow with the number of ratings received
+    assert len(set(statements_per_rating)) == 1, statements_per_rating
+    with factory() as db:
+        user = UserRepository.get_by_id(db, 1)
+        assert user.rating_sum == sum(scores)
+        assert user.total_ratings == len(scores)
+        assert abs(user.rating - sum(scores) / len(scores)) < 1e-9
+
+
+def test_aggregates_visible_in_same_session(make_db):
+    factory, room_id = make_database(make_db)
+    with factory() as db:
+        user = UserRepository.get_by_id(db, 1)
+        assert user.total_ratings == 0
+        RatingService.create_rating(db, room_id, 2, 1, 4)
+        RatingService.create_rating(db, room_id, 3, 1, 5)
+        assert (user.rating_sum, user.total_ratings, user.rating) == (9, 2, 4.5)
+
+
+def test_rating_survives_failed_message_edit(make_db, fake_update, monkeypatch):
+    factory, room_id = make_database(make_db)
+    update = fake_update(2, callback_data=f"rate_user:{room_id}:1:5")
+
+    async def edit_fails(*args, **kwargs):
+        raise TimeoutError("Telegram timed out")
+
+    monkeypatch.setattr(update.callback_query, "edit_message_text", edit_fails)
+
+    async def rate():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{factory.kw['bind'].url.database}")
+        async_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        monkeypatch.setattr(rating_module, "async_unit_of_work", partial(async_unit_of_work, async_factory))
+        try:
+            with pytest.raises(TimeoutError):
+                await rating_module.rate_user_callback(update, None)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(rate())
+    # The rating was committed before the message edit
+    with factory() as db:
+        assert UserRepository.get_by_id(db, 1).total_ratings == 1
+
+
+def test_reconciliation_repairs_drift(make_db):
+    factory, room_id = make_database(make_db)
+    with unit_of_work(factory) as db:
+        RatingService.create_rating(db, room_id, 2, 1, 5)
+        RatingService.create_rating(db, room_id, 3, 1, 3)
+    with factory() as db:
+        assert RatingService.reconcile_aggregates(db) == []
+        # Simulate drift: aggregates written by a buggy path
+        db.query(User).filter(User.id == 1).update({User.rating_sum: 100, User.total_ratings: 7})
+        db.query(User).filter(User.id == 2).update({User.total_ratings: 1})
+        db.commit()
+    with unit_of_work(factory) as db:
+        assert sorted(RatingService.reconcile_aggregates(db)) == [1, 2]
+    with factory() as db:
+        rated = UserRepository.get_by_id(db, 1)
+        assert (rated.rating_sum, rated.total_ratings, rated.rating) == (8, 2, 4.0)
+        rater = UserRepository.get_by_id(db, 2)
+        assert (rater.rating_sum, rater.total_ratings) == (0, 0)
+        assert RatingService.reconcile_aggregates(db) == []
+
+
+def test_migration_backfills_rating_sum(migrated_db):
+    url = migrated_db("20261016_000006", "backfill.db")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, first_name, rating, total_ratings, created_at) VALUES (1, 'A', 0, 0, CURRENT_TIMESTAMP), (2, 'B', 0, 0, CURRENT_TIMESTAMP), (3, 'C', 0, 0, CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO movies (id, title, type, created_at) VALUES (1, 'Movie', 'movie', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO slots (id, movie_id, creator_id, datetime, min_participants, status, created_at) VALUES (1, 1, 1, CURRENT_TIMESTAMP, 2, 'full', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO rooms (id, slot_id, status, created_at) VALUES (1, 1, 'active', CURRENT_TIMESTAMP)"))
+        conn.execute(text("INSERT INTO ratings (room_id, rater_id, rated_id, score, created_at) VALUES (1, 2, 1, 5, CURRENT_TIMESTAMP), (1, 3, 1, 2, CURRENT_TIMESTAMP)"))
+    engine.dispose()
+    migrated_db("20261016_000007", "backfill.db")
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, rating_sum, total_ratings, rating FROM users ORDER BY id")).fetchall()
+    engine.dispose()
+    assert [tuple(r) for r in rows] == [(1, 7, 2, 3.5), (2, 0, 0, 0.0), (3, 0, 0, 0.0)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Test routing of read-only sessions to a replica with read-your-writes"""
+import sys
+import time
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.routing import ReadRouter, REPLICA, bind_user, record_write, wrote_recently
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+)
+
+
+def make_factory(make_db, name: str):
+    """SQLite file standing in for a database server; returns (path, factory)"""
+    factory = make_db(f"{name}.db")
+    return factory.kw["bind"].url.database, factory
+
+
+def seed(factory, title: str) -> int:
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 1, "creator", "Creator")
+        movie = MovieRepository.create(db, title=title, year=2020)
+        return SlotRepository.create(db, movie.id, 1, datetime.utcnow() + timedelta(days=1)).id
+
+
+def test_reads_go_to_replica_without_recent_writes(make_db):
+    _, primary = make_factory(make_db, "primary")
+    _, replica = make_factory(make_db, "replica")
+    router = ReadRouter(primary, replica)
+    db = router.open(5001)
+    try:
+        assert db.info.get(REPLICA)
+    finally:
+        db.close()
+    # Without a replica everything is read from the primary
+    db = ReadRouter(primary).open(5001)
+    try:
+        assert not db.info.get(REPLICA)
+    finally:
+        db.close()
+
+
+def test_own_writes_are_read_from_primary_within_window(make_db, fake_update):
+    _, primary = make_factory(make_db, "primary")
+    _, replica = make_factory(make_db, "replica")
+    slot_id = seed(primary, "Movie")
+    seed(replica, "Movie")
+    router = ReadRouter(primary, replica)
+    old_window = Config.READ_YOUR_WRITES_SECONDS
+    Config.READ_YOUR_WRITES_SECONDS = 0.2
+
+    @bind_user
+    async def join_handler(update, context):
+        with unit_of_work(primary) as db:
+            UserRepository.get_or_create(db, update.effective_user.id, "joiner", "Joiner")
+            SlotParticipantRepository.join(db, slot_id, update.effective_user.id)
+
+    @bind_user
+    async def read_only_handler(update, context):
+        with unit_of_work(primary) as db:
+            UserRepository.get_by_id(db, 1)
+
+    try:
+        asyncio.run(read_only_handler(fake_update(5002), None))
+        assert not wrote_recently(5002)
+        asyncio.run(join_handler(fake_update(5002), None))
+        assert wrote_recently(5002)
+        # The joiner sees their own participation although the replica lags
+        db = router.open(5002)
+        try:
+            assert not db.info.get(REPLICA)
+            assert SlotRepository.get_by_id(db, slot_id).participant_count == 1
+        finally:
+            db.close()
+        # Other users keep reading from the replica
+        db = router.open(5003)
+        try:
+            assert db.info.get(REPLICA)
+        finally:
+            db.close()
+        time.sleep(0.25)
+        db = router.open(5002)
+        try:
+            assert db.info.get(REPLICA)
+        finally:
+            db.close()
+    finally:
+        Config.READ_YOUR_WRITES_SECONDS = old_window
+
+
+def test_unreachable_replica_falls_back_to_primary(make_db):
+    _, primary = make_factory(make_db, "primary")
+    broken = sessionmaker(bind=create_engine("sqlite:////nonexistent-dir/replica.db"))
+    router = ReadRouter(primary, broken)
+    db = router.open(5004)
+    try:
+        assert not db.info.get(REPLICA)
+        assert UserRepository.get_by_id(db, 1) is None
+    finally:
+        db.close()
+    # The replica is not retried until REPLICA_RETRY_SECONDS pass
+    assert not router.use_replica(router.replica, 5004)
+
+
+def test_async_sessions_are_routed(make_db):
+    primary_path, _ = make_factory(make_db, "primary")
+    replica_path, _ = make_factory(make_db, "replica")
+
+    async def run():
+        engines = [
+            create_async_engine(f"sqlite+aiosqlite:///{primary_path}"),
+            create_async_engine(f"sqlite+aiosqlite:///{replica_path}"),
+        ]
+        router = ReadRouter(
+            None, None,
+            async_sessionmaker(bind=engines[0], expire_on_commit=False),
+            async_sessionmaker(bind=engines[1], expire_on_commit=False),
+        )
+        try:
+            async with router.async_session(5005) as db:
+                before = db.info.get(REPLICA)
+            record_write(5005)
+            async with router.async_session(5005) as db:
+                after = db.info.get(REPLICA)
+            return before, after
+        finally:
+            for engine in engines:
+                await engine.dispose()
+
+    assert asyncio.run(run()) == (True, None)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Test SQL-side candidate filtering and keyset pagination for /recommend"""
+import sys
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    UserVoteRepository, PreferenceProfileRepository,
+)
+from bot.constants import SlotStatus
+from bot.services.matching import MatchingService
+import bot.handlers.recommend as recommend_module
+
+VIEWER = 1
+CANDIDATES = 25
+
+
+def make_database(make_db):
+    """CANDIDATES recommendable slots plus one of each excluded kind"""
+    factory = make_db("recommend.db", instrument=True)
+    soon = datetime.utcnow() + timedelta(days=1)
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, VIEWER, "viewer", "Viewer")
+        UserRepository.get_or_create(db, 2, "creator", "Creator")
+        for kp_id, year in (("900", 1995), ("901", 2001), ("902", 2003)):
+            UserVoteRepository.upsert_vote(db, VIEWER, kp_id, None, year, "movie", 8)
+        for i in range(CANDIDATES):
+            movie = MovieRepository.create(db, title=f"Movie {i}", year=1960 + 3 * i, kinopoisk_id=str(i))
+            SlotRepository.create(db, movie.id, 2, soon + timedelta(hours=i))
+        watched = MovieRepository.create(db, title="Watched", year=2000, kinopoisk_id="900")
+        SlotRepository.create(db, watched.id, 2, soon)
+        other = MovieRepository.create(db, title="Other", year=2000, kinopoisk_id="500")
+        SlotRepository.create(db, other.id, 2, datetime.now() - timedelta(hours=1))
+        full = SlotRepository.create(db, other.id, 2, soon)
+        full.status = SlotStatus.FULL
+        joined = SlotRepository.create(db, other.id, 2, soon)
+        SlotParticipantRepository.add_participant(db, joined.id, VIEWER)
+    return factory
+
+
+def all_pages(db, page_size: int):
+    pages, cursor = [], None
+    while True:
+        scored, cursor = MatchingService.recommend(db, VIEWER, page_size, cursor)
+        pages.append(scored)
+        if cursor is None:
+            return pages
+
+
+def test_candidates_are_filtered_in_sql(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        [page] = all_pages(db, 100)
+        titles = {slot.movie.title for slot, _ in page}
+        assert titles == {f"Movie {i}" for i in range(CANDIDATES)}
+
+
+def test_pages_cover_candidates_once_in_score_order(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        pages = all_pages(db, 7)
+        assert [len(p) for p in pages] == [7, 7, 7, 4]
+        slot_ids = [slot.id for page in pages for slot, _ in page]
+        assert len(slot_ids) == len(set(slot_ids)) == CANDIDATES
+        scores = [score for page in pages for _, score in page]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_sql_score_matches_movie_interest(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, VIEWER))
+        rows = SlotRepository.get_recommendation_candidates(db, VIEWER, MatchingService.interest_sql(stats), 100)
+        assert len(rows) == CANDIDATES
+        for slot, cheap in rows:
+            assert abs(cheap - MatchingService.movie_interest(stats, slot.movie)) < 1e-9
+
+
+def test_started_slots_are_compared_in_local_time(make_db, behind_utc):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        tonight = MovieRepository.create(db, title="Tonight", year=2000, kinopoisk_id="600")
+        # Slot times are local; this one is an hour ahead of the local clock but behind UTC
+        SlotRepository.create(db, tonight.id, 2, datetime.now() + timedelta(hours=1))
+    with factory() as db:
+        stats = MatchingService.preference_stats(PreferenceProfileRepository.get(db, VIEWER))
+        rows = SlotRepository.get_recommendation_candidates(db, VIEWER, MatchingService.interest_sql(stats), 100)
+        titles = {slot.movie.title for slot, _ in rows}
+        assert "Tonight" in titles and "Other" not in titles
+
+
+def test_page_cost_does_not_grow_with_slot_count(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        with assert_max_queries(2):
+            scored, cursor = MatchingService.recommend(db, VIEWER, 5)
+        with assert_max_queries(2):
+            MatchingService.recommend(db, VIEWER, 5, cursor)
+        # Slot.movie comes from the candidate query itself
+        with assert_max_queries(0):
+            [slot.movie.title for slot, _ in scored]
+
+
+def test_more_button_pages_through_recommendations(make_db, use_db, fake_update, monkeypatch):
+    factory = make_database(make_db)
+    use_db(factory, recommend_module)
+    monkeypatch.setattr(recommend_module.Config, "RECOMMEND_PAGE_SIZE", 20)
+    update = fake_update(VIEWER)
+    asyncio.run(recommend_module.recommend_command(update, None))
+    text, markup = update.message.replies[0], update.message.markups[0]
+    more = markup.inline_keyboard[-1][0]
+    assert more.callback_data.startswith("recommend_page:") and text.count("\n") == 21
+
+    page = fake_update(VIEWER, callback_data=more.callback_data)
+    asyncio.run(recommend_module.recommend_page_callback(page, None))
+    query = page.callback_query
+    text, markup = query.edits[0], query.markups[0]
+    assert text.splitlines()[2].startswith("21. ")
+    assert len(markup.inline_keyboard) == CANDIDATES - 20
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Test the materialized recommendation feed and its incremental updates"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.models import Slot, RecommendationFeedItem
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    UserVoteRepository, RecommendationFeedRepository,
+)
+from bot.services.matching import MatchingService
+from bot.services.recommendation_feed import RecommendationFeedService
+
+VIEWER, OTHER, NO_FEED, CREATOR = 1, 2, 3, 4
+
+
+def make_database(make_db, slot_count: int = 12):
+    factory = make_db("feed.db", instrument=True)
+    with unit_of_work(factory) as db:
+        for user_id in (VIEWER, OTHER, NO_FEED, CREATOR):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+        for user_id, year in ((VIEWER, 1990), (OTHER, 2015)):
+            UserVoteRepository.upsert_vote(db, user_id, f"v{user_id}", None, year, "movie", 7)
+        for i in range(slot_count):
+            create_slot(db, f"Movie {i}", 1960 + 5 * i, str(i))
+    with unit_of_work(factory) as db:
+        RecommendationFeedService.build(db, VIEWER)
+        RecommendationFeedService.build(db, OTHER)
+    return factory
+
+
+def create_slot(db, title: str, year: int, kinopoisk_id: str, min_participants: int = 3) -> Slot:
+    """Like handle_min_participants: create, creator joins, feeds are updated"""
+    movie = MovieRepository.create(db, title=title, year=year, kinopoisk_id=kinopoisk_id)
+    slot = SlotRepository.create(db, movie.id, CREATOR, datetime.utcnow() + timedelta(days=1),
+                                 min_participants=min_participants, max_participants=min_participants)
+    result = SlotParticipantRepository.join(db, slot.id, CREATOR)
+    RecommendationFeedService.on_slot_created(db, result.slot)
+    RecommendationFeedService.on_joined(db, result, CREATOR)
+    return result.slot
+
+
+def feed_titles(db, user_id: int) -> list:
+    page, _ = RecommendationFeedService.page(db, user_id, 1000)
+    return [slot.movie.title for slot, _ in page]
+
+
+def test_built_feed_matches_ranking(make_db):
+    factory = make_database(make_db)
+    with factory() as db:
+        pages, cursor = [], None
+        while True:
+            scored, cursor = MatchingService.recommend(db, VIEWER, 5, cursor)
+            pages.extend(scored)
+            if cursor is None:
+                break
+        feed, _ = RecommendationFeedService.page(db, VIEWER, 1000)
+        assert [(slot.id, score) for slot, score in feed] == [(slot.id, score) for slot, score in pages]
+        assert not RecommendationFeedRepository.exists(db, NO_FEED)
+
+
+def test_paging_stops_at_feed_size(make_db, monkeypatch):
+    factory = make_database(make_db)
+    monkeypatch.setattr(Config, "RECOMMEND_FEED_SIZE", 5)
+    with unit_of_work(factory) as db:
+        RecommendationFeedService.build(db, VIEWER)
+    with factory() as db:
+        pages, cursor = [], None
+        while True:
+            scored, cursor = RecommendationFeedService.page(db, VIEWER, 2, cursor)
+            pages.extend(scored)
+            if cursor is None:
+                break
+        best, _ = MatchingService.recommend(db, VIEWER, 5)
+        # The 12 open slots are cut to the 5 best
+        assert [slot.id for slot, _ in pages] == [slot.id for slot, _ in best]
+
+
+def test_new_slot_reaches_existing_feeds(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        create_slot(db, "Fresh", 1991, "777")
+        create_slot(db, "Seen", 2015, f"v{OTHER}")
+    with factory() as db:
+        assert "Fresh" in feed_titles(db, VIEWER) and "Fresh" in feed_titles(db, OTHER)
+        # Voted movies and users without a feed are skipped
+        assert "Seen" in feed_titles(db, VIEWER) and "Seen" not in feed_titles(db, OTHER)
+        assert db.query(RecommendationFeedItem).filter(RecommendationFeedItem.user_id.in_([NO_FEED, CREATOR])).count() == 0
+        # The viewer's ranking stays ordered by score
+        feed, _ = RecommendationFeedService.page(db, VIEWER, 1000)
+        assert [score for _, score in feed] == sorted((score for _, score in feed), reverse=True)
+
+
+def test_join_fill_and_leave_update_feeds(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        slot_id = create_slot(db, "Small", 1990, "555", min_participants=3).id
+    with unit_of_work(factory) as db:
+        RecommendationFeedService.on_joined(db, SlotParticipantRepository.join(db, slot_id, VIEWER), VIEWER)
+    with factory() as db:
+        assert "Small" not in feed_titles(db, VIEWER) and "Small" in feed_titles(db, OTHER)
+    with unit_of_work(factory) as db:
+        SlotParticipantRepository.remove_participant(db, slot_id, VIEWER)
+        RecommendationFeedService.on_left(db, SlotRepository.get_by_id(db, slot_id), VIEWER)
+    with factory() as db:
+        assert "Small" in feed_titles(db, VIEWER)
+    with unit_of_work(factory) as db:
+        for user_id in (VIEWER, NO_FEED):
+            RecommendationFeedService.on_joined(db, SlotParticipantRepository.join(db, slot_id, user_id), user_id)
+    with factory() as db:
+        # Filled: gone from every feed
+        assert db.query(RecommendationFeedItem).filter(RecommendationFeedItem.slot_id == slot_id).count() == 0
+
+
+def test_vote_import_rebuilds_feed(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        UserVoteRepository.upsert_vote(db, VIEWER, "3", None, 1975, "movie", 9)
+        RecommendationFeedService.on_votes_imported(db, VIEWER)
+        RecommendationFeedService.on_votes_imported(db, NO_FEED)
+    with factory() as db:
+        assert "Movie 3" not in feed_titles(db, VIEWER)
+        assert not RecommendationFeedRepository.exists(db, NO_FEED)
+
+
+def test_started_slots_are_skipped_and_purged(make_db, behind_utc):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        # Slot times are local: Movie 0 has started, Movie 1 starts within the hour
+        db.query(Slot).filter(Slot.id == 1).update({Slot.datetime: datetime.now() - timedelta(minutes=1)})
+        db.query(Slot).filter(Slot.id == 2).update({Slot.datetime: datetime.now() + timedelta(hours=1)})
+    with factory() as db:
+        titles = feed_titles(db, VIEWER)
+        assert "Movie 0" not in titles and "Movie 1" in titles
+        assert RecommendationFeedRepository.purge_closed(db) == 2
+
+
+def test_leaving_a_slot_that_starts_soon_returns_it(make_db, behind_utc):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        slot = create_slot(db, "Tonight", 1990, "555")
+        slot.datetime = datetime.now() + timedelta(hours=1)
+        slot_id = slot.id
+    with unit_of_work(factory) as db:
+        RecommendationFeedService.on_joined(db, SlotParticipantRepository.join(db, slot_id, VIEWER), VIEWER)
+    with unit_of_work(factory) as db:
+        SlotParticipantRepository.remove_participant(db, slot_id, VIEWER)
+        RecommendationFeedService.on_left(db, SlotRepository.get_by_id(db, slot_id), VIEWER)
+    with factory() as db:
+        assert "Tonight" in feed_titles(db, VIEWER)
+
+
+def test_page_is_one_query(make_db):
+    factory = make_database(make_db, slot_count=40)
+    with factory() as db:
+        with assert_max_queries(1):
+            page, cursor = RecommendationFeedService.page(db, VIEWER, 10)
+        with assert_max_queries(1):
+            RecommendationFeedService.page(db, VIEWER, 10, cursor)
+        assert len(page) == 10 and cursor is not None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
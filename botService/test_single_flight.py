@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Test coalescing of concurrent movie fetches and insert-or-get on movies.kinopoisk_id"""
+import sys
+import asyncio
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import httpx
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from bot.config import Config
+from bot.database.session import unit_of_work
+from bot.database.models import Movie, Slot
+from bot.database.repositories import MovieRepository
+from bot.services import http_client
+from bot.services.movie_parser import MovieParser
+from bot.services.single_flight import SingleFlight
+from bot.utils.states import set_state
+import bot.handlers.movie as movie_module
+
+URL = "https://www.kinopoisk.ru/film/590286/"
+
+
+def test_concurrent_calls_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"title": "Бэтмен"}
+
+    async def burst():
+        results = await asyncio.gather(*(flight.do(("kinopoisk", "1"), fetch) for _ in range(20)))
+        assert not flight.in_flight(("kinopoisk", "1"))
+        # A later call is not served from the finished one
+        await flight.do(("kinopoisk", "1"), fetch)
+        await asyncio.gather(flight.do(("kinopoisk", "2"), fetch), flight.do(("imdb", "2"), fetch))
+        return results
+
+    results = asyncio.run(burst())
+    assert len(calls) == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_errors_and_cancellation():
+    flight = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("API down")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        outcomes = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+        impatient = asyncio.ensure_future(flight.do("s", slow))
+        patient = asyncio.ensure_future(flight.do("s", slow))
+        await asyncio.sleep(0.005)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_same_link_pasted_concurrently_fetches_once():
+    requests = []
+
+    async def answer(request):
+        requests.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"kinopoiskId": 590286, "nameRu": "Бэтмен", "type": "FILM"})
+
+    async def paste_ten_times():
+        return await asyncio.gather(*(MovieParser.parse_url(URL) for _ in range(10)))
+
+    old_key = Config.KINOPOISK_API_KEY
+    Config.KINOPOISK_API_KEY = "kp-key"
+    http_client.use_transport(httpx.MockTransport(answer))
+    try:
+        results = asyncio.run(paste_ten_times())
+    finally:
+        http_client.use_transport(None)
+        Config.KINOPOISK_API_KEY = old_key
+    assert len(requests) == 1
+    assert {result["title"] for result in results} == {"Бэтмен"}
+
+
+def test_create_is_insert_or_get(make_db):
+    factory = make_db("insert_or_get.db")
+    with unit_of_work(factory) as db:
+        first = MovieRepository.create(db, title="Бэтмен", kinopoisk_id="590286", genres="боевик")
+        first_id = first.id
+    with unit_of_work(factory) as db:
+        second = MovieRepository.create(db, title="Batman", kinopoisk_id="590286", genres="драма")
+        assert second.id == first_id and second.title == "Бэтмен"
+        # Without a Kinopoisk ID there is nothing to conflict on
+        MovieRepository.create(db, title="Без ID", kinopoisk_id="")
+        MovieRepository.create(db, title="Без ID", kinopoisk_id="")
+    with factory() as db:
+        assert db.query(Movie).filter(Movie.kinopoisk_id == "590286").count() == 1
+        assert MovieRepository.get_by_id(db, first_id).genres == "боевик"
+        assert db.query(Movie).filter(Movie.kinopoisk_id.is_(None)).count() == 2
+
+
+def test_concurrent_movie_links_create_one_movie(make_db, use_db, fake_update, monkeypatch):
+    factory = make_db("movie_links.db", timeout=3)
+
+    async def answer(request):
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"kinopoiskId": 590286, "nameRu": "Бэтмен", "type": "FILM"})
+
+    updates = []
+    for user_id in (1, 2, 3):
+        set_state(user_id, "waiting_for_movie_url")
+        # Each reply takes as long as a Telegram round trip
+        updates.append(fake_update(user_id, URL, delay=0.2))
+
+    async def paste_concurrently():
+        await asyncio.gather(*(movie_module.handle_movie_url(update, None) for update in updates))
+
+    monkeypatch.setattr(Config, "KINOPOISK_API_KEY", "kp-key")
+    use_db(factory, movie_module)
+    http_client.use_transport(httpx.MockTransport(answer))
+    try:
+        started = time.perf_counter()
+        asyncio.run(paste_concurrently())
+        elapsed = time.perf_counter() - started
+    finally:
+        http_client.use_transport(None)
+    # Writes are committed before the replies, so no handler waits on another's lock
+    for update in updates:
+        assert len(update.message.replies) == 1 and "Бэтмен" in update.message.replies[0]
+    assert elapsed < 2
+    with factory() as db:
+        assert db.query(Movie).filter(Movie.kinopoisk_id == "590286").count() == 1
+
+
+def test_migration_merges_duplicate_movies(migrated_db):
+    url = migrated_db("20261016_000013", "duplicates.db")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, first_name, rating, total_ratings, created_at) VALUES (1, 'A', 0, 0, CURRENT_TIMESTAMP)"))
+        for movie_id, kinopoisk_id in ((1, "7"), (2, "7"), (3, "7"), (4, "8"), (5, ""), (6, "")):
+            conn.execute(text("INSERT INTO movies (id, title, type, kinopoisk_id) VALUES (:id, 'M', 'movie', :kp)"),
+                         {"id": movie_id, "kp": kinopoisk_id})
+        conn.execute(text("INSERT INTO slots (id, movie_id, creator_id, datetime, min_participants, status) "
+                          "VALUES (1, 3, 1, CURRENT_TIMESTAMP, 2, 'open')"))
+    engine.dispose()
+    migrated_db("head", "duplicates.db")
+    factory = sessionmaker(bind=create_engine(url))
+    with factory() as db:
+        assert sorted(movie_id for (movie_id,) in db.query(Movie.id)) == [1, 4, 5, 6]
+        assert db.query(Slot).one().movie_id == 1
+        assert db.query(Movie).filter(Movie.kinopoisk_id.is_(None)).count() == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Test that the SQLite production profile is applied to new connections"""
+import sys
+import asyncio
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from bot.config import Config
+from bot.database.sqlite_profile import apply_sqlite_profile
+
+
+def read_pragmas(conn) -> dict:
+    names = ["journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store"]
+    return {name: conn.execute(text(f"PRAGMA {name}")).scalar() for name in names}
+
+
+def test_production_profile_sets_pragmas(tmp_path):
+    db_path = tmp_path / "profile.db"
+    engine = apply_sqlite_profile(create_engine(f"sqlite:///{db_path}"), "production")
+    with engine.connect() as conn:
+        pragmas = read_pragmas(conn)
+    engine.dispose()
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1  # NORMAL
+    assert pragmas["busy_timeout"] == Config.SQLITE_BUSY_TIMEOUT_MS
+    assert pragmas["cache_size"] == Config.SQLITE_CACHE_SIZE
+    assert pragmas["temp_store"] == 2  # MEMORY
+
+
+def test_default_profile_keeps_sqlite_defaults(tmp_path):
+    db_path = tmp_path / "default.db"
+    engine = apply_sqlite_profile(create_engine(f"sqlite:///{db_path}"), "default")
+    with engine.connect() as conn:
+        pragmas = read_pragmas(conn)
+    engine.dispose()
+    assert pragmas["journal_mode"] == "delete"
+    assert pragmas["synchronous"] == 2  # FULL
+
+
+def test_async_engine_gets_profile(tmp_path):
+    db_path = tmp_path / "async.db"
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        apply_sqlite_profile(engine.sync_engine, "production")
+        try:
+            async with engine.connect() as conn:
+                return (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == "wal"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
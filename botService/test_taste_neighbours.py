@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Test precomputed taste neighbours and the views that read them"""
+import sys
+import random
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+
+from bot.database.session import unit_of_work
+from bot.database.instrumentation import assert_max_queries
+from bot.database.user_cache import user_cache
+from bot.database.models import Slot, TasteNeighbour, UserVote
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository, SlotParticipantRepository,
+    TasteNeighbourRepository, LoadProfile,
+)
+from bot.services.matching import MatchingService
+from bot.services.taste_neighbours import TasteNeighbourService
+import bot.handlers.recommend as recommend_module
+
+USERS = 30
+MOVIES = 40
+
+
+def make_database(make_db, seed: int = 7):
+    """USERS users with random overlapping votes"""
+    factory = make_db("neighbours.db", instrument=True)
+    rng = random.Random(seed)
+    with unit_of_work(factory) as db:
+        for user_id in range(1, USERS + 1):
+            UserRepository.get_or_create(db, user_id, f"user{user_id}", f"User {user_id}")
+            for kp_id in rng.sample(range(MOVIES), rng.randint(0, 15)):
+                db.add(UserVote(user_id=user_id, kinopoisk_id=str(kp_id), user_rating=rng.randint(1, 10)))
+    user_cache.clear()
+    return factory
+
+
+def brute_force(db, user_id: int, min_common: int) -> dict:
+    """Vote similarity of user_id to every user with enough co-rated movies, pair by pair"""
+    votes = {u: MatchingService._votes_map(db, u) for u in range(1, USERS + 1)}
+    result = {}
+    for other_id in range(1, USERS + 1):
+        common = set(votes[user_id]) & set(votes[other_id])
+        if other_id == user_id or len(common) < min_common:
+            continue
+        diffs = [abs(votes[user_id][k] - votes[other_id][k]) for k in common]
+        result[other_id] = max(0.0, 1.0 - (sum(diffs) / (len(diffs) * 9.0)))
+    return result
+
+
+def test_inverted_index_matches_pairwise_similarity(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        TasteNeighbourService.compute(db, top_n=5, min_common=2)
+    with factory() as db:
+        for user_id in range(1, USERS + 1):
+            expected = brute_force(db, user_id, 2)
+            stored = db.query(TasteNeighbour).filter(TasteNeighbour.user_id == user_id).all()
+            assert len(stored) == min(5, len(expected))
+            for row in stored:
+                assert row.score == expected[row.neighbour_id]
+            # Nobody left out scores higher than the weakest stored neighbour
+            if stored:
+                kept = {row.neighbour_id for row in stored}
+                weakest = min(row.score for row in stored)
+                assert all(score <= weakest for other, score in expected.items() if other not in kept)
+
+
+def test_partial_recompute_keeps_other_users(make_db):
+    factory = make_database(make_db)
+    with unit_of_work(factory) as db:
+        TasteNeighbourService.compute(db, top_n=5, min_common=1)
+        before = db.query(TasteNeighbour).filter(TasteNeighbour.user_id != 1).count()
+        TasteNeighbourService.compute(db, [1], top_n=2, min_common=1)
+    with factory() as db:
+        assert db.query(TasteNeighbour).filter(TasteNeighbour.user_id == 1).count() <= 2
+        assert db.query(TasteNeighbour).filter(TasteNeighbour.user_id != 1).count() == before
+
+
+def make_slots(factory, participants: list) -> list:
+    soon = datetime.utcnow() + timedelta(days=1)
+    slot_ids = []
+    with unit_of_work(factory) as db:
+        movie = MovieRepository.create(db, title="Movie", year=2000, kinopoisk_id="500")
+        for i, members in enumerate(participants):
+            slot = SlotRepository.create(db, movie.id, members[0], soon + timedelta(hours=i), max_participants=10)
+            for member in members:
+                SlotParticipantRepository.add_participant(db, slot.id, member)
+            slot_ids.append(slot.id)
+    return slot_ids
+
+
+def test_compatibility_reads_stored_neighbours(make_db):
+    factory = make_database(make_db)
+    make_slots(factory, [[2, 3], [4, 5, 6], [7]])
+    with unit_of_work(factory) as db:
+        TasteNeighbourRepository.replace(db, {1: [(3, 0.9, 4), (7, 0.5, 3)]})
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        user_cache.clear()
+        # Neighbour scores, then the peer ratings of the viewer and 6 participants
+        with assert_max_queries(2 + 7):
+            scored = MatchingService.annotate_slots_by_neighbours(db, 1, slots)
+        ratings = {u: MatchingService._peer_rating(db, u) for u in range(1, 8)}
+        close = {u: 1.0 - min(1.0, abs(ratings[1] - ratings[u]) / 5.0) for u in range(2, 8)}
+        by_members = {tuple(sorted(p.user_id for p in slot.participants)): score for slot, score in scored}
+        assert by_members[(2, 3)] == ((0.7 * 0.0 + 0.3 * close[2]) + (0.7 * 0.9 + 0.3 * close[3])) / 2
+        assert by_members[(7,)] == 0.7 * 0.5 + 0.3 * close[7]
+        assert scored[0][1] >= scored[1][1] >= scored[2][1]
+
+
+def test_users_without_neighbours_fall_back_to_votes(make_db):
+    factory = make_database(make_db)
+    make_slots(factory, [[2, 3], [4]])
+    with factory() as db:
+        slots = SlotRepository.get_all_open(db, profile=LoadProfile.WITH_MEMBERS)
+        assert MatchingService.annotate_slots_by_neighbours(db, 1, slots) == \
+            MatchingService.annotate_slots_by_compatibility(db, 1, slots)
+
+
+def test_neighbour_slots_compare_local_time(make_db, behind_utc):
+    factory = make_database(make_db)
+    tonight, started = make_slots(factory, [[2], [3]])
+    with unit_of_work(factory) as db:
+        # Slot times are local: one starts within the hour, the other has started
+        db.query(Slot).filter(Slot.id == tonight).update({Slot.datetime: datetime.now() + timedelta(hours=1)})
+        db.query(Slot).filter(Slot.id == started).update({Slot.datetime: datetime.now() - timedelta(minutes=1)})
+        TasteNeighbourRepository.replace(db, {1: [(2, 0.8, 5), (3, 0.6, 4)]})
+    with factory() as db:
+        assert [slot.id for slot, _, _ in TasteNeighbourRepository.get_neighbour_slots(db, 1, 10)] == [tonight]
+
+
+def test_similar_slots_view(make_db, use_db, fake_update):
+    factory = make_database(make_db)
+    liked, other, joined = make_slots(factory, [[2, 3], [4], [3]])
+    with unit_of_work(factory) as db:
+        SlotParticipantRepository.add_participant(db, joined, 1)
+        TasteNeighbourRepository.replace(db, {1: [(2, 0.8, 5), (3, 0.6, 4)]})
+    with factory() as db:
+        rows = TasteNeighbourRepository.get_neighbour_slots(db, 1, 10)
+        assert [(slot.id, count) for slot, count, _ in rows] == [(liked, 2)]
+        assert abs(rows[0][2] - 1.4) < 1e-9
+
+    use_db(factory)
+    update, lonely = fake_update(1), fake_update(9)
+    with assert_max_queries(1):
+        asyncio.run(recommend_module.similar_slots_command(update, None))
+    asyncio.run(recommend_module.similar_slots_command(lonely, None))
+    assert "похожих зрителей: 2" in update.message.replies[0]
+    markup = update.message.markups[0]
+    assert [row[0].callback_data for row in markup.inline_keyboard] == [f"join_slot:{liked}"]
+    assert lonely.message.replies[0] == recommend_module.NO_NEIGHBOURS_TEXT
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Test that a unit of work commits exactly once per update"""
+import sys
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = Path(__file__).parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+import pytest
+from sqlalchemy import event
+
+from bot.database.session import unit_of_work
+from bot.database.repositories import (
+    UserRepository, MovieRepository, SlotRepository,
+    SlotParticipantRepository, RoomRepository,
+)
+from bot.constants import SlotStatus
+
+
+@pytest.fixture
+def counted(make_db):
+    """Fresh SQLite database with commit counter"""
+    factory = make_db("uow.db")
+    commits = []
+    event.listen(factory.kw["bind"], "commit", lambda conn: commits.append(1))
+    return factory, commits
+
+
+def test_join_flow_commits_once(counted):
+    factory, commits = counted
+    with unit_of_work(factory) as db:
+        creator = UserRepository.get_or_create(db, 1, "creator", "Creator")
+        movie = MovieRepository.create(db, title="Movie", year=2020)
+        slot = SlotRepository.create(
+            db, movie.id, creator.id, datetime.utcnow() + timedelta(days=1), min_participants=2
+        )
+        SlotParticipantRepository.add_participant(db, slot.id, creator.id)
+        slot_id = slot.id
+    commits.clear()
+    
+    # Same sequence as join_slot_callback
+    with unit_of_work(factory) as db:
+        UserRepository.get_or_create(db, 2, "joiner", "Joiner")
+        slot = SlotRepository.get_by_id(db, slot_id)
+        assert len(slot.participants) == 1
+        SlotParticipantRepository.add_participant(db, slot_id, 2)
+        # Cached collection is refreshed without a commit
+        assert len(slot.participants) == 2
+        RoomRepository.create(db, slot_id)
+        slot.status = SlotStatus.FULL
+        assert commits == []
+    assert len(commits) == 1
+    
+    with factory() as db:
+        slot = SlotRepository.get_by_id(db, slot_id)
+        assert slot.status == SlotStatus.FULL
+        assert len(slot.participants) == 2
+        assert RoomRepository.get_by_slot_id(db, slot_id) is not None
+
+
+def test_error_rolls_back_whole_update(counted):
+    factory, commits = counted
+    try:
+        with unit_of_work(factory) as db:
+            UserRepository.get_or_create(db, 1, "user", "User")
+            raise RuntimeError("handler failed")
+    except RuntimeError:
+        pass
+    assert commits == []
+    with factory() as db:
+        assert UserRepository.get_by_id(db, 1) is None
+
+
+def test_plain_session_still_commits_per_call(counted):
+    factory, commits = counted
+    with factory() as db:
+        UserRepository.get_or_create(db, 1, "user", "User")
+        MovieRepository.create(db, title="Movie")
+    assert len(commits) == 2
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
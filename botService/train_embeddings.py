@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Train the implicit-ALS user and movie embeddings used to rank recommendations
+
+Run periodically (e.g. from cron, hourly). A run updates only users who voted
+or joined a slot since the previous one, and movies seen for the first time;
+run with --full now and then (e.g. nightly) or after changing ALS_FACTORS.
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bot.database.session import unit_of_work
+from bot.services.embeddings import EmbeddingService
+
+def train_embeddings(full: bool = False):
+    """Retrain embeddings incrementally, or from scratch with full"""
+    print("🧮 Training embeddings" + (" from scratch..." if full else "..."))
+    with unit_of_work() as db:
+        result = EmbeddingService.train(db, full=full)
+    mode = "full" if result.full else "incremental"
+    print(f"✅ Stored {result.users} user and {result.movies} movie vectors ({mode})")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="retrain every embedding from scratch")
+    args = parser.parse_args()
+    train_embeddings(args.full)